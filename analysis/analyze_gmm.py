@@ -1,12 +1,11 @@
 from sklearn.mixture import GaussianMixture
-from sklearn.preprocessing import StandardScaler
 import numpy as np
 from analysis.analyzers.data_loader import DataLoader
+from analysis.categorizers.gaussian_mixture_pipeline import GaussianMixturePipeline
 from pathlib import Path
 import matplotlib.pyplot as plt
 from matplotlib.collections import PathCollection
 from sklearn.decomposition import PCA
-import pickle
 from typing import Any
 
 cwd = Path.cwd() # Used in multiple places
@@ -22,13 +21,13 @@ for i in range(0, len(data) - window_size + 1, 1):
     windows_list.append(window)
 windows: np.ndarray = np.array(windows_list)
 
-windows = StandardScaler().fit_transform(windows)
+# Scaler + GMM artifact; a bare pickled GMM gets a scaler fitted on these windows
+pipeline = GaussianMixturePipeline.load(cwd/'analysis/tokenization/visualizations/gmm_model.pkl')
+windows = pipeline.attach(windows)
+loaded_gmm: GaussianMixture = pipeline.model
 
-with open(cwd/'analysis/tokenization/visualizations/gmm_model.pkl', 'rb') as f:
-    loaded_gmm: GaussianMixture = pickle.load(f)
-
-cluster_labels = loaded_gmm.predict(windows)
-cluster_probs = loaded_gmm.predict_proba(windows)
+cluster_probs = pipeline.probabilities
+cluster_labels = pipeline.labels
 number_of_clusters: int = loaded_gmm.n_components
 # associate each window with a cluster probability distribution:
 cluster_annotated_windows = [{ "window": windows[i], "probabilities": cluster_probs[i] } for i in range(len(windows))]
@@ -2,6 +2,7 @@ from pandas import DataFrame
 from analysis.transformation import Transformation
 from analysis.analyzers.data_transformer import DataTransformer
 from analysis.segmenters.segmenter import Segmenter
+from analysis.analyzers.segment_index import SegmentIndex, SegmentMatch
 from pathlib import Path
 import pandas as pd
 import pickle
@@ -12,6 +13,7 @@ class DataSegmenter(DataTransformer):
     transformation: Transformation
     segmenter: Segmenter
     segments: list[DataFrame]
+    segment_index: SegmentIndex
 
     def __init__(self,
                  ticker: str,
@@ -42,5 +44,30 @@ class DataSegmenter(DataTransformer):
     def vectorize_segments(self) -> None:
         self.vectorized_segments: list[np.ndarray] = [segment.values.flatten() for segment in self.segments]
 
-    def identify_segment(self, segment: DataFrame) -> int | None:
-        pass
\ No newline at end of file
+    def build_segment_index(self, **index_options) -> SegmentIndex:
+        """Index self.segments; ids are their positions in the list."""
+        self.segment_index = SegmentIndex(**index_options)
+        self._add_to_index(self.segments, first=0)
+        return self.segment_index
+
+    def _add_to_index(self, segments: list[DataFrame], first: int) -> None:
+        # Segmenters can emit empty segments (e.g. cusum's first one); they are skipped but keep their ids
+        ids = np.array([first + i for i, segment in enumerate(segments) if len(segment) > 0], dtype=np.int64)
+        if len(ids):
+            self.segment_index.add([segments[i - first] for i in ids], ids=ids)
+
+    def update_segment_index(self, new_segments: list[DataFrame]) -> None:
+        """Append newly segmented data to self.segments and to the index."""
+        first = len(self.segments)
+        self.segments.extend(new_segments)
+        self._add_to_index(new_segments, first)
+
+    def save_segment_index(self, path: Path) -> None:
+        self.segment_index.save(path)
+
+    def load_segment_index(self, path: Path) -> None:
+        self.segment_index = SegmentIndex.load(path)
+
+    def identify_segment(self, segment: DataFrame, k: int = 5) -> list[SegmentMatch]:
+        """The k historical segments most similar to `segment` (indices into self.segments)."""
+        return self.segment_index.query(segment, k=k)
\ No newline at end of file
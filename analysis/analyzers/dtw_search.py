@@ -0,0 +1,258 @@
+"""
+Top-k dynamic time warping search over historical segments.
+
+Segments are resampled to a common length and z-normalized per column (see
+`resample_segments`), and compared by multivariate DTW (squared Euclidean
+cost per step) constrained to a Sakoe-Chiba band of `window * length` steps.
+
+Most candidates never reach a full DTW. Each one first has to pass a
+cascade of lower bounds against the current k-th best distance:
+
+1. LB_Kim (first and last points, which every warping path matches);
+2. LB_Keogh of the candidate against the query's envelope;
+3. LB_Keogh of the query against the candidate's envelope (precomputed at build).
+
+Survivors are scored in batches, closest lower bound first, by a DTW that is
+vectorized over the batch and over each row of the cost matrix (the in-row
+recurrence D[j] = min(t[j], c[j] + D[j-1]) is a running minimum of
+t - cumsum(c)). A candidate is abandoned as soon as its row minimum plus the
+remaining LB_Keogh terms exceeds the k-th best distance.
+"""
+import numpy as np
+from pandas import DataFrame
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
+from typing import TypedDict
+from analysis.analyzers.segment_index import resample_segments
+
+
+class DTWMatch(TypedDict):
+    index: int
+    distance: float
+
+
+class PruningStats(TypedDict):
+    candidates: int
+    pruned_by_kim: int
+    pruned_by_keogh_query: int
+    pruned_by_keogh_candidate: int
+    abandoned: int
+    full_dtw: int
+
+
+def envelope(series: np.ndarray, radius: int) -> tuple[np.ndarray, np.ndarray]:
+    """(upper, lower) running max/min over +-radius steps along axis -2 of (..., length, n_columns)."""
+    size = 2 * radius + 1
+    return (
+        maximum_filter1d(series, size=size, axis=-2, mode='nearest'),
+        minimum_filter1d(series, size=size, axis=-2, mode='nearest'),
+    )
+
+
+def _envelope_violation(series: np.ndarray, upper: np.ndarray, lower: np.ndarray) -> np.ndarray:
+    """Squared distance of every step to the envelope, summed over columns: (..., length)."""
+    above = np.maximum(series - upper, 0.0)
+    below = np.maximum(lower - series, 0.0)
+    return (above ** 2 + below ** 2).sum(axis=-1)
+
+
+def lb_kim(query: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """Squared cost of the first and last steps, which every warping path includes."""
+    first = ((candidates[:, 0] - query[0]) ** 2).sum(axis=-1)
+    last = ((candidates[:, -1] - query[-1]) ** 2).sum(axis=-1)
+    return first + last if len(query) > 1 else first
+
+
+def dtw_batch(
+    query: np.ndarray,
+    candidates: np.ndarray,
+    radius: int,
+    threshold: float = np.inf,
+    tails: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Squared DTW distance of `query` (length, n_columns) to each of
+    `candidates` (n, length, n_columns) within a band of `radius`, or inf
+    where the distance provably exceeds `threshold`.
+
+    Args:
+        tails: (n, length) lower bounds on the cost still to come after each
+            query row, tightening early abandoning
+    """
+    n, length = len(candidates), len(query)
+    result = np.full(n, np.inf)
+    alive = np.arange(n)
+    # Column 0 stands for j = -1, so the path can only enter at (0, 0)
+    previous = np.full((n, length + 1), np.inf)
+    previous[:, 0] = 0.0
+
+    for i in range(length):
+        lo, hi = max(0, i - radius), min(length, i + radius + 1)
+        cost = ((candidates[alive, lo:hi] - query[i]) ** 2).sum(axis=-1)
+
+        through = cost + np.minimum(previous[:, lo + 1:hi + 1], previous[:, lo:hi])
+        cumulative = np.cumsum(cost, axis=1)
+        row = cumulative + np.minimum.accumulate(through - cumulative, axis=1)
+
+        current = np.full((len(alive), length + 1), np.inf)
+        current[:, lo + 1:hi + 1] = row
+
+        bound = row.min(axis=1)
+        if tails is not None and i + 1 < length:
+            bound = bound + tails[alive, i]
+        keep = bound <= threshold
+        if not keep.all():
+            alive, current = alive[keep], current[keep]
+            if len(alive) == 0:
+                return result
+        previous = current
+
+    result[alive] = previous[:, length]
+    return result
+
+
+def dtw_distance(a: np.ndarray, b: np.ndarray, radius: int) -> float:
+    """DTW distance of two equal-length (length, n_columns) series, without pruning."""
+    return float(np.sqrt(dtw_batch(a, b[None], radius)[0]))
+
+
+class DTWIndex:
+    """
+    Historical segments prepared for DTW search: resampled series and their envelopes.
+
+    Args:
+        window: Sakoe-Chiba band as a fraction of `length`
+        columns: columns of DataFrame segments to compare (default: all)
+    """
+    series: np.ndarray
+    upper: np.ndarray
+    lower: np.ndarray
+
+    def __init__(
+        self,
+        length: int = 64,
+        window: float = 0.1,
+        normalize: bool = True,
+        columns: list[str] | None = None,
+        batch_size: int = 256
+    ) -> None:
+        self.length = length
+        self.radius = int(round(window * length))
+        self.normalize = normalize
+        self.columns = columns
+        self.batch_size = batch_size
+        self.series = np.zeros((0, length, 0))
+
+    def _prepare(self, segments: list[DataFrame] | list[np.ndarray]) -> np.ndarray:
+        if self.columns is not None:
+            segments = [segment[self.columns] for segment in segments]
+        return resample_segments(segments, self.length, self.normalize)
+
+    def add(self, segments: list[DataFrame] | list[np.ndarray]) -> None:
+        """Append segments; their indices continue from the ones already indexed."""
+        series = self._prepare(segments)
+        upper, lower = envelope(series, self.radius)
+        if len(self.series) == 0:
+            self.series, self.upper, self.lower = series, upper, lower
+        else:
+            self.series = np.concatenate([self.series, series])
+            self.upper = np.concatenate([self.upper, upper])
+            self.lower = np.concatenate([self.lower, lower])
+
+    def __len__(self) -> int:
+        return len(self.series)
+
+    def query(self, segment: DataFrame | np.ndarray, k: int = 5, exclude: int | None = None) -> tuple[list[DTWMatch], PruningStats]:
+        """
+        The k indexed segments with the smallest DTW distance to `segment`.
+
+        Args:
+            exclude: an indexed segment to leave out (e.g. the query itself)
+        """
+        query = self._prepare([segment])[0]
+        candidates = np.arange(len(self.series))
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+
+        stats = PruningStats(
+            candidates=len(candidates), pruned_by_kim=0, pruned_by_keogh_query=0,
+            pruned_by_keogh_candidate=0, abandoned=0, full_dtw=0,
+        )
+        best_distance = np.full(0, np.inf)
+        best_index = np.zeros(0, dtype=np.intp)
+
+        def _threshold() -> float:
+            return float(best_distance.max()) if len(best_distance) == k else np.inf
+
+        def _score(batch: np.ndarray, tails: np.ndarray | None) -> None:
+            nonlocal best_distance, best_index
+            distances = dtw_batch(query, self.series[batch], self.radius, _threshold(), tails)
+            finished = np.isfinite(distances)
+            stats['full_dtw'] += int(finished.sum())
+            stats['abandoned'] += int((~finished).sum())
+
+            best_distance = np.concatenate([best_distance, distances[finished]])
+            best_index = np.concatenate([best_index, batch[finished]])
+            top = np.argsort(best_distance, kind='stable')[:k]
+            best_distance, best_index = best_distance[top], best_index[top]
+
+        # Seed the threshold with the k candidates closest by the cheapest bound
+        kim = lb_kim(query, self.series[candidates])
+        order = np.argsort(kim, kind='stable')
+        _score(candidates[order[:k]], None)
+        candidates, kim = candidates[order[k:]], kim[order[k:]]
+
+        # Cascade: each bound is computed only for candidates the previous one kept
+        threshold = _threshold()
+        keep = kim <= threshold
+        stats['pruned_by_kim'] += int((~keep).sum())
+        candidates, kim = candidates[keep], kim[keep]
+
+        upper_query, lower_query = envelope(query, self.radius)
+        keogh_query = _envelope_violation(self.series[candidates], upper_query, lower_query).sum(axis=1)
+        keep = keogh_query <= threshold
+        stats['pruned_by_keogh_query'] += int((~keep).sum())
+        candidates, kim, keogh_query = candidates[keep], kim[keep], keogh_query[keep]
+
+        # Per query step, so the unprocessed rows can tighten early abandoning
+        contributions = _envelope_violation(query, self.upper[candidates], self.lower[candidates])
+        keogh_candidate = contributions.sum(axis=1)
+        keep = keogh_candidate <= threshold
+        stats['pruned_by_keogh_candidate'] += int((~keep).sum())
+        candidates, kim, keogh_query, contributions = candidates[keep], kim[keep], keogh_query[keep], contributions[keep]
+        tails = contributions[:, ::-1].cumsum(axis=1)[:, ::-1]
+        tails = np.concatenate([tails[:, 1:], np.zeros((len(tails), 1))], axis=1)
+
+        bound = np.maximum(np.maximum(kim, keogh_query), contributions.sum(axis=1))
+        order = np.argsort(bound, kind='stable')
+        # Small batches first, while the threshold is still loose, then up to batch_size
+        start, size = 0, min(max(k, 16), self.batch_size)
+        while start < len(order):
+            batch = order[start:start + size]
+            start, size = start + size, min(2 * size, self.batch_size)
+            # The threshold has tightened since the cascade; re-check the bounds
+            threshold = _threshold()
+            late = bound[batch] > threshold
+            if late.any():
+                stats['pruned_by_kim'] += int((kim[batch[late]] > threshold).sum())
+                stats['pruned_by_keogh_query'] += int(((kim[batch[late]] <= threshold) & (keogh_query[batch[late]] > threshold)).sum())
+                stats['pruned_by_keogh_candidate'] += int(((kim[batch[late]] <= threshold) & (keogh_query[batch[late]] <= threshold)).sum())
+                batch = batch[~late]
+            if len(batch):
+                _score(candidates[batch], tails[batch])
+
+        matches = [DTWMatch(index=int(i), distance=float(np.sqrt(d))) for i, d in zip(best_index, best_distance)]
+        return matches, stats
+
+    def query_many(self, segments: list[DataFrame] | list[np.ndarray], k: int = 5) -> tuple[list[list[DTWMatch]], PruningStats]:
+        """`query` for each segment, with the pruning counts summed."""
+        results: list[list[DTWMatch]] = []
+        total = PruningStats(
+            candidates=0, pruned_by_kim=0, pruned_by_keogh_query=0,
+            pruned_by_keogh_candidate=0, abandoned=0, full_dtw=0,
+        )
+        for segment in segments:
+            matches, stats = self.query(segment, k)
+            results.append(matches)
+            for key in total:
+                total[key] += stats[key]
+        return results, total
@@ -0,0 +1,313 @@
+"""
+Matrix profile of a price series, and the motifs and discords it exposes.
+
+The matrix profile gives, for every subsequence of `window` bars, the
+z-normalized Euclidean distance to its nearest non-trivial match. The lowest
+values are motifs (shapes that recur) and the highest are discords (shapes
+that occur nowhere else).
+
+The exact profile is computed diagonal by diagonal, as in SCRIMP: along
+diagonal k every dot product T[i:i+m] . T[i+k:i+k+m] is a sliding-window sum
+of T[t] * T[t+k], so each diagonal costs one cumulative sum. Diagonals are
+independent and are split across processes.
+
+The anytime mode follows SCRIMP++: a PreSCRIMP pass computes, with FFT
+sliding dot products (MASS), the full distance profiles of every
+`prescrimp_step`-th subsequence, which already locates most motifs, and then
+diagonals are processed in random order until `fraction` of them are done or
+`time_budget` seconds have passed.
+"""
+import numpy as np
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pandas import DataFrame
+from scipy import fft
+from typing import TypedDict
+
+
+class Motif(TypedDict):
+    # Start indices of the subsequences in the motif, the defining pair first
+    indices: list[int]
+    distance: float
+
+
+class Discord(TypedDict):
+    index: int
+    distance: float
+
+
+def _sliding_stats(series: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    cumulative = np.concatenate([[0.0], np.cumsum(series)])
+    cumulative_squares = np.concatenate([[0.0], np.cumsum(series ** 2)])
+    mean = (cumulative[window:] - cumulative[:-window]) / window
+    variance = (cumulative_squares[window:] - cumulative_squares[:-window]) / window - mean ** 2
+    return mean, np.sqrt(np.maximum(variance, 0.0))
+
+
+def _squared_distances(
+    dot_products: np.ndarray,
+    window: int,
+    mean_a: np.ndarray,
+    std_a: np.ndarray,
+    mean_b: np.ndarray,
+    std_b: np.ndarray
+) -> np.ndarray:
+    """
+    Squared z-normalized distances from sliding dot products. A constant
+    subsequence is treated as all zeros once normalized: distance 0 to another
+    constant one, sqrt(window) to anything else.
+    """
+    flat_a, flat_b = std_a == 0, std_b == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = (dot_products - window * mean_a * mean_b) / (window * std_a * std_b)
+    squared = np.maximum(2.0 * window * (1.0 - correlation), 0.0)
+    if flat_a.any() or flat_b.any():
+        squared = np.where(flat_a | flat_b, np.where(flat_a & flat_b, 0.0, float(window)), squared)
+    return squared
+
+
+def sliding_dot_products(query: np.ndarray, series_fft: np.ndarray, length: int, fft_length: int) -> np.ndarray:
+    """
+    query . series[j:j+len(query)] for every j, by FFT; series_fft is
+    rfft(series, n=fft_length) with fft_length >= length + len(query) - 1.
+    """
+    window = len(query)
+    query_fft = fft.rfft(query[::-1], n=fft_length)
+    return fft.irfft(series_fft * query_fft, n=fft_length)[window - 1:length]
+
+
+def _update_diagonals(
+    series: np.ndarray,
+    window: int,
+    mean: np.ndarray,
+    std: np.ndarray,
+    diagonals: np.ndarray,
+    deadline: float | None = None
+) -> tuple[np.ndarray, np.ndarray, int]:
+    """Squared profile and index over the given diagonals; stops early past `deadline` (time.time())."""
+    n_subsequences = len(mean)
+    profile = np.full(n_subsequences, np.inf)
+    index = np.full(n_subsequences, -1, dtype=np.int64)
+
+    done = 0
+    for k in diagonals:
+        if deadline is not None and time.time() > deadline:
+            break
+        _update_diagonal(series, window, mean, std, int(k), 0, n_subsequences - int(k), profile, index)
+        done += 1
+    return profile, index, done
+
+
+def _update_diagonal(
+    series: np.ndarray,
+    window: int,
+    mean: np.ndarray,
+    std: np.ndarray,
+    k: int,
+    lo: int,
+    hi: int,
+    profile: np.ndarray,
+    index: np.ndarray
+) -> None:
+    """Fold the pairs (i, i + k), lo <= i < hi, into the squared profile and index."""
+    products = series[lo:hi + window - 1] * series[lo + k:hi + k + window - 1]
+    cumulative = np.concatenate([[0.0], np.cumsum(products)])
+    dot_products = cumulative[window:] - cumulative[:-window]
+
+    left, right = slice(lo, hi), slice(lo + k, hi + k)
+    squared = _squared_distances(dot_products, window, mean[left], std[left], mean[right], std[right])
+
+    # Each diagonal entry is a neighbour of both its row and its column
+    better = squared < profile[left]
+    profile[left][better] = squared[better]
+    index[left][better] = np.flatnonzero(better) + lo + k
+    better = squared < profile[right]
+    profile[right][better] = squared[better]
+    index[right][better] = np.flatnonzero(better) + lo
+
+
+
+def _merge(
+    profile: np.ndarray,
+    index: np.ndarray,
+    other_profile: np.ndarray,
+    other_index: np.ndarray
+) -> None:
+    better = other_profile < profile
+    profile[better] = other_profile[better]
+    index[better] = other_index[better]
+
+
+class MatrixProfile:
+    """
+    Matrix profile of one column of a DataLoader frame (or any 1-D series).
+
+    Args:
+        window: subsequence length in bars
+        exclusion: matches closer than this many bars are trivial (default window / 4)
+    """
+    series: np.ndarray
+    profile: np.ndarray
+    index: np.ndarray
+
+    def __init__(self, series: np.ndarray, window: int, exclusion: int | None = None) -> None:
+        if window < 3 or window > len(series) // 2:
+            raise ValueError(f"window must be between 3 and half the series length, got {window}.")
+        self.series = np.asarray(series, dtype=np.float64)
+        self.window = window
+        self.exclusion = exclusion if exclusion is not None else max(1, int(np.ceil(window / 4)))
+
+        # Distances are shift invariant; centring keeps the running sums small
+        self._centred = self.series - self.series.mean()
+        self._mean, self._std = _sliding_stats(self._centred, window)
+        # Relative precision of the running sums; below it a window counts as constant
+        self._std[self._std < 1e-8 * max(np.abs(self._centred).max(), 1.0)] = 0.0
+
+        n_subsequences = len(self._mean)
+        self.profile = np.full(n_subsequences, np.inf)
+        self.index = np.full(n_subsequences, -1, dtype=np.int64)
+        self.diagonals_done = 0
+
+    @classmethod
+    def from_frame(cls, df: DataFrame, window: int, column: str = 'close', exclusion: int | None = None) -> 'MatrixProfile':
+        return cls(df[column].to_numpy(dtype=np.float64), window, exclusion)
+
+    @property
+    def n_diagonals(self) -> int:
+        return max(len(self._mean) - self.exclusion, 0)
+
+    def _squared_profile(self) -> np.ndarray:
+        return self.profile ** 2
+
+    def _series_fft(self) -> tuple[np.ndarray, int]:
+        fft_length = fft.next_fast_len(len(self._centred) + self.window - 1, real=True)
+        return fft.rfft(self._centred, n=fft_length), fft_length
+
+    def distance_profile(self, start: int) -> np.ndarray:
+        """Distances from the subsequence at `start` to every subsequence (MASS), trivial matches included."""
+        series_fft, fft_length = self._series_fft()
+        query = self._centred[start:start + self.window]
+        dot_products = sliding_dot_products(query, series_fft, len(self._centred), fft_length)
+        return np.sqrt(_squared_distances(
+            dot_products, self.window, self._mean[start], self._std[start], self._mean, self._std,
+        ))
+
+    def _prescrimp(self, step: int) -> None:
+        series_fft, fft_length = self._series_fft()
+        squared_profile = self._squared_profile()
+        for start in range(0, len(self._mean), step):
+            query = self._centred[start:start + self.window]
+            squared = _squared_distances(
+                sliding_dot_products(query, series_fft, len(self._centred), fft_length),
+                self.window, self._mean[start], self._std[start], self._mean, self._std,
+            )
+            squared[max(0, start - self.exclusion + 1):start + self.exclusion] = np.inf
+
+            nearest = int(np.argmin(squared))
+            if squared[nearest] < squared_profile[start]:
+                squared_profile[start], self.index[start] = squared[nearest], nearest
+            better = squared < squared_profile
+            squared_profile[better] = squared[better]
+            self.index[better] = start
+
+            # Neighbours of a good match are likely good matches: refine the
+            # stretch of its diagonal between this sample and the next ones
+            if np.isfinite(squared[nearest]):
+                first = min(start, nearest)
+                lag = abs(nearest - start)
+                lo, hi = max(0, first - step + 1), min(len(self._mean) - lag, first + step)
+                _update_diagonal(self._centred, self.window, self._mean, self._std, lag, lo, hi, squared_profile, self.index)
+        self.profile = np.sqrt(squared_profile)
+
+    def compute(
+        self,
+        n_jobs: int = 1,
+        approximate: bool = False,
+        fraction: float = 1.0,
+        time_budget: float | None = None,
+        prescrimp_step: int | None = None,
+        random_state: int = 42
+    ) -> 'MatrixProfile':
+        """
+        Compute the profile; exact unless `approximate`.
+
+        Args:
+            fraction: 'approximate' only; share of the diagonals to process
+            time_budget: 'approximate' only; seconds (PreSCRIMP included) after which diagonals stop
+            prescrimp_step: 'approximate' only; PreSCRIMP stride (default window)
+        """
+        diagonals = np.arange(self.exclusion, len(self._mean))
+        deadline = None
+        if approximate:
+            deadline = time.time() + time_budget if time_budget is not None else None
+            self._prescrimp(prescrimp_step or self.window)
+            diagonals = np.random.default_rng(random_state).permutation(diagonals)
+            diagonals = diagonals[:int(np.ceil(fraction * len(diagonals)))]
+
+        squared_profile = self._squared_profile()
+        if n_jobs > 1:
+            # Interleaved shards, so every worker gets long and short diagonals alike
+            shards = [diagonals[j::n_jobs] for j in range(n_jobs)]
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [
+                    executor.submit(_update_diagonals, self._centred, self.window, self._mean, self._std, shard, deadline)
+                    for shard in shards
+                ]
+                for future in futures:
+                    profile, index, done = future.result()
+                    _merge(squared_profile, self.index, profile, index)
+                    self.diagonals_done += done
+        else:
+            profile, index, done = _update_diagonals(self._centred, self.window, self._mean, self._std, diagonals, deadline)
+            _merge(squared_profile, self.index, profile, index)
+            self.diagonals_done += done
+
+        self.profile = np.sqrt(squared_profile)
+        return self
+
+    def motifs(self, k: int = 3, radius: float = 2.0, max_neighbors: int = 10) -> list[Motif]:
+        """
+        The k best motifs: each starts from the closest remaining pair in the
+        profile and gathers up to `max_neighbors` further subsequences within
+        `radius` times the pair's distance. Motifs do not overlap.
+        """
+        excluded = np.zeros(len(self.profile), dtype=bool)
+        motifs: list[Motif] = []
+        for candidate in np.argsort(self.profile, kind='stable'):
+            if len(motifs) == k or not np.isfinite(self.profile[candidate]):
+                break
+            neighbor = int(self.index[candidate])
+            if excluded[candidate] or neighbor < 0 or excluded[neighbor]:
+                continue
+
+            distance = float(self.profile[candidate])
+            distances = self.distance_profile(int(candidate))
+            members = [int(candidate), neighbor]
+            blocked = excluded.copy()
+            for member in members:
+                blocked[max(0, member - self.exclusion + 1):member + self.exclusion] = True
+            for other in np.argsort(distances, kind='stable'):
+                if len(members) == max_neighbors + 2 or distances[other] > radius * max(distance, 1e-12):
+                    break
+                if not blocked[other]:
+                    members.append(int(other))
+                    blocked[max(0, other - self.exclusion + 1):other + self.exclusion] = True
+
+            for member in members:
+                excluded[max(0, member - self.window + 1):member + self.window] = True
+            motifs.append(Motif(indices=members, distance=distance))
+        return motifs
+
+    def discords(self, k: int = 3) -> list[Discord]:
+        """The k subsequences furthest from their nearest neighbour, not overlapping each other."""
+        excluded = np.zeros(len(self.profile), dtype=bool)
+        discords: list[Discord] = []
+        finite = np.where(np.isfinite(self.profile), self.profile, -np.inf)
+        for candidate in np.argsort(-finite, kind='stable'):
+            if len(discords) == k or finite[candidate] == -np.inf:
+                break
+            if excluded[candidate]:
+                continue
+            discords.append(Discord(index=int(candidate), distance=float(self.profile[candidate])))
+            excluded[max(0, candidate - self.window + 1):candidate + self.window] = True
+        return discords
@@ -0,0 +1,265 @@
+"""
+Nearest-neighbour index over historical segments.
+
+Segments have different lengths, so each one is resampled to `length` points
+per column and z-normalized per column before flattening; similar shapes then
+get nearby vectors whatever their duration or level.
+
+Two modes:
+
+- 'exact': a BallTree over the vectors. New vectors go to a small buffer that
+  is searched by brute force and merged into the tree once it outgrows
+  `rebuild_fraction` of it, so `add` stays cheap while data arrives.
+- 'pq': product quantization. The vector is split into `n_subspaces` parts,
+  each encoded as one byte against a k-means codebook. Vectors are kept as
+  they are, and searched by brute force, until `train_size` have been added;
+  the codebooks are then trained on all of them and every vector is encoded.
+  Queries use asymmetric distances (one lookup table per query), so a
+  million segments cost n_subspaces bytes each and one pass of table lookups.
+"""
+import json
+import numpy as np
+from pathlib import Path
+from typing import Literal, TypedDict
+from pandas import DataFrame
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import BallTree
+
+
+class SegmentMatch(TypedDict):
+    index: int
+    distance: float
+
+
+def _resample(values: np.ndarray, length: int, normalize: bool) -> np.ndarray:
+    """(n_segments, n_rows, n_columns) equal-length segments -> (n_segments, length, n_columns)."""
+    n_rows = values.shape[1]
+    # Linear interpolation of every segment and column at once
+    positions = np.linspace(0, n_rows - 1, length)
+    lower = np.minimum(positions.astype(np.intp), n_rows - 1)
+    upper = np.minimum(lower + 1, n_rows - 1)
+    fraction = (positions - lower)[None, :, None]
+    resampled = values[:, lower] * (1.0 - fraction) + values[:, upper] * fraction
+
+    if normalize:
+        std = resampled.std(axis=1, keepdims=True)
+        resampled = (resampled - resampled.mean(axis=1, keepdims=True)) / np.where(std > 0, std, 1.0)
+    return resampled
+
+
+def _as_rows(segment: DataFrame | np.ndarray) -> np.ndarray:
+    values = np.asarray(segment, dtype=np.float64)
+    if len(values) == 0:
+        raise ValueError("Cannot resample an empty segment; drop segments with no rows first.")
+    return values[:, None] if values.ndim == 1 else values
+
+
+def resample_segments(segments: list[DataFrame] | list[np.ndarray], length: int = 32, normalize: bool = True) -> np.ndarray:
+    """
+    (n_segments, length, n_columns) float64: every segment linearly resampled
+    to `length` rows and, if `normalize`, z-normalized per column. Segments of
+    one length are resampled in a single batch.
+    """
+    rows = [_as_rows(segment) for segment in segments]
+    lengths = np.array([len(values) for values in rows])
+    n_columns = rows[0].shape[1] if rows else 0
+    out = np.empty((len(rows), length, n_columns))
+    for n_rows in np.unique(lengths):
+        members = np.flatnonzero(lengths == n_rows)
+        out[members] = _resample(np.stack([rows[i] for i in members]), length, normalize)
+    return out
+
+
+def segment_vector(segment: DataFrame | np.ndarray, length: int = 32, normalize: bool = True) -> np.ndarray:
+    """A segment resampled to `length` rows, z-normalized per column and flattened (float32)."""
+    return _resample(_as_rows(segment)[None], length, normalize)[0].ravel().astype(np.float32)
+
+
+def segment_vectors(segments: list[DataFrame] | list[np.ndarray], length: int = 32, normalize: bool = True) -> np.ndarray:
+    """segment_vector of every segment."""
+    resampled = resample_segments(segments, length, normalize)
+    return resampled.reshape(len(resampled), -1).astype(np.float32)
+
+
+class SegmentIndex:
+    """
+    Top-k similar segment search, persistable and updatable with `add`.
+
+    Args:
+        n_subspaces: 'pq' only; parts the (zero-padded) vector is split into
+        n_centroids: 'pq' only; codebook size per part (at most 256, one byte per code)
+        train_size: 'pq' only; vectors the codebooks are trained on, at least n_centroids
+        rebuild_fraction: 'exact' only; the buffer of new vectors is merged
+            into the tree once it holds this fraction of the tree's size
+    """
+    mode: Literal['exact', 'pq']
+    ids: np.ndarray
+    vectors: np.ndarray
+    codes: np.ndarray
+    codebooks: np.ndarray | None
+
+    def __init__(
+        self,
+        length: int = 32,
+        mode: Literal['exact', 'pq'] = 'exact',
+        normalize: bool = True,
+        n_subspaces: int = 16,
+        n_centroids: int = 256,
+        train_size: int = 4096,
+        rebuild_fraction: float = 0.1,
+        leaf_size: int = 40,
+        random_state: int = 42
+    ) -> None:
+        if n_centroids > 256:
+            raise ValueError("n_centroids must fit in one byte (<= 256).")
+        if train_size < n_centroids:
+            raise ValueError("train_size must be at least n_centroids.")
+        self.length = length
+        self.mode = mode
+        self.normalize = normalize
+        self.n_subspaces = n_subspaces
+        self.n_centroids = n_centroids
+        self.train_size = train_size
+        self.rebuild_fraction = rebuild_fraction
+        self.leaf_size = leaf_size
+        self.random_state = random_state
+
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        # One row of codes per subspace, so each lookup pass reads contiguous memory
+        self.codes = np.zeros((n_subspaces, 0), dtype=np.uint8)
+        self.codebooks = None
+        self._tree: BallTree | None = None
+        self._tree_size = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def vectorize(self, segments: list[DataFrame] | list[np.ndarray]) -> np.ndarray:
+        return segment_vectors(segments, self.length, self.normalize)
+
+    def add(self, segments: list[DataFrame] | list[np.ndarray], ids: np.ndarray | None = None) -> None:
+        """Index more segments; ids default to consecutive integers after the last one."""
+        vectors = self.vectorize(segments)
+        if ids is None:
+            first = int(self.ids.max()) + 1 if len(self.ids) else 0
+            ids = np.arange(first, first + len(vectors))
+        self.add_vectors(vectors, np.asarray(ids, dtype=np.int64))
+
+    def add_vectors(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        self.ids = np.concatenate([self.ids, ids])
+        if self.mode == 'pq' and self.codebooks is not None:
+            self.codes = np.concatenate([self.codes, self._encode(vectors)], axis=1)
+            return
+
+        self.vectors = vectors if len(self.vectors) == 0 else np.concatenate([self.vectors, vectors])
+        if self.mode == 'pq':
+            # Codebooks trained on a handful of vectors would quantize everything after them poorly
+            if len(self.vectors) >= self.train_size:
+                self._train(self.vectors)
+                self.codes = self._encode(self.vectors)
+                self.vectors = np.zeros((0, 0), dtype=np.float32)
+            return
+        if len(self.vectors) - self._tree_size > self.rebuild_fraction * max(self._tree_size, 1):
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._tree = BallTree(self.vectors, leaf_size=self.leaf_size)
+        self._tree_size = len(self.vectors)
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, n_subspaces, sub_dim) view of the vectors, zero-padded to a multiple of n_subspaces."""
+        dim = vectors.shape[1]
+        sub_dim = -(-dim // self.n_subspaces)
+        padded = np.zeros((len(vectors), sub_dim * self.n_subspaces), dtype=np.float32)
+        padded[:, :dim] = vectors
+        return padded.reshape(len(vectors), self.n_subspaces, sub_dim)
+
+    def _train(self, vectors: np.ndarray) -> None:
+        parts = self._split(vectors)
+        self.codebooks = np.stack([
+            MiniBatchKMeans(n_clusters=self.n_centroids, n_init=3, random_state=self.random_state)
+            .fit(parts[:, m]).cluster_centers_.astype(np.float32)
+            for m in range(self.n_subspaces)
+        ])
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        assert self.codebooks is not None
+        parts = self._split(vectors)
+        codes = np.empty((self.n_subspaces, len(vectors)), dtype=np.uint8)
+        for m, codebook in enumerate(self.codebooks):
+            # ||x - c||^2 up to the constant ||x||^2
+            scores = (codebook ** 2).sum(axis=1) - 2.0 * parts[:, m] @ codebook.T
+            codes[m] = np.argmin(scores, axis=1)
+        return codes
+
+    def _query_exact(self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        positions: list[np.ndarray] = []
+        distances: list[np.ndarray] = []
+        if self._tree is not None:
+            tree_distances, tree_positions = self._tree.query(query[None, :], k=min(k, self._tree_size))
+            positions.append(tree_positions[0])
+            distances.append(tree_distances[0])
+
+        buffered = self.vectors[self._tree_size:]
+        if len(buffered):
+            positions.append(np.arange(self._tree_size, len(self.vectors)))
+            distances.append(np.sqrt(((buffered - query) ** 2).sum(axis=1)))
+        return np.concatenate(positions), np.concatenate(distances)
+
+    def _query_pq(self, query: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if self.codebooks is None:
+            # Still collecting the training vectors
+            return np.arange(len(self.vectors)), np.sqrt(((self.vectors - query) ** 2).sum(axis=1))
+        parts = self._split(query[None, :])[0]
+        # Asymmetric distance: exact query part against every centroid, then one lookup per code
+        table = ((self.codebooks - parts[:, None, :]) ** 2).sum(axis=2)
+        squared = np.zeros(self.codes.shape[1], dtype=np.float32)
+        for m in range(self.n_subspaces):
+            squared += table[m].take(self.codes[m])
+        return np.arange(self.codes.shape[1]), np.sqrt(squared)
+
+    def query(self, segment: DataFrame | np.ndarray, k: int = 10) -> list[SegmentMatch]:
+        """The k indexed segments closest to `segment`, nearest first (approximate distances in 'pq' mode)."""
+        if len(self) == 0:
+            return []
+        query = segment_vector(segment, self.length, self.normalize)
+        positions, distances = self._query_exact(query, k) if self.mode == 'exact' else self._query_pq(query)
+
+        k = min(k, len(distances))
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top], kind='stable')]
+        return [SegmentMatch(index=int(self.ids[positions[i]]), distance=float(distances[i])) for i in top]
+
+    def save(self, path: Path) -> None:
+        meta = {
+            'length': self.length,
+            'mode': self.mode,
+            'normalize': self.normalize,
+            'n_subspaces': self.n_subspaces,
+            'n_centroids': self.n_centroids,
+            'train_size': self.train_size,
+            'rebuild_fraction': self.rebuild_fraction,
+            'leaf_size': self.leaf_size,
+            'random_state': self.random_state,
+        }
+        arrays = {'ids': self.ids, 'vectors': self.vectors, 'meta': np.array(json.dumps(meta))}
+        if self.codebooks is not None:
+            arrays['codes'] = self.codes
+            arrays['codebooks'] = self.codebooks
+        # Through a file object, since np.savez appends .npz to a path that lacks it
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: Path) -> 'SegmentIndex':
+        with np.load(path) as arrays:
+            index = cls(**json.loads(str(arrays['meta'])))
+            index.ids = arrays['ids']
+            index.vectors = arrays['vectors']
+            if 'codebooks' in arrays:
+                index.codes = arrays['codes']
+                index.codebooks = arrays['codebooks']
+            elif index.mode == 'exact' and len(index.vectors):
+                index._rebuild()
+        return index
@@ -0,0 +1,62 @@
+"""
+Pruning rates of the DTW segment search on SPY history.
+
+Segments the SPY daily bars with cusum_segmenter, indexes them, and runs a
+leave-one-out top-k query for a sample of segments, reporting how many
+candidates each lower bound pruned, how many DTWs were abandoned early, and
+the speed-up over scoring every candidate with a full DTW.
+"""
+import numpy as np
+import time
+from analysis.analyzers.data_segmenter import DataSegmenter
+from analysis.analyzers.dtw_search import DTWIndex, PruningStats, dtw_batch
+from analysis.featurizers.ohlcv_to_ohlcv_and_deltas import ohlcv_to_ohlcv_and_deltas
+from analysis.segmenters.cusum_segmenter import cusum_segmenter
+
+# EXPERIMENTAL PARAMETERS
+length = 64
+window = 0.1
+k = 5
+number_of_queries = 200
+min_segment_length = 3
+
+m = DataSegmenter(
+    'SPY',
+    transformation=ohlcv_to_ohlcv_and_deltas,
+    segmenter=cusum_segmenter,
+)
+m.load_historical()
+m.transform_data()
+segments = [segment for segment in m.segment_data() if len(segment) >= min_segment_length]
+print(f"{len(segments)} segments of at least {min_segment_length} bars")
+
+index = DTWIndex(length=length, window=window, columns=['open', 'high', 'low', 'close'])
+index.add(segments)
+
+rng = np.random.default_rng(42)
+query_ids = rng.choice(len(segments), min(number_of_queries, len(segments)), replace=False)
+
+total = PruningStats(
+    candidates=0, pruned_by_kim=0, pruned_by_keogh_query=0,
+    pruned_by_keogh_candidate=0, abandoned=0, full_dtw=0,
+)
+start = time.perf_counter()
+for query_id in query_ids:
+    _matches, stats = index.query(segments[query_id], k=k, exclude=int(query_id))
+    for key in total:
+        total[key] += stats[key]
+pruned_time = time.perf_counter() - start
+
+# Brute force on a few of the same queries, for the speed-up
+brute_force_queries = query_ids[:20]
+start = time.perf_counter()
+for query_id in brute_force_queries:
+    _distances = dtw_batch(index.series[query_id], index.series, index.radius)
+brute_force_time = (time.perf_counter() - start) / len(brute_force_queries) * len(query_ids)
+
+print(f"\n{len(query_ids)} queries, top-{k}, band {index.radius} of {length} steps")
+for key in ('pruned_by_kim', 'pruned_by_keogh_query', 'pruned_by_keogh_candidate', 'abandoned', 'full_dtw'):
+    print(f"  {key:<26} {total[key] / total['candidates']:7.2%}")
+print(f"  {'pruned without any DTW':<26} {(total['pruned_by_kim'] + total['pruned_by_keogh_query'] + total['pruned_by_keogh_candidate']) / total['candidates']:7.2%}")
+print(f"\nCascade: {pruned_time / len(query_ids) * 1000:.2f} ms/query")
+print(f"Full DTW: {brute_force_time / len(query_ids) * 1000:.2f} ms/query ({brute_force_time / pruned_time:.1f}x slower)")
@@ -0,0 +1,55 @@
+"""
+Latency and throughput of the micro-batched inference service.
+
+Loads a StockTransformer from a Trainer checkpoint (or, without one, a
+freshly initialized model: latency does not depend on the weights), scores
+sequences one forward pass at a time as Trainer.predict does, then load-tests
+an InferenceService from concurrent client threads and reports p50/p99
+latency and throughput.
+"""
+import numpy as np
+import time
+import torch
+from pathlib import Path
+from analysis.trainers.inference_service import InferenceService, load_test
+from analysis.trainers.stock_transformer import StockTransformer
+
+# EXPERIMENTAL PARAMETERS
+checkpoint: Path | None = None
+d_model = 90
+nhead = 6
+num_layers = 2
+dim_feedforward = 256
+sequence_length = 50
+number_of_sequences = 512
+requests = 5000
+concurrency = 64
+max_batch_size = 128
+max_latency_ms = 5.0
+
+model = StockTransformer(d_model=d_model, nhead=nhead, num_layers=num_layers, dim_feedforward=dim_feedforward)
+if checkpoint is not None:
+    service = InferenceService.from_checkpoint(checkpoint, model, max_batch_size=max_batch_size, max_latency_ms=max_latency_ms)
+else:
+    service = InferenceService(model, np.zeros(d_model), np.ones(d_model), max_batch_size=max_batch_size, max_latency_ms=max_latency_ms)
+
+rng = np.random.default_rng(42)
+sequences = list(rng.standard_normal((number_of_sequences, sequence_length, d_model)).astype(np.float32))
+
+# One sequence per forward pass, as Trainer.predict
+model.eval()
+single_requests = 500
+start = time.perf_counter()
+with torch.no_grad():
+    for i in range(single_requests):
+        _ = model(torch.FloatTensor(sequences[i % len(sequences)]).unsqueeze(0)).numpy()
+single_seconds = time.perf_counter() - start
+print(f"Per-call: {single_seconds / single_requests * 1000:.2f} ms/request, {single_requests / single_seconds:,.0f} requests/s")
+
+with service:
+    report = load_test(service, sequences, requests=requests, concurrency=concurrency)
+print(
+    f"Service: {report['requests_per_second']:,.0f} requests/s with {concurrency} clients, "
+    f"p50 {report['p50_ms']:.2f} ms, p99 {report['p99_ms']:.2f} ms, max {report['max_ms']:.2f} ms, "
+    f"mean batch {report['mean_batch_size']:.1f}"
+)
@@ -0,0 +1,93 @@
+from sklearn.mixture import GaussianMixture
+from sklearn.preprocessing import StandardScaler
+import numpy as np
+from pathlib import Path
+import pickle
+
+
+class GaussianMixturePipeline:
+    """
+    A fitted StandardScaler + GaussianMixture pair, persisted as one artifact.
+
+    The data attached with `fit` or `attach` is scaled once; its posterior
+    probabilities and labels are computed on first use and then cached, so
+    reports that look at the same windows several times share one pass.
+    """
+    model: GaussianMixture
+    scaler: StandardScaler | None
+    data: np.ndarray | None
+    scaled_data: np.ndarray | None
+
+    def __init__(self, model: GaussianMixture, scaler: StandardScaler | None = None) -> None:
+        self.model = model
+        self.scaler = scaler
+        self.data = None
+        self.scaled_data = None
+        self._probabilities: np.ndarray | None = None
+
+    @classmethod
+    def load(cls, path: Path) -> 'GaussianMixturePipeline':
+        """Load a pipeline saved with `save`, or a bare pickled GaussianMixture (no scaler)."""
+        with open(path, 'rb') as f:
+            artifact = pickle.load(f)
+
+        if isinstance(artifact, GaussianMixture):
+            return cls(model=artifact)
+        return cls(model=artifact['model'], scaler=artifact['scaler'])
+
+    def save(self, path: Path) -> None:
+        with open(path, 'wb') as f:
+            pickle.dump({'model': self.model, 'scaler': self.scaler}, f)
+
+    def attach(self, data: np.ndarray, scaled_data: np.ndarray | None = None) -> np.ndarray:
+        """
+        Scale `data` once and cache it. Without a persisted scaler one is
+        fitted on `data`, as the scripts used to do. Pass `scaled_data` when
+        it was already produced by this pipeline's scaler.
+        """
+        if self.scaler is None:
+            self.scaler = StandardScaler().fit(data)
+
+        self.data = data
+        self.scaled_data = self.scaler.transform(data) if scaled_data is None else scaled_data
+        self._probabilities = None
+        return self.scaled_data
+
+    def fit(self, data: np.ndarray) -> np.ndarray:
+        """Fit the scaler and the mixture on `data`; returns its labels."""
+        self.scaler = None
+        scaled_data = self.attach(data)
+        self.model.fit(scaled_data)
+        return self.labels
+
+    def transform(self, data: np.ndarray) -> np.ndarray:
+        if self.scaler is None:
+            raise ValueError("The pipeline has no fitted scaler; call fit or attach first.")
+        return self.scaler.transform(data)
+
+    def predict(self, data: np.ndarray) -> np.ndarray:
+        """Labels of new (unscaled) data, without touching the cache."""
+        return self.model.predict(self.transform(data))
+
+    def _attached(self) -> np.ndarray:
+        if self.scaled_data is None:
+            raise ValueError("No data attached; call fit or attach first.")
+        return self.scaled_data
+
+    @property
+    def probabilities(self) -> np.ndarray:
+        """Posterior probabilities of the attached data."""
+        if self._probabilities is None:
+            self._probabilities = self.model.predict_proba(self._attached())
+        return self._probabilities
+
+    @property
+    def labels(self) -> np.ndarray:
+        # predict is the argmax of the same posteriors
+        return np.argmax(self.probabilities, axis=1)
+
+    def bic(self) -> float:
+        return self.model.bic(self._attached())
+
+    def aic(self) -> float:
+        return self.model.aic(self._attached())
@@ -6,60 +6,85 @@ from sklearn.mixture import GaussianMixture
 from sklearn.preprocessing import StandardScaler
 import numpy as np
 # from analysis.analyzers.data_loader import DataLoader
-# from pathlib import Path
+from pathlib import Path
 import matplotlib.pyplot as plt
 from sklearn.decomposition import PCA
 # import pandas as pd
-from sklearn.neighbors import NearestNeighbors
 import matplotlib.pyplot as plt
-from sklearn.cluster import DBSCAN
 from sklearn.metrics import silhouette_score
+from analysis.categorizers.gaussian_mixture_pipeline import GaussianMixturePipeline
+from analysis.categorizers.neighbor_search import ChunkedNeighbors, knee_eps, knee_index
 
 
 class GaussianMixtureCategorizer:
-    labels: np.ndarray[tuple[Any, ...], np.dtype[np.Any]]
+    labels: np.ndarray[tuple[Any, ...], np.dtype[Any]]
     gmm: GaussianMixture
+    pipeline: GaussianMixturePipeline
 
     def __init__(self, data: np.ndarray | None = None):
         self.data = data
+        self.scaler: StandardScaler | None = None
+        self._scaled_data: np.ndarray | None = None
 
-    def gaussian_mixtures(self) -> np.ndarray[tuple[Any, ...], np.dtype[np.Any]]:
+    @property
+    def scaled_data(self) -> np.ndarray:
+        """self.data scaled once and shared by every method below"""
+        if self._scaled_data is None:
+            self.scaler = StandardScaler().fit(self.data)
+            self._scaled_data = self.scaler.transform(self.data)
+        return self._scaled_data
+
+    def gaussian_mixtures(self) -> np.ndarray[tuple[Any, ...], np.dtype[Any]]:
         # Assuming self.data is a 2D array-like structure
-        scaled_data: np.ndarray = StandardScaler().fit_transform(self.data)
+        scaled_data: np.ndarray = self.scaled_data
         gmm = GaussianMixture(n_components=10, covariance_type='full', random_state=42)
-        self.labels = gmm.fit_predict(scaled_data)
+        gmm.fit(scaled_data)
         self.gmm: GaussianMixture = gmm
+
+        # The pipeline caches the posteriors; labels are their argmax, as fit_predict returns
+        self.pipeline = GaussianMixturePipeline(model=gmm, scaler=self.scaler)
+        _ = self.pipeline.attach(self.data, scaled_data=scaled_data)
+        self.labels = self.pipeline.labels
         return self.labels
+
+    def save_pipeline(self, path: Path) -> None:
+        """Persist the fitted scaler + mixture for analyze_gmm.py and CandlesToLettersTokenizer."""
+        self.pipeline.save(path)
     
-    def categorize(self) -> np.ndarray[tuple[Any, ...], np.dtype[np.Any]]:
-        scaled_data: np.ndarray = StandardScaler().fit_transform(self.data)
-        
+    def categorize(self, eps: float | None = 0.5, min_samples: int = 5, chunk_size: int = 65536, n_jobs: int = 4) -> np.ndarray[tuple[Any, ...], np.dtype[Any]]:
+        """DBSCAN over the chunked tree index; eps=None picks eps at the knee of the k-distance curve."""
+        scaled_data: np.ndarray = self.scaled_data
+        self.neighbors = ChunkedNeighbors(chunk_size=chunk_size, n_jobs=n_jobs).fit(scaled_data)
+
+        if eps is None:
+            eps = knee_eps(self.neighbors.k_distance(min_samples))
+        self.eps = eps
+
         # DBSCAN automatically finds number of clusters
-        clustering = DBSCAN(eps=0.5, min_samples=5)
-        self.labels = clustering.fit_predict(scaled_data)
+        self.labels = self.neighbors.dbscan(eps=eps, min_samples=min_samples)
         
         return self.labels
     
-
-
-    def find_optimal_eps(self, data: np.ndarray, min_samples: int = 5) -> np.ndarray:
+    def find_optimal_eps(self, data: np.ndarray, min_samples: int = 5, plot: bool = True, chunk_size: int = 65536, n_jobs: int = 4) -> np.ndarray:
         """Find optimal eps using k-distance graph"""
-        neighbors = NearestNeighbors(n_neighbors=min_samples)
-        neighbors_fit: NearestNeighbors = neighbors.fit(data)
-        distances, _indices = neighbors_fit.kneighbors(data)
+        neighbors = ChunkedNeighbors(chunk_size=chunk_size, n_jobs=n_jobs).fit(data)
         
         # Sort distances to min_samples-th nearest neighbor
-        distances = np.sort(distances[:, min_samples-1], axis=0)
-        
-        # Plot to find elbow (optimal eps)
-        plt.figure(figsize=(8, 4))
-        plt.plot(distances)
-        plt.xlabel('Points sorted by distance')
-        plt.ylabel(f'{min_samples}-NN distance')
-        plt.title('K-distance Graph for Optimal Eps')
-        plt.show()
+        distances = np.sort(neighbors.k_distance(min_samples))
+        knee = knee_index(distances)
+        self.eps = float(distances[knee])
+        
+        if plot:
+            # Knee marked where the curve bends upward most sharply
+            plt.figure(figsize=(8, 4))
+            plt.plot(distances)
+            plt.axhline(self.eps, color='red', linestyle='--', label=f'eps = {self.eps:.3f}')
+            plt.xlabel('Points sorted by distance')
+            plt.ylabel(f'{min_samples}-NN distance')
+            plt.title('K-distance Graph for Optimal Eps')
+            plt.legend()
+            plt.show()
         
-        # Return suggested eps (where curve has steepest slope)
         return distances
 
     def categorize_large_dataset(self) -> np.ndarray[tuple[Any, ...], dtype[Any]]:
@@ -67,7 +92,7 @@ class GaussianMixtureCategorizer:
         from sklearn.metrics import silhouette_score
         import numpy as np
         
-        scaled_data: np.ndarray = StandardScaler().fit_transform(self.data)
+        scaled_data: np.ndarray = self.scaled_data
         
         # Sample for parameter tuning (use 5000 points)
         n_sample: int = min(5000, len(scaled_data))
@@ -99,13 +124,54 @@ class GaussianMixtureCategorizer:
         print(f"Full data silhouette: {final_score:.3f}")
         
         return self.labels
-    
+
+    def categorize_large_dataset_fast(
+        self,
+        k_range: range = range(2, 15),
+        n_jobs: int = 4,
+        silhouette_sample_size: int = 2000,
+        n_bootstrap: int = 20
+    ) -> np.ndarray[tuple[Any, ...], dtype[Any]]:
+        """
+        categorize_large_dataset with bounded cost: k is chosen by select_k
+        (parallel MiniBatchKMeans, bootstrapped sampled silhouette) and the
+        full-data silhouette is estimated on a sample as well.
+        """
+        from sklearn.cluster import MiniBatchKMeans
+        from analysis.categorizers.k_selection import select_k
+
+        scaled_data: np.ndarray = self.scaled_data
+
+        self.k_selection = select_k(
+            scaled_data,
+            k_range=k_range,
+            n_jobs=n_jobs,
+            silhouette_sample_size=silhouette_sample_size,
+            n_bootstrap=n_bootstrap,
+        )
+        best_k = self.k_selection['best_k']
+        best_row = self.k_selection['scores'].set_index('k').loc[best_k]
+
+        final_kmeans = MiniBatchKMeans(n_clusters=best_k, batch_size=4096, n_init=3, random_state=42)
+        self.labels = final_kmeans.fit_predict(scaled_data)
+
+        final_score = silhouette_score(
+            scaled_data, self.labels,
+            sample_size=min(silhouette_sample_size, len(scaled_data)), random_state=42,
+        )
+
+        print(f"Optimal clusters: {best_k} (best in {self.k_selection['selection_frequency']:.0%} of bootstrap samples)")
+        print(f"Sample silhouette: {best_row['silhouette']:.3f} [95% CI {best_row['ci_low']:.3f}, {best_row['ci_high']:.3f}]")
+        print(f"Full data silhouette (sampled): {final_score:.3f}")
+
+        return self.labels
+
     def get_classification_stats(self):
         """Get statistics about the classification quality"""
-        scaled_data = StandardScaler().fit_transform(self.data)
+        scaled_data = self.scaled_data
         
         # Cluster probabilities for uncertainty analysis
-        probs = self.gmm.predict_proba(scaled_data)
+        probs = self.pipeline.probabilities
         max_probs = np.max(probs, axis=1)
         
         # Cluster sizes
@@ -120,8 +186,8 @@ class GaussianMixtureCategorizer:
             'min_confidence': np.min(max_probs),
             'low_confidence_pct': np.mean(max_probs < 0.5) * 100,
             # 'silhouette_score': self._silhouette_score(scaled_data, self.unique_labels),
-            'bic_score': self.gmm.bic(scaled_data),
-            'aic_score': self.gmm.aic(scaled_data)
+            'bic_score': self.pipeline.bic(),
+            'aic_score': self.pipeline.aic()
         }
         
         return stats
@@ -147,8 +213,8 @@ class GaussianMixtureCategorizer:
         axes[0,0].set_ylabel('Count')
         
         # Prediction confidence distribution
-        scaled_data = StandardScaler().fit_transform(self.data)
-        probs = self.gmm.predict_proba(scaled_data)
+        scaled_data = self.scaled_data
+        probs = self.pipeline.probabilities
         max_probs = np.max(probs, axis=1)
         axes[0,1].hist(max_probs, bins=50, alpha=0.7)
         axes[0,1].set_title('Prediction Confidence Distribution')
@@ -219,6 +285,7 @@ class GaussianMixtureCategorizer:
 
 # windows = StandardScaler().fit_transform(windows)
 
+# Parallel version with warm starts and early stopping: analysis/categorizers/gmm_model_selection.py
 # n_components_range = range(19, 30) # ConvergenceWarning for n_components > 20
 # bic_scores = []
 
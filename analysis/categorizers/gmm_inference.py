@@ -0,0 +1,104 @@
+"""
+Low-latency Gaussian mixture inference for live window classification.
+
+Everything that does not depend on the window is precomputed from the
+pickled model: the Cholesky factors of the precisions, the log-determinants
+and mixture weights, and the StandardScaler, which is folded into the
+factors. Scoring a window then costs one matrix product
+
+    y = x @ W + b    (W: n_features x n_components * n_features)
+
+followed by a sum of squares per component, with no sklearn validation
+overhead. Large batches are scored in float32 blocks.
+"""
+import numpy as np
+from pathlib import Path
+from scipy.special import logsumexp
+from sklearn.mixture import GaussianMixture
+from sklearn.preprocessing import StandardScaler
+from analysis.categorizers.gaussian_mixture_pipeline import GaussianMixturePipeline
+
+
+def _full_precisions_cholesky(model: GaussianMixture) -> np.ndarray:
+    """(n_components, n_features, n_features) precision Cholesky factors for any covariance type."""
+    n_components, n_features = model.means_.shape
+    prec_chol = np.asarray(model.precisions_cholesky_, dtype=np.float64)
+
+    if model.covariance_type == 'full':
+        return prec_chol
+    if model.covariance_type == 'tied':
+        return np.broadcast_to(prec_chol, (n_components, n_features, n_features)).copy()
+    if model.covariance_type == 'diag':
+        return np.stack([np.diag(row) for row in prec_chol])
+    # spherical: one scalar per component
+    return prec_chol[:, None, None] * np.eye(n_features)
+
+
+class GaussianMixtureInference:
+    """
+    Precomputed GaussianMixture scorer; labels and probabilities match
+    `GaussianMixture.predict`/`predict_proba` (after the pipeline's scaler)
+    up to floating-point tolerance.
+    """
+    n_components: int
+    n_features: int
+    weights: np.ndarray
+    bias: np.ndarray
+    log_constant: np.ndarray
+
+    def __init__(self, model: GaussianMixture, scaler: StandardScaler | None = None, block_size: int = 8192) -> None:
+        self.n_components, self.n_features = model.means_.shape
+        self.block_size = block_size
+
+        prec_chol = _full_precisions_cholesky(model)
+        log_det = np.sum(np.log(np.diagonal(prec_chol, axis1=1, axis2=2)), axis=1)
+
+        # (x - center) / scale @ P - mean @ P  ==  x @ (P / scale) - (center / scale + mean) @ P
+        center = np.zeros(self.n_features) if scaler is None or scaler.mean_ is None else scaler.mean_
+        scale = np.ones(self.n_features) if scaler is None or scaler.scale_ is None else scaler.scale_
+        shifted_means = center / scale + model.means_
+
+        self.weights = np.concatenate([p / scale[:, None] for p in prec_chol], axis=1)
+        self.bias = -np.concatenate([m @ p for m, p in zip(shifted_means, prec_chol)])
+        self.log_constant = np.log(model.weights_) + log_det - 0.5 * self.n_features * np.log(2 * np.pi)
+
+        self._weights32 = self.weights.astype(np.float32)
+        self._bias32 = self.bias.astype(np.float32)
+
+    @classmethod
+    def from_pipeline(cls, pipeline: GaussianMixturePipeline, block_size: int = 8192) -> 'GaussianMixtureInference':
+        return cls(pipeline.model, pipeline.scaler, block_size=block_size)
+
+    @classmethod
+    def load(cls, path: Path, block_size: int = 8192) -> 'GaussianMixtureInference':
+        """From a pipeline artifact or a bare gmm_model.pkl (the latter expects already-scaled windows)."""
+        return cls.from_pipeline(GaussianMixturePipeline.load(path), block_size=block_size)
+
+    def _weighted_log_prob(self, X: np.ndarray, float32: bool) -> np.ndarray:
+        weights, bias = (self._weights32, self._bias32) if float32 else (self.weights, self.bias)
+        y = X @ weights + bias
+        mahalanobis = np.square(y).reshape(len(X), self.n_components, self.n_features).sum(axis=2)
+        return self.log_constant - 0.5 * mahalanobis
+
+    def classify_one(self, window: np.ndarray) -> int:
+        """Label of a single flattened (unscaled) window, in float64."""
+        y = window @ self.weights + self.bias
+        mahalanobis = np.square(y).reshape(self.n_components, self.n_features).sum(axis=1)
+        return int(np.argmax(self.log_constant - 0.5 * mahalanobis))
+
+    def weighted_log_prob(self, X: np.ndarray, float32: bool = True) -> np.ndarray:
+        """(n_windows, n_components) log(weight_k * N(x | k)), scored in blocks of `block_size` rows."""
+        X = np.asarray(X)
+        dtype = np.float32 if float32 else np.float64
+        out = np.empty((len(X), self.n_components))
+        for start in range(0, len(X), self.block_size):
+            block = np.asarray(X[start:start + self.block_size], dtype=dtype)
+            out[start:start + len(block)] = self._weighted_log_prob(block, float32)
+        return out
+
+    def predict(self, X: np.ndarray, float32: bool = True) -> np.ndarray:
+        return np.argmax(self.weighted_log_prob(X, float32), axis=1)
+
+    def predict_proba(self, X: np.ndarray, float32: bool = True) -> np.ndarray:
+        weighted = self.weighted_log_prob(X, float32)
+        return np.exp(weighted - logsumexp(weighted, axis=1, keepdims=True))
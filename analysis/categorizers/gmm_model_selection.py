@@ -0,0 +1,204 @@
+"""
+Parallel BIC sweep over GaussianMixture component counts and covariance types.
+
+Replaces the serial sweep commented out at the bottom of gaussian_mixtures.py:
+
+- the scaled window matrix is placed in shared memory once and every
+  worker process maps it instead of receiving a copy;
+- one k-means++ seeding with the largest component count is computed up
+  front, and each candidate starts from its first n centres (k-means++ picks
+  centres one at a time, so a prefix is itself a k-means++ seeding);
+- per covariance type, candidates are evaluated in increasing n and the
+  sweep stops once BIC has failed to improve on the best `patience` times
+  in a row;
+- only the best model is kept, together with a compact score table.
+"""
+import numpy as np
+import pandas as pd
+import pickle
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Sequence, TypedDict
+from sklearn.cluster import kmeans_plusplus
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.mixture import GaussianMixture
+from sklearn.preprocessing import StandardScaler
+from analysis.categorizers.gaussian_mixture_pipeline import GaussianMixturePipeline
+
+
+class CandidateScore(TypedDict):
+    covariance_type: str
+    n_components: int
+    bic: float
+    converged: bool
+    n_iter: int
+
+
+class ModelSelectionResult(TypedDict):
+    pipeline: GaussianMixturePipeline
+    scores: pd.DataFrame
+
+
+# Set in each worker by _attach_shared_data
+_shared_data: np.ndarray | None = None
+_shared_block: shared_memory.SharedMemory | None = None
+
+
+def _attach_shared_data(name: str, shape: tuple[int, ...], dtype: str) -> None:
+    global _shared_data, _shared_block
+    _shared_block = shared_memory.SharedMemory(name=name)
+    _shared_data = np.ndarray(shape, dtype=dtype, buffer=_shared_block.buf)
+
+
+def _fit_candidate(
+    covariance_type: str,
+    n_components: int,
+    means_init: np.ndarray,
+    reg_covar: float,
+    max_iter: int,
+    random_state: int
+) -> tuple[CandidateScore, bytes]:
+    """Fit one candidate on the shared matrix; the model comes back pickled."""
+    assert _shared_data is not None
+    gmm = GaussianMixture(
+        n_components=n_components,
+        covariance_type=covariance_type,
+        reg_covar=reg_covar,
+        max_iter=max_iter,
+        means_init=means_init,
+        random_state=random_state,
+    )
+    with warnings.catch_warnings():
+        # Non-convergence is recorded in the score table instead
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        _: GaussianMixture = gmm.fit(_shared_data)
+
+    score = CandidateScore(
+        covariance_type=covariance_type,
+        n_components=n_components,
+        bic=float(gmm.bic(_shared_data)),
+        converged=bool(gmm.converged_),
+        n_iter=int(gmm.n_iter_),
+    )
+    return score, pickle.dumps(gmm)
+
+
+def select_gaussian_mixture(
+    data: np.ndarray,
+    n_components_range: Sequence[int] = range(2, 30),
+    covariance_types: Sequence[str] = ('diag', 'full'),
+    n_jobs: int = 4,
+    patience: int = 3,
+    reg_covar: float = 1e-6,
+    max_iter: int = 100,
+    random_state: int = 42,
+    output_dir: Path | None = None,
+) -> ModelSelectionResult:
+    """
+    Pick the lowest-BIC mixture over `n_components_range` x `covariance_types`.
+
+    Args:
+        data: unscaled (n_windows, n_features) matrix; it is standardized here
+            and the scaler is returned with the best model
+        patience: stop a covariance type after this many consecutive
+            component counts that do not beat its best BIC
+        output_dir: if given, the best pipeline is written to gmm_model.pkl
+            and the score table to model_selection_scores.csv
+
+    Returns:
+        the best GaussianMixturePipeline and the table of evaluated candidates
+    """
+    n_components_range = sorted(n_components_range)
+    scaler = StandardScaler().fit(data)
+    scaled = np.ascontiguousarray(scaler.transform(data))
+
+    centers, _indices = kmeans_plusplus(scaled, n_clusters=n_components_range[-1], random_state=random_state)
+
+    block = shared_memory.SharedMemory(create=True, size=scaled.nbytes)
+    try:
+        shared = np.ndarray(scaled.shape, dtype=scaled.dtype, buffer=block.buf)
+        shared[:] = scaled
+
+        scores: list[CandidateScore] = []
+        best_bic = np.inf
+        best_model: bytes | None = None
+
+        # Per covariance type: index of the next candidate to submit, results
+        # waiting to be evaluated in order, best BIC and misses since the best
+        next_index = {covariance_type: 0 for covariance_type in covariance_types}
+        evaluated = {covariance_type: 0 for covariance_type in covariance_types}
+        pending: dict[str, dict[int, tuple[CandidateScore, bytes]]] = {covariance_type: {} for covariance_type in covariance_types}
+        type_best = {covariance_type: np.inf for covariance_type in covariance_types}
+        misses = {covariance_type: 0 for covariance_type in covariance_types}
+        stopped: set[str] = set()
+
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_attach_shared_data,
+            initargs=(block.name, scaled.shape, scaled.dtype.str),
+        ) as executor:
+            running: dict[Future[tuple[CandidateScore, bytes]], str] = {}
+
+            def _submit_more() -> None:
+                # Round-robin over covariance types, at most n_jobs fits in flight
+                while len(running) < n_jobs:
+                    candidates = [
+                        covariance_type for covariance_type in covariance_types
+                        if covariance_type not in stopped and next_index[covariance_type] < len(n_components_range)
+                    ]
+                    if not candidates:
+                        return
+                    covariance_type = min(candidates, key=lambda c: next_index[c])
+                    n_components = n_components_range[next_index[covariance_type]]
+                    next_index[covariance_type] += 1
+                    future = executor.submit(
+                        _fit_candidate, covariance_type, n_components,
+                        centers[:n_components], reg_covar, max_iter, random_state,
+                    )
+                    running[future] = covariance_type
+
+            _submit_more()
+            while running:
+                done, _not_done = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    covariance_type = running.pop(future)
+                    score, model = future.result()
+                    pending[covariance_type][score['n_components']] = (score, model)
+
+                    # Evaluate in increasing n so early stopping sees the BIC curve in order
+                    while covariance_type not in stopped and evaluated[covariance_type] < len(n_components_range):
+                        n_components = n_components_range[evaluated[covariance_type]]
+                        if n_components not in pending[covariance_type]:
+                            break
+                        score, model = pending[covariance_type].pop(n_components)
+                        evaluated[covariance_type] += 1
+                        scores.append(score)
+
+                        if score['bic'] < best_bic:
+                            best_bic, best_model = score['bic'], model
+                        if score['bic'] < type_best[covariance_type]:
+                            type_best[covariance_type] = score['bic']
+                            misses[covariance_type] = 0
+                        else:
+                            misses[covariance_type] += 1
+                            if misses[covariance_type] >= patience:
+                                stopped.add(covariance_type)
+                                pending[covariance_type].clear()
+
+                _submit_more()
+    finally:
+        block.close()
+        block.unlink()
+
+    assert best_model is not None
+    pipeline = GaussianMixturePipeline(model=pickle.loads(best_model), scaler=scaler)
+    table = pd.DataFrame(scores).sort_values(['covariance_type', 'n_components']).reset_index(drop=True)
+
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        pipeline.save(output_dir/'gmm_model.pkl')
+        table.to_csv(output_dir/'model_selection_scores.csv', index=False)
+
+    return ModelSelectionResult(pipeline=pipeline, scores=table)
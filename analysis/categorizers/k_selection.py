@@ -0,0 +1,120 @@
+"""
+Bounded-cost selection of the number of k-means clusters.
+
+Candidate values of k are scored in parallel across processes on a fixed
+sample of the data. Each of `n_bootstrap` replicates resamples that sample
+with replacement, refits MiniBatchKMeans(k) on the resample and scores the
+clustering by silhouette on `silhouette_sample_size` distinct points of
+it. Silhouette is quadratic in the number of points and the fits are
+bounded by `sample_size`, so the cost does not grow with the dataset. The
+replicates give each k a confidence interval and tell how often the
+chosen k wins.
+"""
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Sequence, TypedDict
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+
+class KSelectionResult(TypedDict):
+    best_k: int
+    # How often best_k had the highest silhouette across bootstrap replicates
+    selection_frequency: float
+    # One row per k: mean silhouette and its 95% bootstrap interval
+    scores: pd.DataFrame
+
+
+def _bootstrap_indices(
+    n: int,
+    silhouette_sample_size: int,
+    n_bootstrap: int,
+    random_state: int
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Per replicate, the (fit, score) indices into the sample: n draws with
+    replacement, and up to `silhouette_sample_size` distinct points among
+    them (repeated points would have zero distance to themselves and
+    inflate the silhouette). The same replicates serve every k, so they
+    can be compared across k.
+    """
+    rng = np.random.default_rng(random_state)
+    replicates = []
+    for _ in range(n_bootstrap):
+        fit = rng.choice(n, n, replace=True)
+        distinct = np.unique(fit)
+        replicates.append((fit, rng.choice(distinct, min(silhouette_sample_size, len(distinct)), replace=False)))
+    return replicates
+
+
+def _score_k(
+    k: int,
+    sample: np.ndarray,
+    bootstrap_indices: list[tuple[np.ndarray, np.ndarray]],
+    batch_size: int,
+    random_state: int
+) -> np.ndarray:
+    """Silhouette of MiniBatchKMeans(k), refitted on every bootstrap resample of `sample`."""
+    scores = np.full(len(bootstrap_indices), np.nan)
+    for b, (fit, score) in enumerate(bootstrap_indices):
+        model = MiniBatchKMeans(n_clusters=k, batch_size=batch_size, n_init=3, random_state=random_state + b).fit(sample[fit])
+        labels = model.predict(sample[score])
+        if len(np.unique(labels)) > 1:
+            scores[b] = silhouette_score(sample[score], labels)
+    return scores
+
+
+def select_k(
+    data: np.ndarray,
+    k_range: Sequence[int] = range(2, 15),
+    n_jobs: int = 4,
+    sample_size: int = 20000,
+    silhouette_sample_size: int = 2000,
+    n_bootstrap: int = 20,
+    batch_size: int = 1024,
+    random_state: int = 42
+) -> KSelectionResult:
+    """
+    Choose k by bootstrapped, sampled silhouette.
+
+    Args:
+        data: scaled (n_samples, n_features) matrix
+        sample_size: points the bootstrap resamples are drawn from
+        silhouette_sample_size: points per silhouette evaluation (cost ~ this squared)
+        n_bootstrap: resamples, hence fits and silhouette evaluations, per k
+    """
+    rng = np.random.default_rng(random_state)
+    sample = data[np.sort(rng.choice(len(data), min(sample_size, len(data)), replace=False))]
+    bootstrap_indices = _bootstrap_indices(len(sample), silhouette_sample_size, n_bootstrap, random_state)
+
+    k_values = list(k_range)
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [
+                executor.submit(_score_k, k, sample, bootstrap_indices, batch_size, random_state)
+                for k in k_values
+            ]
+            replicate_scores = np.stack([future.result() for future in futures])
+    else:
+        replicate_scores = np.stack([_score_k(k, sample, bootstrap_indices, batch_size, random_state) for k in k_values])
+
+    # replicate_scores: (n_k, n_bootstrap)
+    mean = np.nanmean(replicate_scores, axis=1)
+    ci_low, ci_high = np.nanpercentile(replicate_scores, [2.5, 97.5], axis=1)
+    best = int(np.nanargmax(mean))
+
+    winners = np.nanargmax(np.where(np.isnan(replicate_scores), -np.inf, replicate_scores), axis=0)
+    scores = pd.DataFrame({
+        'k': k_values,
+        'silhouette': mean,
+        'ci_low': ci_low,
+        'ci_high': ci_high,
+        'win_rate': [np.mean(winners == i) for i in range(len(k_values))],
+    })
+
+    return KSelectionResult(
+        best_k=k_values[best],
+        selection_frequency=float(np.mean(winners == best)),
+        scores=scores,
+    )
@@ -0,0 +1,258 @@
+"""
+Out-of-core EM for Gaussian mixtures over window matrices that do not fit in RAM.
+
+Windows are streamed in batches from a .npy memmap (see `write_window_memmap`,
+which builds one from several tickers' frames). Each EM pass accumulates the
+sufficient statistics (responsibility sums, first and second moments) batch
+by batch, so memory is bounded by the batch size. `mode='online'` applies a
+stepwise-EM update after every batch instead of once per pass.
+
+The result is a regular sklearn `GaussianMixture` (wrapped in a
+`GaussianMixturePipeline` with the streaming-fitted scaler), so the existing
+`loaded_gmm.predict` calls in analyze_gmm.py work unchanged.
+"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Iterable, Iterator, Literal
+from scipy.linalg import solve_triangular
+from scipy.special import logsumexp
+from sklearn.cluster import kmeans_plusplus
+from sklearn.mixture import GaussianMixture
+from sklearn.preprocessing import StandardScaler
+from numpy.lib.stride_tricks import sliding_window_view
+from analysis.categorizers.gaussian_mixture_pipeline import GaussianMixturePipeline
+
+
+def write_window_memmap(
+    frames: Iterable[pd.DataFrame | np.ndarray],
+    path: Path,
+    window_size: int = 5,
+    dtype: str = 'float32'
+) -> np.ndarray:
+    """
+    Write the flattened `window_size`-bar windows of every frame into one .npy memmap.
+
+    Windows never span two frames, so pass one frame per ticker (or session).
+    """
+    frames = [np.asarray(frame, dtype=np.float64) for frame in frames]
+    n_windows = sum(max(len(frame) - window_size + 1, 0) for frame in frames)
+    n_features = window_size * frames[0].shape[1]
+
+    windows = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(n_windows, n_features))
+    row = 0
+    for frame in frames:
+        if len(frame) < window_size:
+            continue
+        frame_windows = sliding_window_view(np.ascontiguousarray(frame).ravel(), n_features)[::frame.shape[1]]
+        windows[row:row + len(frame_windows)] = frame_windows
+        row += len(frame_windows)
+
+    windows.flush()
+    return windows
+
+
+def iter_batches(windows: np.ndarray, batch_size: int) -> Iterator[np.ndarray]:
+    for start in range(0, len(windows), batch_size):
+        yield np.asarray(windows[start:start + batch_size], dtype=np.float64)
+
+
+def _precision_cholesky(covariances: np.ndarray, covariance_type: str) -> np.ndarray:
+    if covariance_type == 'diag':
+        return 1.0 / np.sqrt(covariances)
+
+    n_features = covariances.shape[-1]
+    precisions_chol = np.empty_like(covariances)
+    for k, covariance in enumerate(covariances):
+        cov_chol = np.linalg.cholesky(covariance)
+        precisions_chol[k] = solve_triangular(cov_chol, np.eye(n_features), lower=True).T
+    return precisions_chol
+
+
+def _weighted_log_prob(
+    X: np.ndarray,
+    weights: np.ndarray,
+    means: np.ndarray,
+    precisions_chol: np.ndarray,
+    covariance_type: str
+) -> np.ndarray:
+    """log(weight_k) + log N(x | mean_k, cov_k) for every row and component, as sklearn computes it."""
+    n_features = X.shape[1]
+    if covariance_type == 'diag':
+        log_det = np.sum(np.log(precisions_chol), axis=1)
+        precisions = precisions_chol ** 2
+        log_prob = (
+            np.sum(means ** 2 * precisions, axis=1)
+            - 2.0 * X @ (means * precisions).T
+            + (X ** 2) @ precisions.T
+        )
+    else:
+        log_det = np.sum(np.log(np.diagonal(precisions_chol, axis1=1, axis2=2)), axis=1)
+        log_prob = np.empty((len(X), len(means)))
+        for k, (mean, prec_chol) in enumerate(zip(means, precisions_chol)):
+            y = X @ prec_chol - mean @ prec_chol
+            log_prob[:, k] = np.sum(y ** 2, axis=1)
+
+    return -0.5 * (n_features * np.log(2 * np.pi) + log_prob) + log_det + np.log(weights)
+
+
+class MiniBatchGaussianMixture:
+    """
+    Gaussian mixture fitted by streaming EM over batches of a (memmapped) window matrix.
+
+    Args:
+        mode: 'batch' accumulates statistics over the whole matrix and
+            updates once per pass (exact EM, out of core); 'online' updates
+            after every batch with step size (t + 2) ** -decay (stepwise EM),
+            which converges in fewer passes on very large matrices
+    """
+    covariance_type: Literal['diag', 'full']
+
+    def __init__(
+        self,
+        n_components: int,
+        covariance_type: Literal['diag', 'full'] = 'diag',
+        batch_size: int = 65536,
+        max_iter: int = 100,
+        tol: float = 1e-3,
+        reg_covar: float = 1e-6,
+        mode: Literal['batch', 'online'] = 'batch',
+        decay: float = 0.6,
+        init_sample_size: int = 100_000,
+        random_state: int = 42
+    ) -> None:
+        self.n_components = n_components
+        self.covariance_type = covariance_type
+        self.batch_size = batch_size
+        self.max_iter = max_iter
+        self.tol = tol
+        self.reg_covar = reg_covar
+        self.mode = mode
+        self.decay = decay
+        self.init_sample_size = init_sample_size
+        self.random_state = random_state
+
+    def _fit_scaler(self, windows: np.ndarray) -> StandardScaler:
+        scaler = StandardScaler()
+        for batch in iter_batches(windows, self.batch_size):
+            _: StandardScaler = scaler.partial_fit(batch)
+        return scaler
+
+    def _initialize(self, windows: np.ndarray, scaler: StandardScaler) -> None:
+        rng = np.random.default_rng(self.random_state)
+        n_sample = min(self.init_sample_size, len(windows))
+        # Sorted indices keep the memmap reads sequential
+        sample = scaler.transform(np.asarray(windows[np.sort(rng.choice(len(windows), n_sample, replace=False))], dtype=np.float64))
+
+        self.means_, _indices = kmeans_plusplus(sample, n_clusters=self.n_components, random_state=self.random_state)
+        self.weights_ = np.full(self.n_components, 1.0 / self.n_components)
+        variances = sample.var(axis=0) + self.reg_covar
+        if self.covariance_type == 'diag':
+            self.covariances_ = np.tile(variances, (self.n_components, 1))
+        else:
+            self.covariances_ = np.tile(np.diag(variances), (self.n_components, 1, 1))
+        self.precisions_cholesky_ = _precision_cholesky(self.covariances_, self.covariance_type)
+
+    def _batch_statistics(self, X: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+        """E-step on one batch: (sum resp, sum resp * x, sum resp * x x^T or x^2, sum log-likelihood)."""
+        weighted = _weighted_log_prob(X, self.weights_, self.means_, self.precisions_cholesky_, self.covariance_type)
+        log_norm = logsumexp(weighted, axis=1)
+        resp = np.exp(weighted - log_norm[:, None])
+
+        nk = resp.sum(axis=0)
+        sx = resp.T @ X
+        if self.covariance_type == 'diag':
+            sxx = resp.T @ (X ** 2)
+        else:
+            # One BLAS product per component beats a three-way einsum by far
+            sxx = np.stack([(X * resp[:, k:k + 1]).T @ X for k in range(self.n_components)])
+        return nk, sx, sxx, float(log_norm.sum())
+
+    def _m_step(self, nk: np.ndarray, sx: np.ndarray, sxx: np.ndarray) -> None:
+        nk = nk + 10 * np.finfo(float).eps
+        self.weights_ = nk / nk.sum()
+        self.means_ = sx / nk[:, None]
+        if self.covariance_type == 'diag':
+            self.covariances_ = sxx / nk[:, None] - self.means_ ** 2 + self.reg_covar
+        else:
+            outer = np.einsum('ki,kj->kij', self.means_, self.means_)
+            self.covariances_ = sxx / nk[:, None, None] - outer
+            self.covariances_ += self.reg_covar * np.eye(self.means_.shape[1])
+        self.precisions_cholesky_ = _precision_cholesky(self.covariances_, self.covariance_type)
+
+    def fit(self, windows: np.ndarray) -> GaussianMixturePipeline:
+        """
+        Fit on an (n_windows, n_features) array or memmap, reading `batch_size` rows at a time.
+
+        Returns:
+            the streaming-fitted scaler and an sklearn GaussianMixture carrying the learned parameters
+        """
+        scaler = self._fit_scaler(windows)
+        self._initialize(windows, scaler)
+
+        n_windows = len(windows)
+        lower_bound = -np.inf
+        self.converged_ = False
+        step = 0
+        running: tuple[np.ndarray, ...] | None = None
+
+        for n_iter in range(1, self.max_iter + 1):
+            total_nk = np.zeros(self.n_components)
+            total_sx = np.zeros_like(self.means_)
+            total_sxx = np.zeros_like(self.covariances_)
+            log_likelihood = 0.0
+
+            for batch in iter_batches(windows, self.batch_size):
+                X = scaler.transform(batch)
+                nk, sx, sxx, batch_log_likelihood = self._batch_statistics(X)
+                log_likelihood += batch_log_likelihood
+
+                if self.mode == 'online':
+                    # Stepwise EM: blend this batch's statistics, rescaled to the full
+                    # matrix, into the running ones and re-estimate immediately
+                    rho = (step + 2) ** -self.decay
+                    scale = n_windows / len(X)
+                    if running is None:
+                        running = (nk * scale, sx * scale, sxx * scale)
+                    else:
+                        running = tuple((1 - rho) * r + rho * s * scale for r, s in zip(running, (nk, sx, sxx)))
+                    self._m_step(*running)
+                    step += 1
+                else:
+                    total_nk += nk
+                    total_sx += sx
+                    total_sxx += sxx
+
+            if self.mode == 'batch':
+                self._m_step(total_nk, total_sx, total_sxx)
+
+            previous, lower_bound = lower_bound, log_likelihood / n_windows
+            if abs(lower_bound - previous) < self.tol:
+                self.converged_ = True
+                break
+
+        self.n_iter_ = n_iter
+        self.lower_bound_ = lower_bound
+        return GaussianMixturePipeline(model=self.to_sklearn(), scaler=scaler)
+
+    def to_sklearn(self) -> GaussianMixture:
+        """A fitted-looking sklearn GaussianMixture with these parameters, for predict/predict_proba/bic."""
+        gmm = GaussianMixture(
+            n_components=self.n_components,
+            covariance_type=self.covariance_type,
+            reg_covar=self.reg_covar,
+            random_state=self.random_state,
+        )
+        gmm.weights_ = self.weights_
+        gmm.means_ = self.means_
+        gmm.covariances_ = self.covariances_
+        gmm.precisions_cholesky_ = self.precisions_cholesky_
+        if self.covariance_type == 'diag':
+            gmm.precisions_ = self.precisions_cholesky_ ** 2
+        else:
+            gmm.precisions_ = np.einsum('kij,klj->kil', self.precisions_cholesky_, self.precisions_cholesky_)
+        gmm.converged_ = self.converged_
+        gmm.n_iter_ = self.n_iter_
+        gmm.lower_bound_ = self.lower_bound_
+        gmm.n_features_in_ = self.means_.shape[1]
+        return gmm
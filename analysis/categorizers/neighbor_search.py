@@ -0,0 +1,161 @@
+"""
+Chunked nearest-neighbour engine for k-distance curves and DBSCAN on millions of windows.
+
+The scaled matrix is indexed once in a KDTree (or BallTree). Queries are issued
+in chunks of `chunk_size` rows on a thread pool; the tree queries release the
+GIL, so the threads share one index without copying it. At most `2 * n_jobs`
+chunks are in flight, so memory is bounded by the chunk size and never by the
+full n x n neighbourhood.
+
+DBSCAN runs in two chunked passes: neighbour counts mark the core points, then
+core-core neighbourhoods are merged into clusters with a running union of
+connected components, and border points join a neighbouring core point's
+cluster. Clusters are numbered in order of their first core point, as in
+sklearn's DBSCAN.
+"""
+import numpy as np
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterator, Literal, TypeVar
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.neighbors import BallTree, KDTree
+
+T = TypeVar('T')
+
+
+def knee_index(values: np.ndarray) -> int:
+    """
+    Index of the knee of an increasing, convex curve (Kneedle): the point
+    furthest below the chord from the first to the last value.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) < 3 or values[-1] == values[0]:
+        return len(values) - 1
+    x = np.linspace(0.0, 1.0, len(values))
+    y = (values - values[0]) / (values[-1] - values[0])
+    return int(np.argmax(x - y))
+
+
+def knee_eps(k_distances: np.ndarray) -> float:
+    """DBSCAN eps at the knee of the sorted k-distance curve."""
+    distances = np.sort(k_distances)
+    return float(distances[knee_index(distances)])
+
+
+class ChunkedNeighbors:
+    """
+    Tree-backed neighbour queries over a fixed matrix, chunked and parallel.
+
+    Args:
+        chunk_size: rows per query; per-chunk memory is chunk_size x k for
+            k-NN and the chunk's total neighbourhood size for radius queries
+        n_jobs: query threads
+    """
+    tree: KDTree | BallTree
+    data: np.ndarray
+
+    def __init__(
+        self,
+        chunk_size: int = 65536,
+        n_jobs: int = 4,
+        algorithm: Literal['kd_tree', 'ball_tree'] = 'kd_tree',
+        leaf_size: int = 40
+    ) -> None:
+        self.chunk_size = chunk_size
+        self.n_jobs = n_jobs
+        self.algorithm = algorithm
+        self.leaf_size = leaf_size
+
+    def fit(self, data: np.ndarray) -> 'ChunkedNeighbors':
+        self.data = np.ascontiguousarray(data, dtype=np.float64)
+        tree_class = KDTree if self.algorithm == 'kd_tree' else BallTree
+        self.tree = tree_class(self.data, leaf_size=self.leaf_size)
+        return self
+
+    def _map_chunks(self, query: Callable[[np.ndarray], T]) -> Iterator[tuple[int, T]]:
+        """(start row, query(chunk)) for every chunk, in order, with a bounded number in flight."""
+        starts = iter(range(0, len(self.data), self.chunk_size))
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            in_flight: deque[tuple[int, Future[T]]] = deque()
+
+            def _submit() -> bool:
+                start = next(starts, None)
+                if start is None:
+                    return False
+                in_flight.append((start, executor.submit(query, self.data[start:start + self.chunk_size])))
+                return True
+
+            while len(in_flight) < 2 * self.n_jobs and _submit():
+                pass
+            while in_flight:
+                start, future = in_flight.popleft()
+                _submit()
+                yield start, future.result()
+
+    def k_distance(self, k: int) -> np.ndarray:
+        """
+        Distance from every row to its k-th nearest neighbour, the row itself
+        counting as the first (as NearestNeighbors(n_neighbors=k).kneighbors(data)[0][:, k-1]).
+        """
+        out = np.empty(len(self.data))
+        for start, distances in self._map_chunks(lambda chunk: self.tree.query(chunk, k=k)[0][:, k - 1]):
+            out[start:start + len(distances)] = distances
+        return out
+
+    def radius_counts(self, eps: float) -> np.ndarray:
+        """Number of rows within eps of every row, itself included."""
+        out = np.empty(len(self.data), dtype=np.intp)
+        for start, counts in self._map_chunks(lambda chunk: self.tree.query_radius(chunk, eps, count_only=True)):
+            out[start:start + len(counts)] = counts
+        return out
+
+    def dbscan(self, eps: float, min_samples: int = 5) -> np.ndarray:
+        """DBSCAN labels (noise is -1), equal to sklearn's up to the assignment of border points shared by two clusters."""
+        n = len(self.data)
+        core = self.radius_counts(eps) >= min_samples
+
+        # Every core point carries the representative (smallest index seen so far) of its component
+        representative = np.arange(n)
+        border_core = np.full(n, -1)
+
+        for start, neighborhoods in self._map_chunks(lambda chunk: self.tree.query_radius(chunk, eps)):
+            rows = np.arange(start, start + len(neighborhoods))
+            lengths = np.fromiter((len(neighbors) for neighbors in neighborhoods), dtype=np.intp, count=len(neighborhoods))
+            sources = np.repeat(rows, lengths)
+            targets = np.concatenate(neighborhoods) if len(neighborhoods) else np.empty(0, dtype=np.intp)
+
+            # Border points: any core neighbour decides the cluster
+            border_edges = ~core[sources] & core[targets]
+            border_core[sources[border_edges]] = targets[border_edges]
+
+            core_edges = core[sources] & core[targets]
+            a = representative[sources[core_edges]]
+            b = representative[targets[core_edges]]
+            if len(a) == 0:
+                continue
+
+            # Union the components touched by this chunk's edges
+            nodes, inverse = np.unique(np.concatenate([a, b]), return_inverse=True)
+            graph = coo_matrix(
+                (np.ones(len(a), dtype=np.int8), (inverse[:len(a)], inverse[len(a):])),
+                shape=(len(nodes), len(nodes)),
+            )
+            _n_components, component = connected_components(graph, directed=False)
+            component_min = np.full(component.max() + 1, n)
+            np.minimum.at(component_min, component, nodes)
+
+            remap = np.arange(n)
+            remap[nodes] = component_min[component]
+            representative = remap[representative]
+
+        cluster_of = np.full(n, -1)
+        cluster_of[core] = representative[core]
+        is_border = ~core & (border_core >= 0)
+        cluster_of[is_border] = representative[border_core[is_border]]
+
+        labels = np.full(n, -1)
+        clustered = cluster_of >= 0
+        # Representatives are the smallest core index of each cluster, so this numbers clusters by first core point
+        _values, labels[clustered] = np.unique(cluster_of[clustered], return_inverse=True)
+        return labels
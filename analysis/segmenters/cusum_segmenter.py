@@ -20,5 +20,7 @@ def cusum_segmenter(
             boundaries.append(i)
             cusum = cusum - cusum[i]  # Reset
     
-    segments = np.split(df, boundaries)
+    # np.split on a DataFrame returns bare arrays on recent numpy; slice the frame instead
+    edges = [0, *boundaries, len(df)]
+    segments = [df.iloc[start:end] for start, end in zip(edges[:-1], edges[1:])]
     return segments
\ No newline at end of file
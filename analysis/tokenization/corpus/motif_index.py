@@ -0,0 +1,224 @@
+"""
+Suffix-array / LCP index over a token corpus for motif mining.
+
+The selected corpus segments are concatenated with a separator after each
+one, the suffix array is built by prefix doubling (one `np.lexsort` per
+doubling round) and the LCP array by binary lifting over the rank arrays
+of each round, so the whole build is vectorized. LCPs are capped at the
+next separator, so no match ever spans two segments.
+"""
+import json
+import numpy as np
+from pathlib import Path
+from typing import TypedDict
+from analysis.tokenization.corpus.token_corpus import CorpusSegment, TokenCorpus
+
+# Text values: 0 pads past the end, 1 separates segments, code c is stored as c + 2
+_SEPARATOR = 1
+_CODE_OFFSET = 2
+
+
+class MotifOccurrence(TypedDict):
+    ticker: str
+    session: str
+    offset: int
+
+
+def suffix_array(text: np.ndarray) -> tuple[np.ndarray, list[np.ndarray]]:
+    """
+    Suffix array of `text` (positive ints) by prefix doubling.
+
+    Returns:
+        (sa, ranks): ranks[j][i] is the rank of text[i:i + 2**j] among all
+        length-2**j substrings, with equal substrings sharing a rank
+    """
+    n = len(text)
+    rank = text.astype(np.int32)
+    ranks = [rank]
+    if n == 0:
+        return np.zeros(0, dtype=np.int32), ranks
+
+    sa = np.argsort(rank, kind='stable').astype(np.int32)
+    k = 1
+    while True:
+        sorted_rank = rank[sa]
+        if n == 1 or (sorted_rank[1:] != sorted_rank[:-1]).all():
+            return sa, ranks
+
+        second = np.zeros(n, dtype=np.int32)
+        second[:n - k] = rank[k:]
+        sa = np.lexsort((second, rank)).astype(np.int32)
+
+        first_sorted, second_sorted = rank[sa], second[sa]
+        changed = (first_sorted[1:] != first_sorted[:-1]) | (second_sorted[1:] != second_sorted[:-1])
+        rank = np.empty(n, dtype=np.int32)
+        rank[sa] = np.concatenate([[1], 1 + np.cumsum(changed, dtype=np.int32)])
+        ranks.append(rank)
+        k *= 2
+
+
+def lcp_array(sa: np.ndarray, ranks: list[np.ndarray]) -> np.ndarray:
+    """lcp[i] = longest common prefix of suffixes sa[i - 1] and sa[i] (lcp[0] = 0)."""
+    n = len(sa)
+    lcp = np.zeros(n, dtype=np.int32)
+    if n < 2:
+        return lcp
+
+    a, b = sa[:-1].astype(np.int64), sa[1:].astype(np.int64)
+    common = np.zeros(n - 1, dtype=np.int64)
+
+    # Every common prefix is shorter than 2**(len(ranks) - 1), so taking each
+    # power of two at most once, largest first, reaches the exact length
+    for level in range(len(ranks) - 1, -1, -1):
+        rank = ranks[level]
+        ia, ib = a + common, b + common
+        in_range = (ia < n) & (ib < n)
+        equal = np.zeros(n - 1, dtype=bool)
+        equal[in_range] = rank[ia[in_range]] == rank[ib[in_range]]
+        common[equal] += 1 << level
+
+    lcp[1:] = common
+    return lcp
+
+
+def _room_to_separator(text: np.ndarray) -> np.ndarray:
+    """Symbols from each position up to (not including) the next separator."""
+    positions = np.arange(len(text))
+    separators = np.flatnonzero(text == _SEPARATOR)
+    return (separators[np.searchsorted(separators, positions)] - positions).astype(np.int32)
+
+
+class MotifIndex:
+    """
+    Answers motif queries over every selected ticker/session of a token corpus:
+
+        top_k(length, k)   most frequent substrings of a given length, O(n)
+        occurrences(p)     every position of pattern p, O(|p| log n)
+        longest_repeated() longest substring occurring at least twice, O(n)
+    """
+    alphabet: list[str]
+    segments: list[CorpusSegment]
+    text: np.ndarray
+    sa: np.ndarray
+    lcp: np.ndarray
+    segment_starts: np.ndarray
+    _room: np.ndarray
+
+    def __init__(
+        self,
+        alphabet: list[str],
+        segments: list[CorpusSegment],
+        text: np.ndarray,
+        sa: np.ndarray,
+        lcp: np.ndarray,
+    ) -> None:
+        self.alphabet = alphabet
+        self.segments = segments
+        self.text = text
+        self.sa = sa
+        self.lcp = lcp
+
+        separators = np.flatnonzero(text == _SEPARATOR)
+        self.segment_starts = np.concatenate([[0], separators[:-1] + 1]).astype(np.int64)
+        self._room = _room_to_separator(text)
+
+    @classmethod
+    def build(
+        cls,
+        corpus: TokenCorpus,
+        collapsed: bool = False,
+        ticker: str | None = None,
+        session: str | None = None
+    ) -> 'MotifIndex':
+        segments = corpus.select(ticker, session)
+        pieces: list[np.ndarray] = []
+        for segment in segments:
+            pieces.append(corpus.segment_codes(segment, collapsed).astype(np.int32) + _CODE_OFFSET)
+            pieces.append(np.array([_SEPARATOR], dtype=np.int32))
+        text = np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.int32)
+
+        sa, ranks = suffix_array(text)
+        lcp = lcp_array(sa, ranks)
+
+        # Matches must stop at the separator ending each segment
+        if len(sa) > 1:
+            room = _room_to_separator(text)[sa]
+            lcp[1:] = np.minimum(lcp[1:], np.minimum(room[1:], room[:-1]))
+
+        return cls(corpus.alphabet, segments, text, sa, lcp)
+
+    def save(self, path: Path) -> None:
+        # Through a file object, since np.savez appends .npz to a path that lacks it
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                text=self.text,
+                sa=self.sa,
+                lcp=self.lcp,
+                meta=np.array(json.dumps({'alphabet': self.alphabet, 'segments': self.segments})),
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> 'MotifIndex':
+        with np.load(path) as arrays:
+            meta = json.loads(str(arrays['meta']))
+            return cls(meta['alphabet'], meta['segments'], arrays['text'], arrays['sa'], arrays['lcp'])
+
+    def decode(self, position: int, length: int) -> str:
+        return ''.join(self.alphabet[value - _CODE_OFFSET] for value in self.text[position:position + length])
+
+    def locate(self, position: int) -> MotifOccurrence:
+        """Map a position in the concatenated text to its (ticker, session, offset)."""
+        i = int(np.searchsorted(self.segment_starts, position, side='right')) - 1
+        segment = self.segments[i]
+        return MotifOccurrence(ticker=segment['ticker'], session=segment['session'], offset=int(position - self.segment_starts[i]))
+
+    def top_k(self, length: int, k: int = 10) -> list[tuple[str, int]]:
+        """The k most frequent substrings of exactly `length` symbols, with their counts."""
+        if length < 1 or len(self.sa) == 0:
+            return []
+
+        # Suffixes sharing a length-`length` prefix are contiguous in the suffix array
+        group_ids = np.cumsum(self.lcp < length) - 1
+        long_enough = self._room[self.sa] >= length
+        counts = np.bincount(group_ids, weights=long_enough).astype(np.int64)
+
+        top = np.argsort(-counts, kind='stable')[:k]
+        top = top[counts[top] > 0]
+        group_starts = np.flatnonzero(self.lcp < length)
+        return [(self.decode(int(self.sa[group_starts[g]]), length), int(counts[g])) for g in top]
+
+    def _bound(self, pattern: tuple[int, ...], strict: bool) -> int:
+        """First suffix-array slot whose length-|pattern| prefix is >= (or > if strict) the pattern."""
+        lo, hi = 0, len(self.sa)
+        m = len(pattern)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = int(self.sa[mid])
+            prefix = tuple(self.text[start:start + m].tolist())
+            if prefix < pattern or (strict and prefix == pattern):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def occurrences(self, pattern: str) -> list[MotifOccurrence]:
+        """Every occurrence of `pattern`, in corpus order."""
+        if not pattern:
+            return []
+        lookup = {symbol: code for code, symbol in enumerate(self.alphabet)}
+        if any(symbol not in lookup for symbol in pattern):
+            return []
+
+        encoded = tuple(lookup[symbol] + _CODE_OFFSET for symbol in pattern)
+        lo, hi = self._bound(encoded, strict=False), self._bound(encoded, strict=True)
+        return [self.locate(int(position)) for position in np.sort(self.sa[lo:hi])]
+
+    def longest_repeated(self) -> tuple[str, list[MotifOccurrence]]:
+        """The longest motif occurring at least twice, and all of its occurrences."""
+        if len(self.lcp) < 2 or self.lcp.max() == 0:
+            return '', []
+
+        i = int(np.argmax(self.lcp))
+        motif = self.decode(int(self.sa[i]), int(self.lcp[i]))
+        return motif, self.occurrences(motif)
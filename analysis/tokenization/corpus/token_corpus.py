@@ -0,0 +1,228 @@
+"""
+Compact binary corpus of candle-letter token streams.
+
+A corpus is a directory holding:
+
+    codes.u8        every token as a uint8 code, segments back to back
+    run_codes.u8    the same streams with runs collapsed (one code per run)
+    run_lengths.u32 the length of each run in run_codes.u8
+    index.json      the alphabet and, per (ticker, session) segment, its
+                    [start, stop) offsets into codes.u8 and run_codes.u8
+
+`TokenCorpus` memory-maps the binary files, so collapsing runs and
+counting n-grams work on the codes directly, without decoding to text.
+"""
+import json
+import numpy as np
+from pathlib import Path
+from typing import Any, Sequence, TypedDict
+from analysis.tokenization.segmentation.utils.kernels import encode_symbols
+
+CODES_FILE = 'codes.u8'
+RUN_CODES_FILE = 'run_codes.u8'
+RUN_LENGTHS_FILE = 'run_lengths.u32'
+INDEX_FILE = 'index.json'
+
+
+class CorpusSegment(TypedDict):
+    ticker: str
+    session: str
+    start: int
+    stop: int
+    run_start: int
+    run_stop: int
+
+
+def collapse_runs(codes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Collapse consecutive identical codes, returning (run_codes, run_lengths)."""
+    codes = np.asarray(codes)
+    if len(codes) == 0:
+        return codes[:0], np.zeros(0, dtype=np.uint32)
+
+    run_starts = np.concatenate([[0], np.flatnonzero(codes[1:] != codes[:-1]) + 1])
+    run_lengths = np.diff(np.append(run_starts, len(codes))).astype(np.uint32)
+    return codes[run_starts], run_lengths
+
+
+def ngram_keys(codes: np.ndarray, n: int, alphabet_size: int) -> np.ndarray:
+    """Pack every length-n window of `codes` into one int64 (base alphabet_size)."""
+    if len(codes) < n:
+        return np.zeros(0, dtype=np.int64)
+
+    keys = np.zeros(len(codes) - n + 1, dtype=np.int64)
+    for offset in range(n):
+        keys = keys * alphabet_size + codes[offset:len(codes) - n + 1 + offset]
+    return keys
+
+
+def unpack_ngram_keys(keys: np.ndarray, n: int, alphabet_size: int) -> np.ndarray:
+    """Inverse of `ngram_keys`: (len(keys), n) code matrix."""
+    ngrams = np.zeros((len(keys), n), dtype=np.uint8)
+    remaining = keys.copy()
+    for offset in range(n - 1, -1, -1):
+        ngrams[:, offset] = remaining % alphabet_size
+        remaining //= alphabet_size
+    return ngrams
+
+
+class TokenCorpusWriter:
+    """Append (ticker, session) token streams to a corpus directory."""
+    path: Path
+    alphabet: list[str]
+    segments: list[CorpusSegment]
+
+    def __init__(self, path: Path, alphabet: Sequence[str]) -> None:
+        if len(alphabet) > 256:
+            raise ValueError("A token corpus stores uint8 codes; the alphabet must have at most 256 symbols.")
+
+        self.path = path
+        self.alphabet = list(alphabet)
+        self.segments = []
+        self._length = 0
+        self._run_length = 0
+
+        path.mkdir(parents=True, exist_ok=True)
+        # An index left by an earlier corpus here would describe the files truncated below
+        (path/INDEX_FILE).unlink(missing_ok=True)
+        self._codes_file = open(path/CODES_FILE, 'wb')
+        self._run_codes_file = open(path/RUN_CODES_FILE, 'wb')
+        self._run_lengths_file = open(path/RUN_LENGTHS_FILE, 'wb')
+
+    def add(self, ticker: str, session: str, tokens: str | np.ndarray) -> None:
+        """Append one segment, given as letters or as codes into the alphabet."""
+        if isinstance(tokens, str):
+            codes, _alphabet = encode_symbols(tokens, alphabet=self.alphabet)
+        else:
+            codes = np.asarray(tokens)
+            if len(codes) and (codes.min() < 0 or codes.max() >= len(self.alphabet)):
+                raise ValueError("Codes must index into the corpus alphabet.")
+            codes = codes.astype(np.uint8)
+
+        run_codes, run_lengths = collapse_runs(codes)
+
+        _ = self._codes_file.write(codes.tobytes())
+        _ = self._run_codes_file.write(run_codes.tobytes())
+        _ = self._run_lengths_file.write(run_lengths.astype('<u4').tobytes())
+
+        self.segments.append(CorpusSegment(
+            ticker=ticker,
+            session=session,
+            start=self._length,
+            stop=self._length + len(codes),
+            run_start=self._run_length,
+            run_stop=self._run_length + len(run_codes),
+        ))
+        self._length += len(codes)
+        self._run_length += len(run_codes)
+
+    def close(self) -> None:
+        for f in (self._codes_file, self._run_codes_file, self._run_lengths_file):
+            f.close()
+
+        # The index is written last, so a corpus without one is incomplete
+        with open(self.path/INDEX_FILE, 'w') as f:
+            json.dump({'version': 1, 'alphabet': self.alphabet, 'segments': self.segments}, f)
+
+    def abort(self) -> None:
+        """Close without writing the index and delete the partial token files."""
+        for f in (self._codes_file, self._run_codes_file, self._run_lengths_file):
+            f.close()
+            Path(f.name).unlink(missing_ok=True)
+
+    def __enter__(self) -> 'TokenCorpusWriter':
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, *_exc: Any) -> None:
+        # A corpus is only indexed when every segment was written
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _memmap(path: Path, dtype: str) -> np.ndarray:
+    # np.memmap refuses empty files
+    if path.stat().st_size == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
+
+
+class TokenCorpus:
+    """Read-only, memory-mapped view of a corpus written by `TokenCorpusWriter`."""
+    path: Path
+    alphabet: list[str]
+    segments: list[CorpusSegment]
+    codes: np.ndarray
+    run_codes: np.ndarray
+    run_lengths: np.ndarray
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with open(path/INDEX_FILE, 'r') as f:
+            index = json.load(f)
+
+        self.alphabet = index['alphabet']
+        self.segments = index['segments']
+        self.codes = _memmap(path/CODES_FILE, 'u1')
+        self.run_codes = _memmap(path/RUN_CODES_FILE, 'u1')
+        self.run_lengths = _memmap(path/RUN_LENGTHS_FILE, '<u4')
+
+    def select(self, ticker: str | None = None, session: str | None = None) -> list[CorpusSegment]:
+        return [
+            segment for segment in self.segments
+            if (ticker is None or segment['ticker'] == ticker)
+            and (session is None or segment['session'] == session)
+        ]
+
+    def segment_codes(self, segment: CorpusSegment, collapsed: bool = False) -> np.ndarray:
+        """Codes of one segment, as a slice of the memory map."""
+        if collapsed:
+            return self.run_codes[segment['run_start']:segment['run_stop']]
+        return self.codes[segment['start']:segment['stop']]
+
+    def collapse_runs(self, ticker: str | None = None, session: str | None = None) -> list[np.ndarray]:
+        """Run-collapsed codes of each selected segment, read straight from the run stream."""
+        return [self.segment_codes(segment, collapsed=True) for segment in self.select(ticker, session)]
+
+    def ngram_counts(
+        self,
+        n: int,
+        collapsed: bool = False,
+        ticker: str | None = None,
+        session: str | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Count the length-n n-grams within each selected segment (never across segments).
+
+        Returns:
+            (ngrams, counts): an (n_unique, n) uint8 code matrix and the count
+            of each row, most frequent first
+        """
+        alphabet_size = max(len(self.alphabet), 1)
+        if n * np.log2(alphabet_size) >= 63:
+            raise ValueError(f"{n}-grams over {alphabet_size} symbols do not fit in an int64 key.")
+
+        unique_keys: list[np.ndarray] = []
+        unique_counts: list[np.ndarray] = []
+        for segment in self.select(ticker, session):
+            keys, counts = np.unique(
+                ngram_keys(self.segment_codes(segment, collapsed), n, alphabet_size),
+                return_counts=True
+            )
+            unique_keys.append(keys)
+            unique_counts.append(counts)
+
+        if not unique_keys:
+            return np.zeros((0, n), dtype=np.uint8), np.zeros(0, dtype=np.int64)
+
+        # Merge the per-segment histograms
+        all_keys = np.concatenate(unique_keys)
+        all_counts = np.concatenate(unique_counts)
+        keys, inverse = np.unique(all_keys, return_inverse=True)
+        counts = np.bincount(inverse, weights=all_counts, minlength=len(keys)).astype(np.int64)
+
+        order = np.argsort(-counts, kind='stable')
+        return unpack_ngram_keys(keys[order], n, alphabet_size), counts[order]
+
+    def decode(self, codes: np.ndarray) -> str:
+        return ''.join(self.alphabet[code] for code in codes)
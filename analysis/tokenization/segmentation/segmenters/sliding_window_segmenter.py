@@ -1,5 +1,97 @@
 import numpy as np
-# from analysis.tokenization.segmentation.boundary_scores.mutual_info_two import boundary_score_two
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Literal
+from analysis.tokenization.segmentation.boundary_scores.mutual_info_one import mutual_info_one
+from analysis.tokenization.segmentation.boundary_scores.mutual_info_two import mutual_info_two
+from analysis.tokenization.segmentation.utils.kernels import (
+    cumulative_counts, encode_symbols, mutual_info_one_from_counts, mutual_info_two_from_counts,
+)
+
+CountsBoundaryScore = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+# Vectorized counterparts of the boundary scores, used by split_search='counts'/'sliding'
+COUNTS_BOUNDARY_SCORES: dict[Callable[..., Any], CountsBoundaryScore] = {
+    mutual_info_one: mutual_info_one_from_counts,
+    mutual_info_two: mutual_info_two_from_counts,
+}
+
+# Scores this close to the window's maximum count as tied with it
+TIE_TOLERANCE = 1e-12
+
+
+def _first_best_split(splits: np.ndarray, scores: np.ndarray) -> int:
+    """The earliest split scoring within TIE_TOLERANCE of the best.
+
+    The sliced and count-matrix searches sum the same terms in different
+    orders, so equal scores (e.g. two splits with JS divergence 1.0) can
+    differ by an ulp either way; comparing with a tolerance makes every
+    split search pick the same boundary.
+    """
+    return int(splits[np.flatnonzero(scores >= scores.max() - TIE_TOLERANCE)[0]])
+
+
+def _best_split_from_counts(
+        counts_score: CountsBoundaryScore,
+        cumulative: np.ndarray,
+        min_length: int
+    ) -> int | None:
+    """Score every split of one window in a single call and return the best one."""
+    n = len(cumulative)
+    splits = np.arange(min_length, n - min_length + 1)
+    if len(splits) == 0:
+        return None
+
+    left_counts = cumulative[splits - 1]
+    right_counts = cumulative[-1] - left_counts
+    return _first_best_split(splits, counts_score(left_counts, right_counts))
+
+
+def _slide_cumulative(
+        cumulative: np.ndarray,
+        step: int,
+        incoming: np.ndarray,
+        alphabet_size: int
+    ) -> np.ndarray:
+    """Advance a window's cumulative counts by `step` symbols, `incoming` being the new ones."""
+    shifted = cumulative[step:] - cumulative[step - 1]
+    tail = cumulative_counts(incoming, alphabet_size) + shifted[-1]
+    return np.concatenate([shifted, tail])
+
+
+def _best_splits_for_starts(
+        counts_score: CountsBoundaryScore,
+        codes: np.ndarray,
+        alphabet_size: int,
+        starts: range,
+        window_size: int,
+        min_length: int,
+        slide: bool
+    ) -> list[int]:
+    """Boundaries (relative to `codes`) found by the windows starting at `starts`.
+
+    Module level so that shards of window starts can be sent to a process pool.
+    """
+    boundaries: list[int] = []
+    cumulative: np.ndarray | None = None
+    previous_start = 0
+
+    for start in starts:
+        end = start + window_size
+        step = start - previous_start
+
+        # Integer counts, so a slid matrix is identical to a rebuilt one
+        if slide and cumulative is not None and 0 < step < window_size:
+            cumulative = _slide_cumulative(cumulative, step, codes[end - step:end], alphabet_size)
+        else:
+            cumulative = cumulative_counts(codes[start:end], alphabet_size)
+        previous_start = start
+
+        best_split = _best_split_from_counts(counts_score, cumulative, min_length)
+        if best_split is not None:
+            boundaries.append(start + best_split)
+
+    return boundaries
+
 
 """
 Segment sequence using sliding window MI analysis.
@@ -10,61 +102,104 @@ Args:
     window_size: Size of analysis window
     step_size: Step size for sliding window
     min_token_length: Minimum token length
+    split_search: 'slice' scores each split on sliced sub-sequences;
+        'counts' integer-codes the symbols and scores every split of a
+        window at once from cumulative count matrices (O(W * alphabet));
+        'sliding' is 'counts' but slides each window's count matrix
+        forward by step_size instead of rebuilding it.
+        'counts' and 'sliding' require a boundary score from COUNTS_BOUNDARY_SCORES.
+    n_jobs: Number of processes sharing the windows ('counts'/'sliding' only)
+    windows_per_shard: Number of consecutive windows handed to each process
 """
 def sliding_window_segmenter(
         boundary_score,
         window_size=500,
         step_size=50,
-        min_token_length=3
+        min_token_length=3,
+        split_search: Literal['slice', 'counts', 'sliding'] = 'slice',
+        n_jobs: int = 1,
+        windows_per_shard: int = 2000
     ):
+    if split_search != 'slice' and boundary_score not in COUNTS_BOUNDARY_SCORES:
+        raise ValueError(f"No vectorized counterpart registered for {boundary_score!r}")
+    if n_jobs > 1 and split_search == 'slice':
+        raise ValueError("n_jobs > 1 requires split_search='counts' or 'sliding'")
+
     def _find_best_split(window, min_length):
         """Find the best split point in a window using MI."""
         n = len(window)
-        best_score = -np.inf
-        best_split = None
-        
-        for split in range(min_length, n - min_length + 1):
-            print(split)
-            left = window[:split]
-            right = window[split:]
-            
-            # Calculate MI between left and right segments
-            score = boundary_score(left, right)
-            
-            if score > best_score:
-                best_score = score
-                best_split = split
-        
-        return best_split
-    
+        splits = np.arange(min_length, n - min_length + 1)
+        if len(splits) == 0:
+            return None
+
+        # Calculate MI between left and right segments of every split
+        scores = np.array([boundary_score(window[:split], window[split:]) for split in splits], dtype=np.float64)
+        return _first_best_split(splits, scores)
+
+    def _count_boundaries(sequence: str) -> list[int]:
+        """Candidate boundaries from the count-matrix search, sharded over n_jobs processes."""
+        codes, alphabet = encode_symbols(sequence)
+        alphabet_size = len(alphabet)
+        counts_score = COUNTS_BOUNDARY_SCORES[boundary_score]
+        slide = split_search == 'sliding'
+
+        starts = range(0, len(sequence) - window_size + 1, step_size)
+        if n_jobs <= 1:
+            return _best_splits_for_starts(
+                counts_score, codes, alphabet_size, starts, window_size, min_token_length, slide
+            )
+
+        # Each shard only receives the codes its windows cover
+        shard_args = []
+        for i in range(0, len(starts), windows_per_shard):
+            shard_starts = starts[i:i + windows_per_shard]
+            offset = shard_starts[0]
+            shard_codes = codes[offset:shard_starts[-1] + window_size]
+            shard_args.append((offset, shard_codes, range(0, len(shard_starts) * step_size, step_size)))
+
+        boundaries: list[int] = []
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            futures = [
+                (offset, executor.submit(
+                    _best_splits_for_starts,
+                    counts_score, shard_codes, alphabet_size, shard_starts, window_size, min_token_length, slide
+                ))
+                for offset, shard_codes, shard_starts in shard_args
+            ]
+            for offset, future in futures:
+                boundaries.extend(offset + boundary for boundary in future.result())
+
+        return boundaries
+
     def _segmenter(sequence: str):
         n = len(sequence)
-        
+
         # Find candidate boundaries
         boundaries = []
-        
-        for start in range(0, n - window_size + 1, step_size):
-            end = min(start + window_size, n)
-            window = sequence[start:end]
-            
-            # Find best split point in this window
-            best_split = _find_best_split(window, min_token_length)
-            
-            if best_split is not None:
-                boundaries.append(start + best_split)
-        
+
+        if split_search == 'slice':
+            for start in range(0, n - window_size + 1, step_size):
+                end = min(start + window_size, n)
+                window = sequence[start:end]
+
+                # Find best split point in this window
+                best_split = _find_best_split(window, min_token_length)
+
+                if best_split is not None:
+                    boundaries.append(start + best_split)
+        else:
+            boundaries = _count_boundaries(sequence)
+
         # Remove duplicate boundaries and sort
         boundaries = sorted(list(set([0] + boundaries + [n])))
-        
+
         # Extract tokens
         tokens = []
         for i in range(len(boundaries) - 1):
-            print(i)
-
             token = sequence[boundaries[i]:boundaries[i+1]]
             if len(token) >= min_token_length:
                 tokens.append(token)
-        
+
         return tokens, boundaries
-    
-    return _segmenter
\ No newline at end of file
+
+    return _segmenter
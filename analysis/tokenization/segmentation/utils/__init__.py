@@ -1,3 +1,4 @@
-from entropy import entropy
+from analysis.tokenization.segmentation.utils.entropy import entropy
+from analysis.tokenization.segmentation.utils.kernels import entropy_from_counts
 
-__all__ = ['entropy']
\ No newline at end of file
+__all__ = ['entropy', 'entropy_from_counts']
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+Vectorized entropy and divergence kernels over integer-coded symbol sequences.
+
+Same semantics as `entropy`, `mutual_info_one` and `mutual_info_two`, but
+working on uint8/uint16 code arrays and on count matrices. Every
+`*_from_counts` kernel accepts (..., alphabet) counts, so a batch of
+thousands of distributions is scored in one call.
+"""
+import numpy as np
+from typing import Any, Sequence
+
+
+def encode_symbols(
+        sequence: Sequence[Any],
+        alphabet: Sequence[Any] | None = None
+    ) -> tuple[np.ndarray, list[Any]]:
+    """Integer-code a symbol sequence, returning (codes, alphabet).
+
+    Codes are uint8 when the alphabet fits in a byte, uint16 otherwise.
+    """
+    if alphabet is None:
+        alphabet = sorted(set(sequence))
+    lookup: dict[Any, int] = {symbol: code for code, symbol in enumerate(alphabet)}
+
+    dtype = np.uint8 if len(alphabet) <= 256 else np.uint16
+    if isinstance(sequence, str) and all(len(symbol) == 1 and ord(symbol) < 256 for symbol in alphabet):
+        # Map bytes through a 256-entry table instead of a per-symbol dict lookup
+        table = np.zeros(256, dtype=dtype)
+        known = np.zeros(256, dtype=bool)
+        table[[ord(symbol) for symbol in alphabet]] = np.arange(len(alphabet))
+        known[[ord(symbol) for symbol in alphabet]] = True
+
+        raw = np.frombuffer(sequence.encode('latin-1'), dtype=np.uint8)
+        if not known[raw].all():
+            raise KeyError("sequence contains symbols outside the alphabet")
+        codes = table[raw]
+    else:
+        codes = np.fromiter((lookup[symbol] for symbol in sequence), dtype=dtype, count=len(sequence))
+
+    return codes, list(alphabet)
+
+
+def symbol_counts(codes: np.ndarray, alphabet_size: int) -> np.ndarray:
+    """Histogram of a code array: (alphabet,) for 1-D codes, (n, alphabet) for (n, length) codes."""
+    codes = np.asarray(codes)
+    if codes.ndim == 1:
+        return np.bincount(codes, minlength=alphabet_size)
+
+    # Offset each row into its own block of the histogram so one bincount does the batch
+    rows = codes.reshape(len(codes), -1).astype(np.int64)
+    offsets = (np.arange(len(rows)) * alphabet_size)[:, None]
+    flat = np.bincount((rows + offsets).ravel(), minlength=len(rows) * alphabet_size)
+    return flat.reshape(len(rows), alphabet_size)
+
+
+def cumulative_counts(codes: np.ndarray, alphabet_size: int) -> np.ndarray:
+    """(len(codes), alphabet) matrix whose row i counts each symbol in codes[:i + 1]."""
+    one_hot = np.zeros((len(codes), alphabet_size), dtype=np.int64)
+    one_hot[np.arange(len(codes)), codes] = 1
+    return np.cumsum(one_hot, axis=0)
+
+
+def _probabilities(counts: np.ndarray) -> np.ndarray:
+    counts = np.asarray(counts, dtype=np.float64)
+    totals = counts.sum(axis=-1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+
+def _log2(values: np.ndarray, where: np.ndarray) -> np.ndarray:
+    """log2 where `where` holds, 0 elsewhere (so 0 * log 0 terms vanish)."""
+    return np.log2(values, out=np.zeros_like(values), where=where)
+
+
+def entropy_from_counts(counts: np.ndarray) -> np.ndarray:
+    """Shannon entropy of each row of a (..., alphabet) count matrix."""
+    probs = _probabilities(counts)
+    return -(probs * _log2(probs, probs > 0)).sum(axis=-1)
+
+
+def kl_divergence_from_counts(left_counts: np.ndarray, right_counts: np.ndarray) -> np.ndarray:
+    """KL(left || right) over the symbols present on both sides, as in `mutual_info_one`."""
+    p_left = _probabilities(left_counts)
+    p_right = _probabilities(right_counts)
+
+    shared = (p_left > 0) & (p_right > 0)
+    ratio = np.divide(p_left, p_right, out=np.ones_like(p_left), where=shared)
+    return (p_left * _log2(ratio, shared)).sum(axis=-1)
+
+
+def js_divergence_from_counts(left_counts: np.ndarray, right_counts: np.ndarray) -> np.ndarray:
+    """Jensen-Shannon divergence between each pair of rows."""
+    p = _probabilities(left_counts)
+    q = _probabilities(right_counts)
+    m = (p + q) / 2
+
+    # m > 0 wherever p > 0 or q > 0
+    p_ratio = np.divide(p, m, out=np.ones_like(p), where=p > 0)
+    q_ratio = np.divide(q, m, out=np.ones_like(q), where=q > 0)
+    return (0.5 * p * _log2(p_ratio, p > 0) + 0.5 * q * _log2(q_ratio, q > 0)).sum(axis=-1)
+
+
+def mutual_info_one_from_counts(left_counts: np.ndarray, right_counts: np.ndarray) -> np.ndarray:
+    """`mutual_info_one` for each pair of rows of two (..., alphabet) count matrices."""
+    coherence = entropy_from_counts(left_counts) + entropy_from_counts(right_counts)
+    return -coherence + kl_divergence_from_counts(left_counts, right_counts)
+
+
+def mutual_info_two_from_counts(left_counts: np.ndarray, right_counts: np.ndarray) -> np.ndarray:
+    """`mutual_info_two` for each pair of rows of two (..., alphabet) count matrices."""
+    return js_divergence_from_counts(left_counts, right_counts)
+
+
+def entropy_of_codes(codes: np.ndarray, alphabet_size: int) -> np.ndarray:
+    """`entropy` of a code array, or of each row of an (n, length) code array."""
+    return entropy_from_counts(symbol_counts(codes, alphabet_size))
+
+
+def mutual_info_one_of_codes(left: np.ndarray, right: np.ndarray, alphabet_size: int) -> np.ndarray:
+    """`mutual_info_one` on code arrays (1-D, or row-wise on (n, length) arrays)."""
+    return mutual_info_one_from_counts(symbol_counts(left, alphabet_size), symbol_counts(right, alphabet_size))
+
+
+def mutual_info_two_of_codes(left: np.ndarray, right: np.ndarray, alphabet_size: int) -> np.ndarray:
+    """`mutual_info_two` on code arrays (1-D, or row-wise on (n, length) arrays)."""
+    return mutual_info_two_from_counts(symbol_counts(left, alphabet_size), symbol_counts(right, alphabet_size))
@@ -0,0 +1,235 @@
+"""
+Byte-pair-encoding vocabulary learner for candle-letter tokens.
+
+Starts from the letters produced by `CandlesToLettersTokenizer` and
+repeatedly merges the most frequent adjacent pair into a new token. Pair
+counts are maintained incrementally, the next merge comes off a priority
+queue, and the sequence is a doubly linked list over arrays, so a merge
+costs time proportional to the occurrences of its pair rather than a
+rescan of the corpus.
+"""
+import heapq
+import json
+import numpy as np
+from collections import defaultdict
+from pathlib import Path
+from typing import Sequence
+from analysis.tokenization.segmentation.utils.kernels import encode_symbols
+
+Pair = tuple[int, int]
+
+
+class _LinkedSequences:
+    """
+    Token ids of several sequences as one doubly linked list; -1 links end a sequence.
+
+    Plain lists rather than arrays: merges touch one element at a time, and
+    list indexing avoids creating a numpy scalar per access.
+    """
+
+    def __init__(self, sequences: Sequence[np.ndarray]) -> None:
+        lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+        total = int(lengths.sum())
+
+        symbols = np.concatenate(sequences).astype(np.int64) if total else np.zeros(0, dtype=np.int64)
+        next_ = np.arange(1, total + 1, dtype=np.int64)
+        prev = np.arange(-1, total - 1, dtype=np.int64)
+
+        ends = np.cumsum(lengths)[lengths > 0]
+        starts = ends - lengths[lengths > 0]
+        next_[ends - 1] = -1
+        prev[starts] = -1
+
+        self.symbols: list[int] = symbols.tolist()
+        self.next: list[int] = next_.tolist()
+        self.prev: list[int] = prev.tolist()
+
+    def merge(self, position: int, token: int) -> None:
+        """Replace the pair starting at `position` with `token`."""
+        right = self.next[position]
+        after = self.next[right]
+
+        self.symbols[position] = token
+        self.symbols[right] = -1
+        self.next[position] = after
+        if after != -1:
+            self.prev[after] = position
+
+    def pair_at(self, position: int) -> Pair | None:
+        right = self.next[position]
+        if self.symbols[position] < 0 or right == -1:
+            return None
+        return self.symbols[position], self.symbols[right]
+
+    def pair_positions(self) -> dict[Pair, set[int]]:
+        """Positions of every adjacent pair, grouped with one sort instead of a Python pass."""
+        symbols = np.array(self.symbols, dtype=np.int64)
+        next_ = np.array(self.next, dtype=np.int64)
+
+        left = np.flatnonzero((next_ != -1) & (symbols >= 0))
+        base = int(symbols.max()) + 1 if len(symbols) else 1
+        keys = symbols[left] * base + symbols[next_[left]]
+
+        order = np.argsort(keys, kind='stable')
+        keys, left = keys[order], left[order]
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        return {
+            (int(group_keys[0]) // base, int(group_keys[0]) % base): set(group_positions.tolist())
+            for group_keys, group_positions in zip(np.split(keys, bounds), np.split(left, bounds))
+            if len(group_keys)
+        }
+
+    def alive(self) -> np.ndarray:
+        symbols = np.array(self.symbols, dtype=np.int64)
+        return symbols[symbols >= 0]
+
+
+class BytePairTokenizer:
+    """
+    Vocabulary of candle-letter strings learned by byte-pair merges.
+
+    Token ids 0..len(alphabet)-1 are the letters; id len(alphabet) + r is
+    the token created by the r-th merge.
+    """
+    alphabet: list[str]
+    merges: list[Pair]
+    vocabulary: list[str]
+
+    def __init__(self, alphabet: Sequence[str], merges: Sequence[Pair] | None = None) -> None:
+        self.alphabet = list(alphabet)
+        self.merges = []
+        self.vocabulary = list(self.alphabet)
+        self._ranks: dict[Pair, int] = {}
+        for pair in merges or []:
+            self._add_merge(pair)
+
+    def _add_merge(self, pair: Pair) -> int:
+        token = len(self.vocabulary)
+        self._ranks[pair] = len(self.merges)
+        self.merges.append(pair)
+        self.vocabulary.append(self.vocabulary[pair[0]] + self.vocabulary[pair[1]])
+        return token
+
+    def _codes(self, sequences: Sequence[str] | Sequence[np.ndarray]) -> list[np.ndarray]:
+        return [
+            encode_symbols(sequence, alphabet=self.alphabet)[0] if isinstance(sequence, str) else np.asarray(sequence)
+            for sequence in sequences
+        ]
+
+    def learn(
+        self,
+        sequences: Sequence[str] | Sequence[np.ndarray],
+        vocabulary_size: int,
+        min_frequency: int = 2
+    ) -> list[Pair]:
+        """
+        Learn merges until the vocabulary has `vocabulary_size` tokens or no
+        pair occurs `min_frequency` times.
+
+        Args:
+            sequences: letter strings (e.g. `CandlesToLettersTokenizer.transformed_data`,
+                one per session) or code arrays; pairs never span two sequences
+        """
+        linked = _LinkedSequences(self._codes(sequences))
+
+        positions: dict[Pair, set[int]] = defaultdict(set, linked.pair_positions())
+        counts: dict[Pair, int] = defaultdict(int, {pair: len(found) for pair, found in positions.items()})
+
+        # Max-heap on count, ties broken towards the smaller pair; stale entries are skipped on pop
+        heap: list[tuple[int, Pair]] = [(-count, pair) for pair, count in counts.items()]
+        heapq.heapify(heap)
+
+        # Pairs whose count changed during the current merge; re-queued once it is done
+        touched: set[Pair] = set()
+
+        def _remove(pair: Pair | None, position: int) -> None:
+            if pair is not None and position in positions.get(pair, ()):
+                positions[pair].discard(position)
+                counts[pair] -= 1
+                touched.add(pair)
+
+        def _add(pair: Pair | None, position: int) -> None:
+            if pair is not None:
+                positions[pair].add(position)
+                counts[pair] += 1
+                touched.add(pair)
+
+        while len(self.vocabulary) < vocabulary_size and heap:
+            negative_count, pair = heapq.heappop(heap)
+            if -negative_count != counts.get(pair, 0):
+                continue
+            if -negative_count < min_frequency:
+                break
+
+            token = self._add_merge(pair)
+            for position in sorted(positions.pop(pair)):
+                # Earlier merges in this pass may have consumed this occurrence
+                if linked.pair_at(position) != pair:
+                    continue
+
+                before = linked.prev[position]
+                right = linked.next[position]
+                if before != -1:
+                    _remove(linked.pair_at(before), before)
+                _remove(linked.pair_at(right), right)
+
+                linked.merge(position, token)
+
+                if before != -1:
+                    _add(linked.pair_at(before), before)
+                _add(linked.pair_at(position), position)
+            del counts[pair]
+
+            touched.discard(pair)
+            for changed in touched:
+                heapq.heappush(heap, (-counts[changed], changed))
+            touched.clear()
+
+        return self.merges
+
+    def _rank_at(self, linked: _LinkedSequences, position: int) -> int | None:
+        pair = linked.pair_at(position)
+        return None if pair is None else self._ranks.get(pair)
+
+    def encode(self, sequence: str | np.ndarray) -> np.ndarray:
+        """Token ids of one sequence, applying the learned merges in order."""
+        linked = _LinkedSequences(self._codes([sequence]))
+
+        # Lowest merge rank first, leftmost first within a rank, as in training
+        heap: list[tuple[int, int]] = []
+        for position in range(len(linked.symbols)):
+            rank = self._rank_at(linked, position)
+            if rank is not None:
+                heap.append((rank, position))
+        heapq.heapify(heap)
+
+        n_letters = len(self.alphabet)
+        while heap:
+            rank, position = heapq.heappop(heap)
+            if linked.pair_at(position) != self.merges[rank]:
+                continue
+
+            before = linked.prev[position]
+            linked.merge(position, n_letters + rank)
+
+            for neighbour in (before, position):
+                if neighbour == -1:
+                    continue
+                new_rank = self._rank_at(linked, neighbour)
+                if new_rank is not None:
+                    heapq.heappush(heap, (new_rank, neighbour))
+
+        return linked.alive()
+
+    def decode(self, tokens: np.ndarray) -> list[str]:
+        return [self.vocabulary[token] for token in tokens]
+
+    def save(self, path: Path) -> None:
+        with open(path, 'w') as f:
+            json.dump({'alphabet': self.alphabet, 'merges': self.merges}, f)
+
+    @classmethod
+    def load(cls, path: Path) -> 'BytePairTokenizer':
+        with open(path, 'r') as f:
+            artifact = json.load(f)
+        return cls(artifact['alphabet'], [tuple(pair) for pair in artifact['merges']])
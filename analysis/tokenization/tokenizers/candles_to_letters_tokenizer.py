@@ -5,38 +5,139 @@ from sklearn.preprocessing import StandardScaler
 # from analysis.analyzers.data_loader import DataLoader
 import pickle
 from pathlib import Path
+from numpy.lib.stride_tricks import sliding_window_view
+from analysis.tokenization.corpus.token_corpus import TokenCorpusWriter
+from analysis.categorizers.gaussian_mixture_pipeline import GaussianMixturePipeline
 
 class CandlesToLettersTokenizer:
-    def __init__(self, model: GaussianMixture):
+    """
+    Encode candles as letters, one per `window_size`-bar window, via a GMM.
+
+    Without a scaler, `transform` refits a StandardScaler on whatever data
+    it is given (the original behaviour). Once a scaler is fitted with
+    `fit_scaler` or loaded alongside the GMM with `load`, windows are
+    scaled with it instead, so the tokens no longer depend on the batch,
+    windows are built as a strided view and predicted in `batch_size`
+    chunks, and `append` tokenizes new bars without re-encoding history.
+    """
+    model: GaussianMixture
+    scaler: StandardScaler | None
+    labels: np.ndarray
+    transformed_data: str
+
+    def __init__(
+        self,
+        model: GaussianMixture,
+        scaler: StandardScaler | None = None,
+        window_size: int = 5,
+        batch_size: int = 65536
+    ):
         self.model = model
+        self.scaler = scaler
+        self.window_size = window_size
+        self.batch_size = batch_size
         self.letters = [chr(i) for i in range(65, 65 + model.n_components)]
+        self._tail: np.ndarray | None = None
+
+    @classmethod
+    def from_pipeline(cls, pipeline: GaussianMixturePipeline, **kwargs) -> 'CandlesToLettersTokenizer':
+        return cls(model=pipeline.model, scaler=pipeline.scaler, **kwargs)
+
+    @classmethod
+    def load(cls, path: Path, **kwargs) -> 'CandlesToLettersTokenizer':
+        """Load a GaussianMixturePipeline artifact, or a bare pickled GaussianMixture."""
+        return cls.from_pipeline(GaussianMixturePipeline.load(path), **kwargs)
+
+    def save(self, path: Path) -> None:
+        """Persist the GMM together with its fitted scaler, as a GaussianMixturePipeline artifact."""
+        GaussianMixturePipeline(model=self.model, scaler=self.scaler).save(path)
+
+    def windows(self, data: pd.DataFrame | np.ndarray) -> np.ndarray:
+        """(n - window_size + 1, window_size * n_features) strided view; row i flattens bars i..i+window_size-1."""
+        values = np.ascontiguousarray(np.asarray(data, dtype=np.float64))
+        n_features = values.shape[1]
+
+        # Consecutive rows of a C-contiguous array are adjacent in memory, so each
+        # flattened window is a contiguous slice of the raveled data
+        return sliding_window_view(values.ravel(), self.window_size * n_features)[::n_features]
+
+    def fit_scaler(self, data: pd.DataFrame | np.ndarray) -> StandardScaler:
+        """Fit the window scaler once, one batch of windows at a time."""
+        windows = self.windows(data)
+        scaler = StandardScaler()
+        for start in range(0, len(windows), self.batch_size):
+            _: StandardScaler = scaler.partial_fit(windows[start:start + self.batch_size])
+        self.scaler = scaler
+        return scaler
+
+    def encode(self, data: pd.DataFrame | np.ndarray) -> np.ndarray:
+        """GMM labels of every window of `data`, scaled with the fitted scaler, in fixed-size batches."""
+        if self.scaler is None:
+            raise ValueError("The tokenizer must have a fitted scaler; call fit_scaler or load one.")
+
+        windows = self.windows(data)
+        labels = np.empty(len(windows), dtype=np.int64)
+        for start in range(0, len(windows), self.batch_size):
+            batch = np.ascontiguousarray(windows[start:start + self.batch_size])
+            labels[start:start + len(batch)] = self.model.predict(self.scaler.transform(batch))
+        return labels
+
+    def to_letters(self, labels: np.ndarray) -> str:
+        """Same mapping as self.letters (label i -> chr(65 + i)), done on the label bytes."""
+        return (np.asarray(labels) + 65).astype(np.uint8).tobytes().decode('latin-1')
 
     def transform(self, data: pd.DataFrame):
-        window_size = 5
-        windows = []
-        for i in range(0, len(data) - window_size + 1, 1):
-            window = data.iloc[i:i+window_size].values.flatten()
-            windows.append(window)
-        windows = np.array(windows)
+        if self.scaler is None:
+            windows = self.windows(data)
+            windows = StandardScaler().fit_transform(windows)
+            self.labels = self.model.predict(windows)
+        else:
+            self.labels = self.encode(data)
+
+        self.transformed_data = self.to_letters(self.labels)
+        self._tail = self._last_bars(np.asarray(data, dtype=np.float64))
 
-        windows = StandardScaler().fit_transform(windows)
-        labels = self.model.predict(windows)
+    def append(self, data: pd.DataFrame | np.ndarray) -> str:
+        """Tokenize bars that follow the last transformed/appended data; returns the new letters."""
+        if self._tail is None:
+            raise ValueError("append requires a prior call to transform.")
 
-        self.transformed_data = [self.letters[label] for label in labels]
+        values = np.concatenate([self._tail, np.asarray(data, dtype=np.float64)])
+        if len(values) < self.window_size:
+            self._tail = values
+            return ''
+
+        # Encode before touching any state, so a failed call can be retried with the same bars
+        new_labels = self.encode(values)
+        new_letters = self.to_letters(new_labels)
+        self._tail = self._last_bars(values)
+        self.labels = np.concatenate([self.labels, new_labels])
+        self.transformed_data += new_letters
+        return new_letters
+
+    def _last_bars(self, values: np.ndarray) -> np.ndarray:
+        """The window_size - 1 bars the next window starts with (none when window_size is 1)."""
+        return values[max(len(values) - (self.window_size - 1), 0):]
 
     def save_transformed_data(self, filepath: Path):
         with open(filepath, 'w') as f:
             f.write(''.join(self.transformed_data))
 
-cwd = Path.cwd()
-with open(cwd/'analysis/tokenization/visualizations/gmm_model.pkl', 'rb') as f:
-    model: GaussianMixture = pickle.load(f)
+    def write_to_corpus(self, writer: TokenCorpusWriter, ticker: str, session: str) -> None:
+        """Append the transformed labels to a binary token corpus as one (ticker, session) segment."""
+        writer.add(ticker, session, self.labels)
+
+
+if __name__ == '__main__':
+    cwd = Path.cwd()
+    with open(cwd/'analysis/tokenization/visualizations/gmm_model.pkl', 'rb') as f:
+        model: GaussianMixture = pickle.load(f)
 
-# dl = DataLoader()
+    # dl = DataLoader()
 
-# dl.load_data_from_path(cwd/'data'/'SPY'/'tiingo'/'historical_pct.jsonl')
-# data = dl.df
+    # dl.load_data_from_path(cwd/'data'/'SPY'/'tiingo'/'historical_pct.jsonl')
+    # data = dl.df
 
-# clt = CandlesToLettersTokenizer(model=model)
-# clt.transform(data)
-# clt.save_transformed_data(cwd/'data'/'SPY'/'analysis'/'historical_pct'/'encoded_sequence.txt')
\ No newline at end of file
+    # clt = CandlesToLettersTokenizer(model=model)
+    # clt.transform(data)
+    # clt.save_transformed_data(cwd/'data'/'SPY'/'analysis'/'historical_pct'/'encoded_sequence.txt')
@@ -0,0 +1,125 @@
+"""
+Early stopping and resumable checkpoints for Trainer.train.
+
+A checkpoint directory holds:
+
+    last.pt     the state at the end of the latest checkpointed epoch: model,
+                optimizer, normalization statistics, early-stopping state, the
+                shuffle seed and every RNG state, enough to continue the run
+                exactly as if it had not stopped, plus every epoch's
+                validation loss and whether early stopping ended the run
+    best.pt     the model with the lowest validation loss so far (and that
+                loss), with the normalization statistics needed to use it
+
+Both are written atomically: to a temporary file in the same directory,
+fsynced, then renamed over the old one, so a crash mid-write leaves the
+previous checkpoint intact.
+"""
+import numpy as np
+import os
+import random
+import torch
+from pathlib import Path
+from typing import Any, TypedDict
+
+LAST_CHECKPOINT = 'last.pt'
+BEST_CHECKPOINT = 'best.pt'
+
+
+class RNGState(TypedDict):
+    torch: torch.Tensor
+    numpy: tuple[Any, ...]
+    python: tuple[Any, ...]
+
+
+class TrainingCheckpoint(TypedDict):
+    # Last completed epoch, 1-based
+    epoch: int
+    model: dict[str, torch.Tensor]
+    optimizer: dict[str, Any]
+    train_mean: np.ndarray
+    train_std: np.ndarray
+    best_val_loss: float
+    # Validation loss after each epoch so far
+    val_losses: list[float]
+    early_stopping: dict[str, Any] | None
+    shuffle_seed: int
+    rng: RNGState
+    # Early stopping ended the run here
+    stopped: bool
+
+
+def capture_rng_state() -> RNGState:
+    return RNGState(torch=torch.get_rng_state(), numpy=np.random.get_state(), python=random.getstate())
+
+
+def restore_rng_state(state: RNGState) -> None:
+    torch.set_rng_state(state['torch'])
+    np.random.set_state(state['numpy'])
+    random.setstate(state['python'])
+
+
+def save_atomic(obj: Any, path: Path) -> None:
+    """torch.save `obj` so that `path` holds either the old or the new contents, never a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f'.{path.name}.tmp')
+    with open(temporary, 'wb') as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+    # Persist the rename itself
+    directory = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+def load_checkpoint(path: Path) -> TrainingCheckpoint:
+    # Checkpoints hold numpy arrays and RNG tuples besides tensors
+    return torch.load(path, weights_only=False)
+
+
+class EarlyStopping:
+    """
+    Stop once validation loss has not improved for `patience` epochs.
+
+    Args:
+        patience: epochs without improvement before stopping
+        min_delta: decrease in validation loss that counts as an improvement
+    """
+
+    def __init__(self, patience: int = 5, min_delta: float = 0.0) -> None:
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best_loss = float('inf')
+        self.best_epoch = 0
+        self.epochs_without_improvement = 0
+
+    def step(self, epoch: int, val_loss: float) -> bool:
+        """Record an epoch's validation loss; whether it improved on the best so far."""
+        if val_loss < self.best_loss - self.min_delta:
+            self.best_loss = val_loss
+            self.best_epoch = epoch
+            self.epochs_without_improvement = 0
+            return True
+        self.epochs_without_improvement += 1
+        return False
+
+    @property
+    def should_stop(self) -> bool:
+        return self.epochs_without_improvement >= self.patience
+
+    def state_dict(self) -> dict[str, Any]:
+        return {
+            'best_loss': self.best_loss,
+            'best_epoch': self.best_epoch,
+            'epochs_without_improvement': self.epochs_without_improvement,
+        }
+
+    def load_state_dict(self, state: dict[str, Any]) -> None:
+        self.best_loss = state['best_loss']
+        self.best_epoch = state['best_epoch']
+        self.epochs_without_improvement = state['epochs_without_improvement']
@@ -0,0 +1,121 @@
+"""
+CPU performance settings for Trainer.train.
+
+Bundles what matters on GPU-less training boxes: intra-/inter-op thread
+counts, DataLoader workers with prefetching, bf16 autocast when the CPU has
+native bf16 (AVX512-BF16 or AMX), optional torch.compile, and a larger batch
+with the learning rate scaled from the reference 32-window / 1e-4 setup.
+"""
+import os
+import torch
+import torch.nn as nn
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any, Literal
+
+
+def bf16_supported() -> bool:
+    """Whether oneDNN has native bf16 kernels on this CPU."""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def physical_cores() -> int:
+    """Cores from /proc/cpuinfo (no hyper-threads), falling back to the logical CPU count."""
+    logical = os.cpu_count() or 1
+    try:
+        with open('/proc/cpuinfo') as f:
+            processors = f.read().strip().split('\n\n')
+    except OSError:
+        return logical
+
+    cores: set[tuple[str, ...]] = set()
+    for processor in processors:
+        ids = tuple(
+            row.split(':', 1)[1].strip() for row in processor.splitlines()
+            if row.startswith(('physical id', 'core id'))
+        )
+        if ids:
+            cores.add(ids)
+    return len(cores) or logical
+
+
+class CPUPerformanceMode:
+    """
+    Args:
+        intra_op_threads: threads per op (default: physical cores minus the loader workers)
+        inter_op_threads: ops run concurrently; 1 suits a sequential model
+        num_workers: DataLoader worker processes (default: a quarter of the cores, at most 4)
+        bf16: autocast forward passes to bfloat16; 'auto' enables it on CPUs with native bf16
+        compile: torch.compile the model for training
+        lr_scaling: how the learning rate grows with batch_size / base_batch_size;
+            'sqrt' is the usual choice for Adam, 'linear' the Goyal et al. rule
+    """
+    use_bf16: bool
+
+    def __init__(
+        self,
+        batch_size: int = 256,
+        intra_op_threads: int | None = None,
+        inter_op_threads: int = 1,
+        num_workers: int | None = None,
+        prefetch_factor: int = 4,
+        bf16: bool | Literal['auto'] = 'auto',
+        compile: bool = False,
+        lr_scaling: Literal['sqrt', 'linear', 'none'] = 'sqrt',
+        base_batch_size: int = 32,
+        base_learning_rate: float = 1e-4
+    ) -> None:
+        cores = physical_cores()
+        self.batch_size = batch_size
+        self.num_workers = num_workers if num_workers is not None else min(4, cores // 4)
+        self.intra_op_threads = intra_op_threads or max(1, cores - self.num_workers)
+        self.inter_op_threads = inter_op_threads
+        self.prefetch_factor = prefetch_factor
+        self.use_bf16 = bf16_supported() if bf16 == 'auto' else bf16
+        self.compile = compile
+        self.lr_scaling = lr_scaling
+        self.base_batch_size = base_batch_size
+        self.base_learning_rate = base_learning_rate
+
+    @property
+    def learning_rate(self) -> float:
+        ratio = self.batch_size / self.base_batch_size
+        if self.lr_scaling == 'linear':
+            return self.base_learning_rate * ratio
+        if self.lr_scaling == 'sqrt':
+            return self.base_learning_rate * ratio ** 0.5
+        return self.base_learning_rate
+
+    def apply(self) -> None:
+        """Set the process-wide thread counts."""
+        torch.set_num_threads(self.intra_op_threads)
+        try:
+            torch.set_num_interop_threads(self.inter_op_threads)
+        except RuntimeError:
+            # Only settable before the first inter-op parallel work; keep the current value
+            pass
+
+    def loader_options(self) -> dict[str, Any]:
+        options: dict[str, Any] = {'batch_size': self.batch_size, 'num_workers': self.num_workers}
+        if self.num_workers > 0:
+            options.update(persistent_workers=True, prefetch_factor=self.prefetch_factor)
+        return options
+
+    def autocast(self) -> AbstractContextManager[Any]:
+        if not self.use_bf16:
+            return nullcontext()
+        return torch.autocast(device_type='cpu', dtype=torch.bfloat16)
+
+    def prepare_model(self, model: nn.Module) -> nn.Module:
+        """The module to train with; compiled modules share the original's parameters."""
+        if self.compile:
+            return torch.compile(model)
+        return model
+
+    def describe(self) -> str:
+        return (
+            f'batch {self.batch_size}, lr {self.learning_rate:.2e}, threads {self.intra_op_threads}/{self.inter_op_threads}, '
+            f'workers {self.num_workers}, bf16 {self.use_bf16}, compile {self.compile}'
+        )
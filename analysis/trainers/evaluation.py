@@ -0,0 +1,103 @@
+"""
+Batched, streaming evaluation of a next-row model over a window dataset.
+
+Windows are scored `batch_size` at a time under `torch.no_grad`, so memory
+stays at one batch of activations whatever the size of the split. Metrics are
+accumulated as float64 sums and reported in the original (denormalized)
+scale, alongside the criterion's loss in the normalized scale the model is
+trained on.
+"""
+import numpy as np
+import torch
+import torch.nn as nn
+from typing import TypedDict
+from torch.utils.data import DataLoader, Dataset
+
+
+class EvaluationMetrics(TypedDict):
+    # Criterion on normalized values, averaged over windows
+    loss: float
+    # Denormalized, averaged over every predicted value
+    mse: float
+    mae: float
+    # Share of predicted values moving the same way as the target from the last input row
+    directional_accuracy: float
+    windows: int
+
+
+class StreamingMetrics:
+    """Running sums of the evaluation metrics, fed one batch at a time."""
+
+    def __init__(self, mean: np.ndarray, std: np.ndarray) -> None:
+        self.mean = torch.as_tensor(mean, dtype=torch.float64)
+        self.std = torch.as_tensor(std, dtype=torch.float64)
+        self.loss = 0.0
+        self.squared_error = 0.0
+        self.absolute_error = 0.0
+        self.same_direction = 0.0
+        self.values = 0
+        self.windows = 0
+
+    def update(self, loss: float, predictions: torch.Tensor, targets: torch.Tensor, last_inputs: torch.Tensor) -> None:
+        """Add one batch; tensors are in the normalized scale."""
+        n = len(predictions)
+        self.loss += loss * n
+        self.windows += n
+
+        # x * std + mean, as Trainer.predict denormalizes
+        predictions = predictions.double() * self.std + self.mean
+        targets = targets.double() * self.std + self.mean
+        last = last_inputs.double() * self.std + self.mean
+
+        error = predictions - targets
+        self.squared_error += float((error ** 2).sum())
+        self.absolute_error += float(error.abs().sum())
+        self.same_direction += float((torch.sign(predictions - last) == torch.sign(targets - last)).sum())
+        self.values += error.numel()
+
+    def result(self) -> EvaluationMetrics:
+        """The averages so far; NaN before any window, so an empty split never looks like a perfect one."""
+        if self.windows == 0:
+            return EvaluationMetrics(loss=np.nan, mse=np.nan, mae=np.nan, directional_accuracy=np.nan, windows=0)
+        return EvaluationMetrics(
+            loss=self.loss / self.windows,
+            mse=self.squared_error / self.values,
+            mae=self.absolute_error / self.values,
+            directional_accuracy=self.same_direction / self.values,
+            windows=self.windows,
+        )
+
+
+def evaluation_loader(
+    dataset: Dataset[tuple[torch.Tensor, torch.Tensor]],
+    batch_size: int = 1024,
+    num_workers: int = 0
+) -> DataLoader[tuple[torch.Tensor, torch.Tensor]]:
+    """In-order batches of `dataset`; workers persist, so a loader reused every epoch starts them once."""
+    return DataLoader(dataset, batch_size=batch_size, num_workers=num_workers, persistent_workers=num_workers > 0)
+
+
+def evaluate(
+    model: nn.Module,
+    data: Dataset[tuple[torch.Tensor, torch.Tensor]] | DataLoader[tuple[torch.Tensor, torch.Tensor]],
+    criterion: nn.Module,
+    mean: np.ndarray,
+    std: np.ndarray,
+    batch_size: int = 1024,
+    num_workers: int = 0
+) -> EvaluationMetrics:
+    """
+    Metrics of `model` over every (sequence, next row) window of `data`, a
+    window dataset or a loader from `evaluation_loader` (batch_size and
+    num_workers then do not apply).
+    """
+    loader = data if isinstance(data, DataLoader) else evaluation_loader(data, batch_size, num_workers)
+    metrics = StreamingMetrics(mean, std)
+
+    _: nn.Module = model.eval()
+    with torch.no_grad():
+        for batch_inputs, batch_targets in loader:
+            predictions = model(batch_inputs)
+            loss = criterion(predictions, batch_targets).item()
+            metrics.update(loss, predictions, batch_targets, batch_inputs[:, -1])
+    return metrics.result()
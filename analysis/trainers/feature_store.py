@@ -0,0 +1,232 @@
+"""
+Memory-mapped multi-ticker feature store for training StockTransformer.
+
+A store is a directory holding:
+
+    <ticker>.f32    the ticker's (rows, features) float32 matrix, row-major
+    index.json      the feature columns and, per ticker, its row count and
+                    the row offsets where each session starts
+
+Each ticker's rows are split chronologically into train/validation/test as
+Trainer.split_data does. A window never crosses a session boundary or a split
+boundary. The valid window starts are not materialized: the index keeps one
+(ticker, first start, count) run per session piece plus cumulative counts,
+and item i is found by binary search. Workers open the memmaps lazily, so a
+DataLoader with shuffled sampling and several workers reads only the windows
+of each batch.
+"""
+import json
+import numpy as np
+import torch
+import warnings
+from pathlib import Path
+from pandas import DataFrame
+from typing import Any, Literal, TypedDict
+from torch.utils.data import Dataset
+
+INDEX_FILE = 'index.json'
+
+Split = Literal['train', 'val', 'test']
+
+
+class TickerEntry(TypedDict):
+    ticker: str
+    rows: int
+    session_starts: list[int]
+
+
+class FeatureStoreWriter:
+    """
+    Write per-ticker feature matrices to a store directory. The store is
+    rewritten: a ticker's file is truncated on its first `add` and the index
+    lists only the tickers added by this writer.
+    """
+    path: Path
+    columns: list[str]
+    tickers: dict[str, TickerEntry]
+
+    def __init__(self, path: Path, columns: list[str]) -> None:
+        self.path = path
+        self.columns = list(columns)
+        self.tickers = {}
+        path.mkdir(parents=True, exist_ok=True)
+
+    def add(self, ticker: str, features: np.ndarray, sessions: np.ndarray | None = None) -> None:
+        """
+        Append rows to a ticker. `sessions` labels each row with its session
+        (e.g. its date for minute bars); windows never span two sessions, nor
+        two calls of `add`. Without labels the rows form one session.
+        """
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        if features.ndim != 2 or features.shape[1] != len(self.columns):
+            raise ValueError(f"Expected a (rows, {len(self.columns)}) matrix, got {features.shape}.")
+
+        # Rows left in the file by an earlier writer would not be in this writer's index
+        mode = 'ab' if ticker in self.tickers else 'wb'
+        entry = self.tickers.setdefault(ticker, TickerEntry(ticker=ticker, rows=0, session_starts=[]))
+        starts = [0]
+        if sessions is not None and len(features):
+            sessions = np.asarray(sessions)
+            starts.extend((np.flatnonzero(sessions[1:] != sessions[:-1]) + 1).tolist())
+        entry['session_starts'].extend(entry['rows'] + start for start in starts if start < len(features))
+
+        with open(self.path/f'{ticker}.f32', mode) as f:
+            _ = f.write(features.tobytes())
+        entry['rows'] += len(features)
+
+    def add_frame(self, ticker: str, df: DataFrame, session_column: str | None = None) -> None:
+        """Append a DataLoader frame's feature columns; sessions are calendar days of `session_column`."""
+        sessions = None
+        if session_column is not None:
+            sessions = np.asarray(df[session_column].astype('datetime64[ns]').dt.normalize())
+        self.add(ticker, df[self.columns].to_numpy(dtype=np.float32), sessions)
+
+    def close(self) -> None:
+        # The index is written last, so a store without one is incomplete
+        with open(self.path/INDEX_FILE, 'w') as f:
+            json.dump({'version': 1, 'columns': self.columns, 'tickers': list(self.tickers.values())}, f)
+
+    def __enter__(self) -> 'FeatureStoreWriter':
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.close()
+
+
+class FeatureStore:
+    """Read-only view of a store written by `FeatureStoreWriter`."""
+    path: Path
+    columns: list[str]
+    tickers: list[TickerEntry]
+
+    def __init__(self, path: Path, train_ratio: float = 0.7, val_ratio: float = 0.15) -> None:
+        self.path = path
+        self.train_ratio = train_ratio
+        self.val_ratio = val_ratio
+        with open(path/INDEX_FILE) as f:
+            index = json.load(f)
+        self.columns = index['columns']
+        self.tickers = index['tickers']
+        self._maps: dict[int, np.ndarray] = {}
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Memmaps are reopened in each DataLoader worker rather than pickled
+        state = self.__dict__.copy()
+        state['_maps'] = {}
+        return state
+
+    @property
+    def n_features(self) -> int:
+        return len(self.columns)
+
+    def features(self, ticker_id: int) -> np.ndarray:
+        if ticker_id not in self._maps:
+            entry = self.tickers[ticker_id]
+            if entry['rows'] == 0:
+                self._maps[ticker_id] = np.zeros((0, self.n_features), dtype=np.float32)
+            else:
+                self._maps[ticker_id] = np.memmap(
+                    self.path/f"{entry['ticker']}.f32", dtype=np.float32, mode='r',
+                    shape=(entry['rows'], self.n_features),
+                )
+        return self._maps[ticker_id]
+
+    def split_range(self, ticker_id: int, split: Split) -> tuple[int, int]:
+        """[start, stop) rows of a ticker's split, as Trainer.split_data cuts one series."""
+        rows = self.tickers[ticker_id]['rows']
+        train_end = int(rows * self.train_ratio)
+        val_end = train_end + int(rows * self.val_ratio)
+        return {'train': (0, train_end), 'val': (train_end, val_end), 'test': (val_end, rows)}[split]
+
+    def window_runs(self, sequence_length: int, split: Split) -> np.ndarray:
+        """
+        (n_runs, 3) int64 rows of (ticker_id, first window start, window count):
+        one run per session piece inside the split, each holding
+        rows - (sequence_length + 1) windows like Trainer's entry lists.
+        """
+        runs: list[tuple[int, int, int]] = []
+        for ticker_id, entry in enumerate(self.tickers):
+            lo, hi = self.split_range(ticker_id, split)
+            bounds = np.clip(np.append(entry['session_starts'], entry['rows']), lo, hi)
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                count = int(stop - start) - (sequence_length + 1)
+                if count > 0:
+                    runs.append((ticker_id, int(start), count))
+        return np.array(runs, dtype=np.int64).reshape(-1, 3)
+
+    def statistics(self, chunk_rows: int = 1 << 20) -> tuple[np.ndarray, np.ndarray]:
+        """Per-feature mean and std of every ticker's training rows, accumulated in chunks."""
+        count = 0
+        total = np.zeros(self.n_features)
+        total_squares = np.zeros(self.n_features)
+        for ticker_id in range(len(self.tickers)):
+            lo, hi = self.split_range(ticker_id, 'train')
+            features = self.features(ticker_id)
+            for start in range(lo, hi, chunk_rows):
+                chunk = np.asarray(features[start:min(start + chunk_rows, hi)], dtype=np.float64)
+                count += len(chunk)
+                total += chunk.sum(axis=0)
+                total_squares += (chunk ** 2).sum(axis=0)
+
+        mean = total / max(count, 1)
+        std = np.sqrt(np.maximum(total_squares / max(count, 1) - mean ** 2, 0.0))
+        return mean, std
+
+
+class FeatureStoreDataset(Dataset[tuple[torch.Tensor, torch.Tensor]]):
+    """
+    (sequence, next row) pairs over every ticker of a store, normalized with
+    the training statistics. Only the window being read is copied out of the
+    memmap.
+    """
+    store: FeatureStore
+    sequence_length: int
+    runs: np.ndarray
+
+    def __init__(
+        self,
+        store: FeatureStore,
+        sequence_length: int = 50,
+        split: Split = 'train',
+        mean: np.ndarray | None = None,
+        std: np.ndarray | None = None
+    ) -> None:
+        self.store = store
+        self.sequence_length = sequence_length
+        self.split = split
+        if mean is None or std is None:
+            mean, std = store.statistics()
+        self.mean = mean.astype(np.float32)
+        self.scale = (1.0 / (std + 1e-8)).astype(np.float32)
+
+        self.runs = store.window_runs(sequence_length, split)
+        self._offsets = np.concatenate([[0], np.cumsum(self.runs[:, 2])])
+
+        short: list[str] = []
+        for ticker_id, entry in enumerate(store.tickers):
+            lo, hi = store.split_range(ticker_id, split)
+            if hi - lo < sequence_length + 1:
+                short.append(entry['ticker'])
+        if short:
+            warnings.warn(
+                f"{len(short)} ticker(s) have fewer than sequence_length + 1 = {sequence_length + 1} rows in the "
+                f"'{split}' split and contribute no windows: {', '.join(short[:10])}{', ...' if len(short) > 10 else ''}",
+                stacklevel=2,
+            )
+
+    def __len__(self) -> int:
+        return int(self._offsets[-1])
+
+    def locate(self, index: int) -> tuple[int, int]:
+        """(ticker_id, start row) of window `index`."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"window {index} out of range for {len(self)} windows")
+        run = int(np.searchsorted(self._offsets, index, side='right')) - 1
+        ticker_id, first, _count = self.runs[run]
+        return int(ticker_id), int(first + index - self._offsets[run])
+
+    def __getitem__(self, index: int) -> tuple[torch.Tensor, torch.Tensor]:
+        ticker_id, start = self.locate(index)
+        window = np.asarray(self.store.features(ticker_id)[start:start + self.sequence_length + 1])
+        window = torch.from_numpy((window - self.mean) * self.scale)
+        return window[:self.sequence_length], window[self.sequence_length]
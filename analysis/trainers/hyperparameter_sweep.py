@@ -0,0 +1,242 @@
+"""
+Parallel hyperparameter sweep for StockTransformer with successive halving.
+
+Every trial trains in a worker process of one pool, with its intra-op
+threads capped at `threads_per_trial`, so `n_jobs` trials share the machine
+without oversubscribing it. The training data is written once to a
+memory-mapped FeatureStore (or used as is when it already is one); each
+worker maps it read-only, so all trials share the same pages.
+
+Successive halving: all trials train for `min_epochs`, the best
+1/`reduction_factor` of them by validation loss continue to
+`min_epochs * reduction_factor` epochs, and so on up to `max_epochs`.
+A trial resumes from its own checkpoint between rungs (Trainer's
+checkpoint_dir), so promoted trials are never retrained from scratch, and
+each rung ranks trials by their validation loss after exactly that rung's
+epochs, as recorded in the checkpoint, even when a re-run finds them
+already trained further. Each trial directory keeps the settings it was
+trained with in config.json; a re-run with different ones is refused.
+"""
+import contextlib
+import itertools
+import json
+import math
+import numpy as np
+import pandas as pd
+import time
+import torch
+import torch.nn as nn
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Literal, Sequence, TypedDict
+from analysis.trainers.checkpointing import BEST_CHECKPOINT, LAST_CHECKPOINT, load_checkpoint
+from analysis.trainers.cpu_performance import CPUPerformanceMode
+from analysis.trainers.feature_store import FeatureStore, FeatureStoreWriter
+from analysis.trainers.stock_transformer import StockTransformer
+from analysis.trainers.trainer import Trainer
+
+TRIAL_CONFIG = 'config.json'
+
+class TrialConfig(TypedDict):
+    d_model: int
+    nhead: int
+    num_layers: int
+    dim_feedforward: int
+    learning_rate: float
+
+
+class TrialResult(TypedDict):
+    trial: int
+    rung: int
+    epochs: int
+    val_loss: float
+    best_val_loss: float
+    seconds: float
+    status: Literal['promoted', 'pruned', 'completed']
+
+
+class SweepResult(TypedDict):
+    best_trial: int
+    best_config: TrialConfig
+    # The best trial's best-validation weights and normalization stats
+    best_checkpoint: Path
+    # One row per trial and rung, with the trial's configuration
+    results: pd.DataFrame
+
+
+def grid(
+    d_model: Sequence[int],
+    nhead: Sequence[int],
+    num_layers: Sequence[int],
+    dim_feedforward: Sequence[int],
+    learning_rate: Sequence[float]
+) -> list[TrialConfig]:
+    """Every combination, skipping those where nhead does not divide d_model."""
+    return [
+        TrialConfig(d_model=d, nhead=h, num_layers=layers, dim_feedforward=feedforward, learning_rate=lr)
+        for d, h, layers, feedforward, lr in itertools.product(d_model, nhead, num_layers, dim_feedforward, learning_rate)
+        if d % h == 0
+    ]
+
+
+def rung_epochs(min_epochs: int, max_epochs: int, reduction_factor: int) -> list[int]:
+    """Cumulative epochs trained by the end of each rung, e.g. [1, 3, 9, 27]."""
+    epochs = [min_epochs]
+    while epochs[-1] < max_epochs:
+        epochs.append(min(epochs[-1] * reduction_factor, max_epochs))
+    return epochs
+
+
+def _limit_threads(threads_per_trial: int) -> None:
+    torch.set_num_threads(threads_per_trial)
+    torch.set_num_interop_threads(1)
+
+
+def _claim_trial_dir(trial_dir: Path, settings: dict[str, Any]) -> None:
+    """Record a trial's settings in its directory, refusing one whose checkpoints were trained with others."""
+    path = trial_dir/TRIAL_CONFIG
+    settings = json.loads(json.dumps(settings))
+    if path.exists():
+        with open(path, 'r') as f:
+            existing = json.load(f)
+        if existing != settings:
+            raise ValueError(
+                f'{trial_dir} holds a trial trained with {existing}, not {settings}; '
+                'use another output_dir or remove it.'
+            )
+        return
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(settings, f)
+
+
+def _run_trial(
+    trial: int,
+    config: TrialConfig,
+    epochs: int,
+    store_path: Path,
+    train_ratio: float,
+    val_ratio: float,
+    trial_dir: Path,
+    batch_size: int,
+    threads_per_trial: int,
+    seed: int
+) -> tuple[float, float, float]:
+    """
+    Train one trial up to `epochs` in total; its validation loss after epoch
+    `epochs`, the best one up to it, and the seconds taken.
+    """
+    started = time.perf_counter()
+    store = FeatureStore(store_path, train_ratio, val_ratio)
+    torch.manual_seed(seed + trial)
+    model = StockTransformer(
+        d_model=config['d_model'],
+        nhead=config['nhead'],
+        num_layers=config['num_layers'],
+        dim_feedforward=config['dim_feedforward'],
+        input_size=store.n_features,
+    )
+    trainer = Trainer(store, nn.MSELoss(), model, number_of_epochs=epochs)
+    performance = CPUPerformanceMode(
+        batch_size=batch_size,
+        intra_op_threads=threads_per_trial,
+        num_workers=0,
+        bf16=False,
+        lr_scaling='none',
+        base_learning_rate=config['learning_rate'],
+    )
+
+    # Per-epoch output goes to the trial's log rather than interleaving across workers
+    trial_dir.mkdir(parents=True, exist_ok=True)
+    with open(trial_dir/'train.log', 'a') as log, contextlib.redirect_stdout(log):
+        trainer.train(performance=performance, checkpoint_dir=trial_dir, resume=True)
+
+    # A re-run into the same output_dir may find the trial trained past `epochs`: score it as of `epochs`
+    val_losses = load_checkpoint(trial_dir/LAST_CHECKPOINT)['val_losses'][:epochs]
+    return val_losses[-1], float(np.nanmin(val_losses)), time.perf_counter() - started
+
+
+def successive_halving(
+    configs: Sequence[TrialConfig],
+    data: list[np.ndarray] | FeatureStore,
+    output_dir: Path,
+    min_epochs: int = 1,
+    max_epochs: int = 27,
+    reduction_factor: int = 3,
+    n_jobs: int = 4,
+    threads_per_trial: int = 1,
+    batch_size: int = 32,
+    seed: int = 0
+) -> SweepResult:
+    """
+    Args:
+        configs: trials to run, e.g. from `grid`
+        data: the (time, features) rows Trainer takes, or a FeatureStore
+        output_dir: holds the shared feature store and one checkpoint directory per trial
+        n_jobs: trials trained at once; n_jobs * threads_per_trial should not exceed the cores
+    """
+    for config in configs:
+        if config['d_model'] % config['nhead'] != 0:
+            raise ValueError(f"nhead {config['nhead']} does not divide d_model {config['d_model']}.")
+
+    if isinstance(data, FeatureStore):
+        store = data
+    else:
+        # Rewritten on every call (the writer truncates), so a re-run never sees stale rows
+        rows = np.asarray(data, dtype=np.float32)
+        with FeatureStoreWriter(output_dir/'data', [f'feature_{i}' for i in range(rows.shape[1])]) as writer:
+            writer.add('series', rows)
+        store = FeatureStore(output_dir/'data')
+    # Workers reopen the store by path, with the same split
+    store_path, train_ratio, val_ratio = store.path, store.train_ratio, store.val_ratio
+
+    # Before any training, so a mismatched directory fails the whole sweep up front
+    for trial, config in enumerate(configs):
+        _claim_trial_dir(output_dir/f'trial_{trial:04d}', {
+            **config, 'batch_size': batch_size, 'seed': seed, 'train_ratio': train_ratio, 'val_ratio': val_ratio,
+        })
+
+    results: list[TrialResult] = []
+    survivors = list(range(len(configs)))
+    elapsed = {trial: 0.0 for trial in survivors}
+    rungs = rung_epochs(min_epochs, max_epochs, reduction_factor)
+
+    # Spawned workers start without the parent's OpenMP thread pool, which does not survive fork
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=get_context('spawn'), initializer=_limit_threads, initargs=(threads_per_trial,)) as executor:
+        for rung, epochs in enumerate(rungs):
+            futures = {
+                trial: executor.submit(
+                    _run_trial, trial, configs[trial], epochs, store_path, train_ratio, val_ratio,
+                    output_dir/f'trial_{trial:04d}', batch_size, threads_per_trial, seed,
+                )
+                for trial in survivors
+            }
+            losses = {trial: future.result() for trial, future in futures.items()}
+
+            last_rung = rung == len(rungs) - 1
+            ranked = sorted(survivors, key=lambda trial: losses[trial][0])
+            promoted = set(ranked[:math.ceil(len(ranked) / reduction_factor)]) if not last_rung else set(ranked)
+            for trial in survivors:
+                elapsed[trial] += losses[trial][2]
+                results.append(TrialResult(
+                    trial=trial,
+                    rung=rung,
+                    epochs=epochs,
+                    val_loss=losses[trial][0],
+                    best_val_loss=losses[trial][1],
+                    seconds=elapsed[trial],
+                    status='completed' if last_rung else 'promoted' if trial in promoted else 'pruned',
+                ))
+            print(f'Rung {rung} ({epochs} epochs): best Val Loss {losses[ranked[0]][0]:.6f} (trial {ranked[0]}), {len(promoted)}/{len(survivors)} kept')
+            survivors = [trial for trial in ranked if trial in promoted]
+
+    table = pd.DataFrame(results)
+    table = table.join(pd.DataFrame(list(configs)), on='trial')
+    best_trial = int(table[table['status'] == 'completed'].sort_values('best_val_loss')['trial'].iloc[0])
+    return SweepResult(
+        best_trial=best_trial,
+        best_config=configs[best_trial],
+        best_checkpoint=output_dir/f'trial_{best_trial:04d}'/BEST_CHECKPOINT,
+        results=table,
+    )
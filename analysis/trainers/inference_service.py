@@ -0,0 +1,220 @@
+"""
+Micro-batched inference for a trained next-row model.
+
+Trainer.predict runs one sequence per forward pass. Here callers `submit`
+sequences from any thread and get futures back; one worker thread takes the
+first waiting request, keeps collecting until `max_batch_size` requests are
+queued or `max_latency_ms` has passed since that first arrival, and answers
+the whole micro-batch with a single forward pass. Normalization and
+denormalization are done once per batch with the training statistics the
+service was loaded with.
+
+`load_test` drives a service from concurrent client threads and reports the
+latency percentiles seen by the callers.
+"""
+import numpy as np
+import queue
+import threading
+import time
+import torch
+import torch.nn as nn
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Sequence, TypedDict
+
+
+class LoadTestReport(TypedDict):
+    requests: int
+    seconds: float
+    requests_per_second: float
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+    mean_batch_size: float
+
+
+class InferenceService:
+    """
+    Args:
+        model: trained model mapping (batch, sequence, features) to (batch, features)
+        train_mean, train_std: the Trainer's normalization statistics
+        max_batch_size: sequences per forward pass
+        max_latency_ms: longest a request waits for others to join its batch
+        inputs_normalized: sequences are submitted already normalized, as
+            Trainer.predict takes them; by default they are in the original scale
+        threads: torch intra-op threads for the forward passes. This calls
+            torch.set_num_threads, which is process-wide: it also changes the
+            threads of any other torch work in this process
+    """
+    batches: int
+    batched_requests: int
+
+    def __init__(
+        self,
+        model: nn.Module,
+        train_mean: np.ndarray,
+        train_std: np.ndarray,
+        max_batch_size: int = 256,
+        max_latency_ms: float = 5.0,
+        inputs_normalized: bool = False,
+        threads: int | None = None
+    ) -> None:
+        self.model = model.eval()
+        self.mean = torch.as_tensor(train_mean, dtype=torch.float32)
+        self.std = torch.as_tensor(train_std, dtype=torch.float32)
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.inputs_normalized = inputs_normalized
+        if threads is not None:
+            torch.set_num_threads(threads)
+
+        self.batches = 0
+        self.batched_requests = 0
+        self._closed = False
+        self._closing = threading.Lock()
+        self._requests: queue.Queue[tuple[np.ndarray, Future[np.ndarray]] | None] = queue.Queue()
+        self._worker = threading.Thread(target=self._serve, name='inference-service', daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def from_checkpoint(cls, path: Path, model: nn.Module, **options: Any) -> 'InferenceService':
+        """Load weights and normalization statistics from a Trainer checkpoint (best.pt or last.pt) into `model`."""
+        checkpoint = torch.load(path, weights_only=False)
+        _ = model.load_state_dict(checkpoint['model'])
+        return cls(model, checkpoint['train_mean'], checkpoint['train_std'], **options)
+
+    def submit(self, sequence: np.ndarray) -> Future[np.ndarray]:
+        """Queue one (sequence, features) window; the future resolves to its prediction in the original scale."""
+        sequence = np.asarray(sequence, dtype=np.float32)
+        if sequence.ndim != 2 or sequence.shape[1] != len(self.mean):
+            raise ValueError(f'Expected a (sequence, {len(self.mean)}) window, got {sequence.shape}.')
+
+        future: Future[np.ndarray] = Future()
+        with self._closing:
+            if self._closed:
+                raise RuntimeError('The inference service is closed.')
+            self._requests.put((sequence, future))
+        return future
+
+    def predict(self, sequence: np.ndarray) -> np.ndarray:
+        return self.submit(sequence).result()
+
+    def predict_many(self, sequences: Sequence[np.ndarray]) -> np.ndarray:
+        futures = [self.submit(sequence) for sequence in sequences]
+        return np.stack([future.result() for future in futures])
+
+    def close(self) -> None:
+        """Answer what is already queued, then stop the worker; later submits raise RuntimeError."""
+        with self._closing:
+            if not self._closed:
+                self._closed = True
+                self._requests.put(None)
+        self._worker.join()
+
+    def __enter__(self) -> 'InferenceService':
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.close()
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.batched_requests / max(self.batches, 1)
+
+    def _collect(self) -> tuple[list[tuple[np.ndarray, Future[np.ndarray]]], bool]:
+        """The next micro-batch, and whether close() was requested."""
+        first = self._requests.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.perf_counter() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Whatever is already queued joins without waiting
+                request = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _serve(self) -> None:
+        closing = False
+        while not closing:
+            batch, closing = self._collect()
+            # Cancelled requests are dropped
+            live = [(sequence, future) for sequence, future in batch if future.set_running_or_notify_cancel()]
+
+            # Windows of different lengths cannot be stacked; each length is its own forward pass,
+            # so a window the model rejects fails only the requests of its length
+            groups: dict[tuple[int, ...], list[tuple[np.ndarray, Future[np.ndarray]]]] = {}
+            for sequence, future in live:
+                groups.setdefault(sequence.shape, []).append((sequence, future))
+            for group in groups.values():
+                futures = [future for _sequence, future in group]
+                try:
+                    predictions = self._forward(np.stack([sequence for sequence, _future in group]))
+                except Exception as error:
+                    for future in futures:
+                        future.set_exception(error)
+                    continue
+                for future, prediction in zip(futures, predictions):
+                    future.set_result(prediction)
+                self.batches += 1
+                self.batched_requests += len(futures)
+
+    def _forward(self, sequences: np.ndarray) -> np.ndarray:
+        with torch.inference_mode():
+            inputs = torch.from_numpy(sequences)
+            if not self.inputs_normalized:
+                inputs = (inputs - self.mean) / (self.std + 1e-8)
+            # Denormalize as Trainer.predict does
+            return (self.model(inputs) * self.std + self.mean).numpy()
+
+
+def load_test(
+    service: InferenceService,
+    sequences: Sequence[np.ndarray],
+    requests: int = 10000,
+    concurrency: int = 64
+) -> LoadTestReport:
+    """
+    `concurrency` client threads each send one request, wait for its answer
+    and send the next, until `requests` have been answered. Sequences are
+    drawn round-robin from `sequences`.
+    """
+    latencies = np.zeros(requests)
+    counter = iter(range(requests))
+    lock = threading.Lock()
+    batches, batched_requests = service.batches, service.batched_requests
+
+    def client() -> None:
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            _ = service.predict(sequences[i % len(sequences)])
+            latencies[i] = time.perf_counter() - start
+
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    milliseconds = latencies * 1000
+    return LoadTestReport(
+        requests=requests,
+        seconds=seconds,
+        requests_per_second=requests / seconds,
+        p50_ms=float(np.percentile(milliseconds, 50)),
+        p99_ms=float(np.percentile(milliseconds, 99)),
+        max_ms=float(milliseconds.max()),
+        mean_batch_size=(service.batched_requests - batched_requests) / max(service.batches - batches, 1),
+    )
@@ -0,0 +1,37 @@
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+
+class SlidingWindowDataset(Dataset[tuple[torch.Tensor, torch.Tensor]]):
+    """
+    (sequence, next row) pairs over one normalized (time, features) array.
+
+    The array is held once as a float32 tensor and every item is a view into
+    it, so no window is copied until the DataLoader stacks a batch. Like the
+    entry lists it replaces, it has len(data) - (sequence_length + 1) windows.
+    """
+    data: torch.Tensor
+    sequence_length: int
+
+    def __init__(self, data: np.ndarray, sequence_length: int = 50) -> None:
+        self.data = torch.from_numpy(np.ascontiguousarray(data, dtype=np.float32))
+        self.sequence_length = sequence_length
+
+    def __len__(self) -> int:
+        return max(len(self.data) - (self.sequence_length + 1), 0)
+
+    def __getitem__(self, index: int) -> tuple[torch.Tensor, torch.Tensor]:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"window {index} out of range for {len(self)} windows")
+        return self.data[index:index + self.sequence_length], self.data[index + self.sequence_length]
+
+    def tensors(self) -> tuple[torch.Tensor, torch.Tensor]:
+        """All windows at once as strided views: inputs (n, sequence_length, features) and targets (n, features)."""
+        n = len(self)
+        # unfold gives (windows, features, sequence_length); swap back without copying
+        inputs = self.data.unfold(0, self.sequence_length, 1)[:n].transpose(1, 2)
+        targets = self.data[self.sequence_length:self.sequence_length + n]
+        return inputs, targets
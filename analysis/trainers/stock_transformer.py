@@ -1,5 +1,27 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
+
+
+def attend(layer: nn.TransformerEncoderLayer, q: torch.Tensor, k: torch.Tensor, v: torch.Tensor, bias: torch.Tensor | None = None) -> torch.Tensor:
+    """A layer's multi-head attention of (B, Lq, d) queries over (B, Lk, d) keys/values, through out_proj."""
+    attention = layer.self_attn
+    heads = attention.num_heads
+    batch, length, d_model = q.shape
+
+    def split(t: torch.Tensor) -> torch.Tensor:
+        return t.reshape(batch, -1, heads, d_model // heads).transpose(1, 2)
+
+    dropout = attention.dropout if layer.training else 0.0
+    attended = F.scaled_dot_product_attention(split(q), split(k), split(v), attn_mask=bias, dropout_p=dropout)
+    return attention.out_proj(attended.transpose(1, 2).reshape(batch, length, d_model))
+
+
+def finish_layer(layer: nn.TransformerEncoderLayer, x: torch.Tensor, attended: torch.Tensor) -> torch.Tensor:
+    """The rest of a post-norm encoder layer: residual and norm, feed-forward, residual and norm."""
+    x = layer.norm1(x + layer.dropout1(attended))
+    return layer.norm2(x + layer.dropout2(layer.linear2(layer.dropout(layer.activation(layer.linear1(x))))))
+
 
 class StockTransformer(nn.Module):
     def __init__(
@@ -7,13 +29,42 @@ class StockTransformer(nn.Module):
         d_model: int,
         nhead: int,
         num_layers: int,
-        dim_feedforward: int
+        dim_feedforward: int,
+        input_size: int | None = None,
+        sequence_length: int = 50,
+        attention_window: int | None = None
     ):
+        """
+        Args:
+            input_size: features per row; without it the rows are used as d_model-wide embeddings directly
+            sequence_length: rows per input window
+            attention_window: if set, each position attends causally to itself and the
+                attention_window - 1 rows before it, with a learned per-layer, per-head
+                relative-position bias instead of the absolute positional encoding. A row's
+                encodings then do not depend on where it sits in the window, so
+                StreamingPredictor can cache them per layer as the window slides.
+        """
         super().__init__()
-        
+        if attention_window is not None and num_layers * (attention_window - 1) >= sequence_length:
+            # The last row's receptive field must fit in the window for streaming and batch outputs to agree
+            raise ValueError(
+                f'num_layers * (attention_window - 1) must be below sequence_length ({sequence_length}), '
+                f'got {num_layers} * ({attention_window} - 1).'
+            )
+        self.sequence_length = sequence_length
+        self.attention_window = attention_window
+
+        self.input_projection = nn.Linear(input_size, d_model) if input_size is not None else None
+
         # Positional encoding
-        self.pos_encoder = nn.Parameter(torch.randn(1, 50, d_model))
-        
+        if attention_window is None:
+            self.pos_encoder = nn.Parameter(torch.randn(1, sequence_length, d_model))
+            self.relative_bias = None
+        else:
+            self.pos_encoder = None
+            # Bias per layer and head for attending to the row `offset` steps back
+            self.relative_bias = nn.Parameter(torch.zeros(num_layers, nhead, attention_window))
+
         # Transformer encoder
         encoder_layer = nn.TransformerEncoderLayer(
             d_model=d_model,
@@ -22,21 +73,40 @@ class StockTransformer(nn.Module):
             batch_first=True
         )
         self.transformer = nn.TransformerEncoder(encoder_layer, num_layers=num_layers)
-        
+
         # Output head - predict next window
-        self.output_head = nn.Linear(d_model, d_model)
-        
+        self.output_head = nn.Linear(d_model, input_size or d_model)
+
+    def attention_masks(self, length: int) -> torch.Tensor:
+        """(num_layers, nhead, length, length) additive masks of the sliding-window variant."""
+        assert self.relative_bias is not None and self.attention_window is not None
+        positions = torch.arange(length, device=self.relative_bias.device)
+        offsets = positions[:, None] - positions[None, :]
+        inside = (offsets >= 0) & (offsets < self.attention_window)
+        bias = self.relative_bias[:, :, offsets.clamp(0, self.attention_window - 1)]
+        return bias.masked_fill(~inside, float('-inf'))
+
     def forward(self, x):
         # x shape: (batch, 50, 100)
-        
-        # Add positional encoding
-        x = x + self.pos_encoder
-        
-        # Pass through transformer
-        x = self.transformer(x)
-        
+        if self.input_projection is not None:
+            x = self.input_projection(x)
+
+        if self.relative_bias is not None:
+            # Layers are applied through attend/finish_layer: the built-in fast path
+            # mishandles masks that differ per head
+            masks = self.attention_masks(x.shape[1])
+            for layer, mask in zip(self.transformer.layers, masks):
+                q, k, v = F.linear(x, layer.self_attn.in_proj_weight, layer.self_attn.in_proj_bias).chunk(3, dim=-1)
+                x = finish_layer(layer, x, attend(layer, q, k, v, mask))
+        else:
+            # Add positional encoding
+            x = x + self.pos_encoder
+
+            # Pass through transformer
+            x = self.transformer(x)
+
         # Take the last token's output and project to target dimension
         x = x[:, -1, :]  # Shape: (batch, 100)
         x = self.output_head(x)
-        
+
         return x
\ No newline at end of file
@@ -0,0 +1,127 @@
+"""
+Rolling-window inference for StockTransformer, one new bar at a time.
+
+Each call to `step` appends one row per stream (e.g. one per ticker) and
+returns the prediction for the window of the last `sequence_length` rows:
+the same as calling the model on that window, without re-encoding it.
+
+- With absolute positional encoding every position's encoding changes as the
+  window slides, so only what depends on the row alone is cached: its input
+  projection and its first-layer query/key/value projection (the positional
+  part, pos_encoder @ W + b, is a constant). The last layer computes keys and
+  values for all positions but the query, attention and feed-forward for the
+  last position only.
+- With the sliding-window variant (attention_window set) a row's encodings
+  at every layer depend only on the rows before it, so each layer keeps a
+  cache of the last attention_window keys and values and a bar costs one
+  row's worth of work per layer.
+"""
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from analysis.trainers.stock_transformer import StockTransformer, attend, finish_layer
+
+
+class StreamingPredictor:
+    """
+    Args:
+        model: a trained StockTransformer; it is put in eval mode
+        streams: series advanced together by each `step`
+    """
+    rows_seen: int
+
+    def __init__(self, model: StockTransformer, streams: int = 1) -> None:
+        self.model = model.eval()
+        self.layers: list[nn.TransformerEncoderLayer] = list(model.transformer.layers)
+        if any(layer.norm_first for layer in self.layers):
+            raise ValueError('StreamingPredictor expects post-norm encoder layers.')
+        self.d_model = self.layers[0].self_attn.embed_dim
+
+        if model.pos_encoder is not None:
+            with torch.inference_mode():
+                first = self.layers[0].self_attn
+                self._position_qkv = F.linear(model.pos_encoder[0], first.in_proj_weight, first.in_proj_bias)
+        self.reset(streams)
+
+    def reset(self, streams: int | None = None) -> None:
+        """Forget every stream's rows."""
+        if streams is not None:
+            self.streams = streams
+        self.rows_seen = 0
+        empty = torch.zeros(self.streams, 0, self.d_model)
+        # Absolute encoding: embedded rows and their first-layer projections (without bias)
+        self._embedded = empty
+        self._row_qkv = torch.zeros(self.streams, 0, 3 * self.d_model)
+        # Sliding window: per-layer keys and values of the last attention_window rows
+        self._keys = [empty for _ in self.layers]
+        self._values = [empty for _ in self.layers]
+
+    def step(self, rows: torch.Tensor) -> torch.Tensor | None:
+        """
+        Append one (streams, features) row per stream; the (streams, features)
+        predictions for the last sequence_length rows, or None while fewer
+        rows than that have been seen.
+        """
+        with torch.inference_mode():
+            x = rows.reshape(self.streams, 1, -1).float()
+            if self.model.input_projection is not None:
+                x = self.model.input_projection(x)
+            self.rows_seen += 1
+
+            if self.model.relative_bias is not None:
+                prediction = self._step_sliding_window(x)
+            else:
+                prediction = self._step_absolute(x)
+        return prediction if self.rows_seen >= self.model.sequence_length else None
+
+    def prime(self, sequences: torch.Tensor) -> torch.Tensor | None:
+        """Feed (streams, rows, features) history in order; the prediction after its last row."""
+        prediction = None
+        for t in range(sequences.shape[1]):
+            prediction = self.step(sequences[:, t])
+        return prediction
+
+    def _step_absolute(self, x: torch.Tensor) -> torch.Tensor | None:
+        length = self.model.sequence_length
+        first = self.layers[0].self_attn
+        self._embedded = torch.cat([self._embedded, x], dim=1)[:, -length:]
+        self._row_qkv = torch.cat([self._row_qkv, F.linear(x, first.in_proj_weight)], dim=1)[:, -length:]
+        if self._embedded.shape[1] < length:
+            return None
+
+        assert self.model.pos_encoder is not None
+        d = self.d_model
+        h = self._embedded + self.model.pos_encoder
+        qkv = self._row_qkv + self._position_qkv
+        last = len(self.layers) - 1
+
+        # First layer from the cached projections; only the last query if it is also the last layer
+        queries = qkv[:, -1:, :d] if last == 0 else qkv[:, :, :d]
+        residual = h[:, -1:] if last == 0 else h
+        h = finish_layer(self.layers[0], residual, attend(self.layers[0], queries, qkv[:, :, d:2*d], qkv[:, :, 2*d:]))
+
+        for layer in self.layers[1:last]:
+            h = layer(h)
+
+        if last > 0:
+            layer = self.layers[last]
+            weight, bias = layer.self_attn.in_proj_weight, layer.self_attn.in_proj_bias
+            keys_values = F.linear(h, weight[d:], bias[d:])
+            query = F.linear(h[:, -1:], weight[:d], bias[:d])
+            h = finish_layer(layer, h[:, -1:], attend(layer, query, keys_values[:, :, :d], keys_values[:, :, d:]))
+        return self.model.output_head(h[:, -1])
+
+    def _step_sliding_window(self, x: torch.Tensor) -> torch.Tensor:
+        assert self.model.relative_bias is not None and self.model.attention_window is not None
+        d = self.d_model
+        window = self.model.attention_window
+        for i, layer in enumerate(self.layers):
+            q, k, v = F.linear(x, layer.self_attn.in_proj_weight, layer.self_attn.in_proj_bias).split(d, dim=-1)
+            self._keys[i] = torch.cat([self._keys[i], k], dim=1)[:, -window:]
+            self._values[i] = torch.cat([self._values[i], v], dim=1)[:, -window:]
+
+            # Cached rows run from the oldest (offset n - 1) to this one (offset 0)
+            n = self._keys[i].shape[1]
+            bias = self.model.relative_bias[i][:, torch.arange(n - 1, -1, -1)]
+            x = finish_layer(layer, x, attend(layer, q, self._keys[i], self._values[i], bias[None, :, None, :]))
+        return self.model.output_head(x[:, -1])
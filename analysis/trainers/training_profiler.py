@@ -0,0 +1,133 @@
+"""
+Per-epoch timing and throughput records for Trainer.train.
+
+Each epoch is split into phases: waiting for the next batch ('data'),
+'forward' (model and loss), 'backward', 'optimizer' and 'validation'. Their
+wall times, the training throughput and the process's peak RSS make up one
+record per epoch. Records are kept in `records` and, given a `log_path`,
+appended to it as JSON lines, so runs with different settings can be loaded
+side by side (`load_log`).
+
+For one chosen epoch the whole epoch can also run under torch.profiler, with
+the phases marked as record_function ranges, and its Chrome trace is written
+to `trace_dir`.
+"""
+import json
+import resource
+import sys
+import time
+import pandas as pd
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, TypedDict
+from torch.profiler import ProfilerActivity, profile, record_function
+
+PHASES = ('data', 'forward', 'backward', 'optimizer', 'validation')
+
+
+class EpochRecord(TypedDict):
+    run: str
+    epoch: int
+    timestamp: str
+    epoch_seconds: float
+    phase_seconds: dict[str, float]
+    windows: int
+    windows_per_second: float
+    peak_rss_mb: float
+    metrics: dict[str, float]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def load_log(path: Path) -> pd.DataFrame:
+    """One row per epoch record, phase times flattened to phase_seconds_<name> columns."""
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return pd.json_normalize(records, sep='_')
+
+
+class TrainingProfiler:
+    """
+    Args:
+        log_path: JSON-lines file the epoch records are appended to
+        profile_epoch: epoch (1-based) to run under torch.profiler
+        trace_dir: where that epoch's Chrome trace goes (default: next to log_path)
+    """
+    records: list[EpochRecord]
+
+    def __init__(
+        self,
+        log_path: Path | None = None,
+        run: str | None = None,
+        profile_epoch: int | None = None,
+        trace_dir: Path | None = None
+    ) -> None:
+        self.log_path = log_path
+        self.run = run or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        self.profile_epoch = profile_epoch
+        self.trace_dir = trace_dir or (log_path.parent if log_path is not None else Path.cwd())
+        self.records = []
+        self._phase_seconds: dict[str, float] = {}
+        self._epoch_start = 0.0
+        self._torch_profile: profile | None = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            if self._torch_profile is not None:
+                with record_function(name):
+                    yield
+            else:
+                yield
+        finally:
+            self._phase_seconds[name] = self._phase_seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def start_epoch(self, epoch: int) -> None:
+        self._phase_seconds = {name: 0.0 for name in PHASES}
+        if epoch == self.profile_epoch:
+            self._torch_profile = profile(activities=[ProfilerActivity.CPU], record_shapes=True, profile_memory=True)
+            self._torch_profile.start()
+        self._epoch_start = time.perf_counter()
+
+    def end_epoch(self, epoch: int, windows: int, metrics: dict[str, Any]) -> EpochRecord:
+        """Close the epoch's record; `windows` is the number of training windows it processed."""
+        epoch_seconds = time.perf_counter() - self._epoch_start
+        if self._torch_profile is not None:
+            self._torch_profile.stop()
+            self.trace_dir.mkdir(parents=True, exist_ok=True)
+            self._torch_profile.export_chrome_trace(str(self.trace_dir/f'{self.run}_epoch_{epoch}.json'))
+            self._torch_profile = None
+
+        # Throughput over the training phases only, so validation does not dilute it
+        training_seconds = sum(seconds for name, seconds in self._phase_seconds.items() if name != 'validation')
+        record = EpochRecord(
+            run=self.run,
+            epoch=epoch,
+            timestamp=datetime.now(timezone.utc).isoformat(),
+            epoch_seconds=epoch_seconds,
+            phase_seconds=dict(self._phase_seconds),
+            windows=windows,
+            windows_per_second=windows / training_seconds if training_seconds > 0 else 0.0,
+            peak_rss_mb=peak_rss_mb(),
+            metrics={key: float(value) for key, value in metrics.items()},
+        )
+        self.records.append(record)
+
+        if self.log_path is not None:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        return record
+
+    def summary(self, record: EpochRecord) -> str:
+        # Each phase's share of the epoch's wall time
+        total = max(record['epoch_seconds'], 1e-12)
+        phases = ', '.join(f'{name} {seconds / total:.0%}' for name, seconds in record['phase_seconds'].items())
+        return f'{record["windows_per_second"]:,.0f} windows/s, peak RSS {record["peak_rss_mb"]:.0f} MB ({phases})'
@@ -0,0 +1,65 @@
+from collections import Counter
+from pathlib import Path
+import numpy as np
+from analysis.tokenization.tokenizers.byte_pair_tokenizer import BytePairTokenizer
+
+
+def _naive_learn(sequences: list[list[int]], vocabulary_size: int, alphabet_size: int, min_frequency: int) -> list[tuple[int, int]]:
+    """Recount every pair before each merge; most frequent first, ties towards the smaller pair."""
+    merges: list[tuple[int, int]] = []
+    while alphabet_size + len(merges) < vocabulary_size:
+        counts = Counter((a, b) for sequence in sequences for a, b in zip(sequence, sequence[1:]))
+        if not counts:
+            break
+        pair = min(counts, key=lambda pair: (-counts[pair], pair))
+        if counts[pair] < min_frequency:
+            break
+        token = alphabet_size + len(merges)
+        merges.append(pair)
+
+        merged = []
+        for sequence in sequences:
+            out, i = [], 0
+            while i < len(sequence):
+                if i + 1 < len(sequence) and (sequence[i], sequence[i + 1]) == pair:
+                    out.append(token)
+                    i += 2
+                else:
+                    out.append(sequence[i])
+                    i += 1
+            merged.append(out)
+        sequences = merged
+    return merges
+
+
+def _sessions(rng: np.random.Generator) -> list[str]:
+    # Runs make overlapping pairs such as 'AAA' common
+    return [''.join(rng.choice(list('ABC')) * int(rng.integers(1, 5)) for _ in range(int(rng.integers(0, 30)))) for _ in range(8)]
+
+
+def test_learn_matches_naive_merging() -> None:
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        sessions = _sessions(rng)
+        tokenizer = BytePairTokenizer('ABC')
+        merges = tokenizer.learn(sessions, vocabulary_size=20)
+
+        expected = _naive_learn([[ord(letter) - 65 for letter in session] for session in sessions], 20, 3, 2)
+        assert merges == expected
+
+
+def test_encode_reproduces_training_segmentation(tmp_path: Path) -> None:
+    rng = np.random.default_rng(1)
+    sessions = _sessions(rng)
+    tokenizer = BytePairTokenizer('ABC')
+    _ = tokenizer.learn(sessions, vocabulary_size=15)
+
+    tokenizer.save(tmp_path/'bpe.json')
+    loaded = BytePairTokenizer.load(tmp_path/'bpe.json')
+    assert loaded.merges == tokenizer.merges
+
+    for session in sessions:
+        tokens = loaded.encode(session)
+        assert ''.join(loaded.decode(tokens)) == session
+        # A learned pair never survives encoding unmerged
+        assert not any(loaded._ranks.get((int(a), int(b))) is not None for a, b in zip(tokens, tokens[1:]))
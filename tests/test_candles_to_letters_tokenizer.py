@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from sklearn.mixture import GaussianMixture
+from analysis.tokenization.tokenizers.candles_to_letters_tokenizer import CandlesToLettersTokenizer
+
+
+def _tokenizer(data: np.ndarray, window_size: int) -> CandlesToLettersTokenizer:
+    tokenizer = CandlesToLettersTokenizer(GaussianMixture(n_components=4, random_state=0), window_size=window_size, batch_size=16)
+    scaler = tokenizer.fit_scaler(data)
+    _ = tokenizer.model.fit(scaler.transform(tokenizer.windows(data)))
+    return tokenizer
+
+
+@pytest.mark.parametrize('window_size', [1, 2, 5])
+def test_append_matches_transform_of_the_whole_series(window_size: int) -> None:
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((120, 4))
+    tokenizer = _tokenizer(data, window_size)
+
+    tokenizer.transform(data)
+    expected = tokenizer.transformed_data
+    assert len(expected) == len(data) - window_size + 1
+
+    tokenizer.transform(data[:50])
+    new_letters = ''.join(tokenizer.append(data[start:start + 7]) for start in range(50, len(data), 7))
+    assert len(new_letters) == len(data) - 50
+    assert tokenizer.transformed_data == expected
+
+
+def test_append_keeps_state_when_encoding_fails() -> None:
+    rng = np.random.default_rng(1)
+    data = rng.standard_normal((40, 4))
+    tokenizer = _tokenizer(data, 3)
+    tokenizer.transform(data)
+    tail, letters = tokenizer._tail, tokenizer.transformed_data
+
+    tokenizer.scaler = None
+    with pytest.raises(ValueError):
+        _ = tokenizer.append(data[:5])
+    assert tokenizer._tail is tail and tokenizer.transformed_data == letters
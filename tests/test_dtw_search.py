@@ -0,0 +1,68 @@
+import numpy as np
+from analysis.analyzers.dtw_search import DTWIndex, _envelope_violation, dtw_batch, dtw_distance, envelope, lb_kim
+
+
+def _naive_dtw(a: np.ndarray, b: np.ndarray, radius: int) -> float:
+    n = len(a)
+    cost = np.full((n + 1, n + 1), np.inf)
+    cost[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(max(1, i - radius), min(n, i + radius) + 1):
+            step = float(((a[i - 1] - b[j - 1]) ** 2).sum())
+            cost[i, j] = step + min(cost[i - 1, j], cost[i, j - 1], cost[i - 1, j - 1])
+    return float(np.sqrt(cost[n, n]))
+
+
+def _random_walks(rng: np.random.Generator, count: int, length: int) -> list[np.ndarray]:
+    return [rng.standard_normal((length, 2)).cumsum(axis=0) for _ in range(count)]
+
+
+def test_dtw_matches_the_textbook_recurrence() -> None:
+    rng = np.random.default_rng(0)
+    for radius in (0, 2, 5, 20):
+        a, b = rng.standard_normal((20, 2)), rng.standard_normal((20, 2))
+        assert np.isclose(dtw_distance(a, b, radius), _naive_dtw(a, b, radius))
+
+
+def test_lower_bounds_never_exceed_dtw() -> None:
+    rng = np.random.default_rng(1)
+    radius = 3
+    query = rng.standard_normal((24, 2))
+    candidates = rng.standard_normal((200, 24, 2))
+    squared = dtw_batch(query, candidates, radius)
+
+    upper, lower = envelope(query, radius)
+    candidate_upper, candidate_lower = envelope(candidates, radius)
+    bounds = [
+        lb_kim(query, candidates),
+        _envelope_violation(candidates, upper, lower).sum(axis=1),
+        _envelope_violation(query, candidate_upper, candidate_lower).sum(axis=1),
+    ]
+    for bound in bounds:
+        assert (bound <= squared + 1e-9).all()
+
+    # Early abandoning only drops candidates above the threshold, and leaves the others exact
+    threshold = float(np.median(squared))
+    abandoned = dtw_batch(query, candidates, radius, threshold)
+    finished = np.isfinite(abandoned)
+    assert finished[squared <= threshold].all()
+    assert np.allclose(abandoned[finished], squared[finished])
+
+
+def test_query_matches_brute_force() -> None:
+    rng = np.random.default_rng(2)
+    segments = _random_walks(rng, 300, 40)
+    index = DTWIndex(length=32, window=0.1, batch_size=32)
+    index.add(segments[:150])
+    index.add(segments[150:])
+
+    for q in (0, 7, 123):
+        matches, stats = index.query(segments[q], k=5, exclude=q)
+        series = index.series
+        distances = np.array([dtw_distance(series[q], series[i], index.radius) if i != q else np.inf for i in range(len(series))])
+        expected = np.argsort(distances, kind='stable')[:5]
+
+        assert [match['index'] for match in matches] == expected.tolist()
+        assert np.allclose([match['distance'] for match in matches], distances[expected])
+        pruned = stats['pruned_by_kim'] + stats['pruned_by_keogh_query'] + stats['pruned_by_keogh_candidate']
+        assert pruned + stats['abandoned'] + stats['full_dtw'] == stats['candidates'] == len(series) - 1
@@ -0,0 +1,49 @@
+from pathlib import Path
+import numpy as np
+import pytest
+from analysis.trainers.checkpointing import load_checkpoint
+from analysis.trainers.feature_store import FeatureStore, FeatureStoreWriter
+from analysis.trainers.hyperparameter_sweep import grid, rung_epochs, successive_halving
+
+CONFIGS = grid(d_model=[8], nhead=[2], num_layers=[1], dim_feedforward=[16], learning_rate=[1e-3, 1e-4, 1e-5])
+OPTIONS = {'min_epochs': 1, 'max_epochs': 3, 'reduction_factor': 3, 'n_jobs': 2, 'batch_size': 64}
+
+
+def _rows() -> list[np.ndarray]:
+    return list(np.random.default_rng(0).standard_normal((600, 4)).astype(np.float32))
+
+
+def test_rung_epochs() -> None:
+    assert rung_epochs(1, 27, 3) == [1, 3, 9, 27]
+    assert rung_epochs(2, 10, 3) == [2, 6, 10]
+
+
+def test_rerun_ranks_each_rung_on_its_own_epochs(tmp_path: Path) -> None:
+    first = successive_halving(CONFIGS, _rows(), tmp_path, **OPTIONS)['results']
+    assert list(first['status']) == ['promoted', 'pruned', 'pruned', 'completed']
+
+    # Every trial directory is already trained to its last rung: rung 0 must still report epoch 1's losses
+    second = successive_halving(CONFIGS, _rows(), tmp_path, **OPTIONS)['results']
+    columns = ['trial', 'rung', 'epochs', 'val_loss', 'best_val_loss', 'status']
+    assert second[columns].equals(first[columns])
+
+    promoted = int(first.loc[first['status'] == 'completed', 'trial'].iloc[0])
+    val_losses = load_checkpoint(tmp_path/f'trial_{promoted:04d}'/'last.pt')['val_losses']
+    assert len(val_losses) == 3
+    assert first.loc[(first['trial'] == promoted) & (first['rung'] == 0), 'val_loss'].iloc[0] == val_losses[0]
+
+
+def test_rerun_with_other_settings_is_refused(tmp_path: Path) -> None:
+    _ = successive_halving(CONFIGS[:1], _rows(), tmp_path, **{**OPTIONS, 'max_epochs': 1})
+    with pytest.raises(ValueError, match='trial_0000'):
+        _ = successive_halving(CONFIGS[1:2], _rows(), tmp_path, **{**OPTIONS, 'max_epochs': 1})
+
+
+def test_trials_use_the_store_split(tmp_path: Path) -> None:
+    with FeatureStoreWriter(tmp_path/'store', ['a', 'b', 'c', 'd']) as writer:
+        writer.add('SPY', np.stack(_rows()))
+    store = FeatureStore(tmp_path/'store', train_ratio=0.5, val_ratio=0.3)
+
+    result = successive_halving(CONFIGS[:1], store, tmp_path/'sweep', **{**OPTIONS, 'max_epochs': 1})
+    best = load_checkpoint(result['best_checkpoint'])
+    assert np.allclose(best['train_mean'], store.statistics()[0])
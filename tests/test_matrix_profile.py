@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from analysis.analyzers.matrix_profile import MatrixProfile
+
+
+def _naive_profile(series: np.ndarray, window: int, exclusion: int) -> tuple[np.ndarray, np.ndarray]:
+    subsequences = np.lib.stride_tricks.sliding_window_view(series, window)
+    normalized = (subsequences - subsequences.mean(axis=1, keepdims=True)) / subsequences.std(axis=1, keepdims=True)
+    distances = np.sqrt(((normalized[:, None] - normalized[None]) ** 2).sum(axis=2))
+    for i in range(len(distances)):
+        distances[i, max(0, i - exclusion + 1):i + exclusion] = np.inf
+    return distances.min(axis=1), distances
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_exact_profile_matches_brute_force(n_jobs: int) -> None:
+    series = np.random.default_rng(0).standard_normal(300).cumsum()
+    matrix_profile = MatrixProfile(series, window=16).compute(n_jobs=n_jobs)
+    expected, distances = _naive_profile(series, 16, matrix_profile.exclusion)
+
+    assert np.allclose(matrix_profile.profile, expected, atol=1e-6)
+    rows = np.arange(len(expected))
+    assert np.allclose(distances[rows, matrix_profile.index], expected, atol=1e-6)
+    assert matrix_profile.diagonals_done == matrix_profile.n_diagonals
+
+    assert np.allclose(matrix_profile.distance_profile(40)[distances[40] < np.inf], distances[40][distances[40] < np.inf], atol=1e-6)
+
+
+def test_approximate_profile_bounds_the_exact_one() -> None:
+    series = np.random.default_rng(1).standard_normal(400).cumsum()
+    exact = MatrixProfile(series, window=20).compute()
+
+    partial = MatrixProfile(series, window=20).compute(approximate=True, fraction=0.2)
+    assert (partial.profile >= exact.profile - 1e-6).all()
+    # The pointed-to neighbour really is at the reported distance
+    for i in range(0, len(partial.profile), 37):
+        assert np.isclose(partial.distance_profile(i)[partial.index[i]], partial.profile[i], atol=1e-6)
+
+    complete = MatrixProfile(series, window=20).compute(approximate=True, fraction=1.0)
+    assert np.allclose(complete.profile, exact.profile, atol=1e-6)
+
+
+def test_planted_motif_is_found() -> None:
+    rng = np.random.default_rng(2)
+    series = rng.standard_normal(1000)
+    shape = np.sin(np.linspace(0, 3 * np.pi, 30)) * 5
+    series[100:130] += shape
+    series[600:630] += shape
+
+    motif = MatrixProfile(series, window=30).compute().motifs(k=1)[0]
+    first, second = sorted(motif['indices'][:2])
+    assert abs(first - 100) < 10 and second - first == 500
+
+
+def test_planted_discord_is_found() -> None:
+    rng = np.random.default_rng(3)
+    series = np.sin(2 * np.pi * np.arange(1500) / 50) + 0.05 * rng.standard_normal(1500)
+    # One cycle with a straight stretch instead of its peak
+    series[700:720] = np.linspace(series[700], series[720], 20)
+
+    discord = MatrixProfile(series, window=50).compute().discords(k=1)[0]
+    assert 700 - 50 < discord['index'] < 720
@@ -0,0 +1,71 @@
+from collections import Counter
+from pathlib import Path
+import numpy as np
+import pytest
+from analysis.tokenization.corpus.motif_index import MotifIndex, lcp_array, suffix_array
+from analysis.tokenization.corpus.token_corpus import TokenCorpus, TokenCorpusWriter
+
+
+def _sessions(rng: np.random.Generator, count: int) -> list[str]:
+    return [''.join(rng.choice(list('ABC'), size=int(rng.integers(0, 60)))) for _ in range(count)]
+
+
+def _occurrences(sessions: list[str], pattern: str) -> list[tuple[str, int]]:
+    return [
+        (f'{i}', offset)
+        for i, session in enumerate(sessions)
+        for offset in range(len(session) - len(pattern) + 1)
+        if session[offset:offset + len(pattern)] == pattern
+    ]
+
+
+@pytest.fixture
+def corpus(tmp_path: Path) -> tuple[TokenCorpus, list[str]]:
+    sessions = _sessions(np.random.default_rng(0), 12)
+    with TokenCorpusWriter(tmp_path/'corpus', 'ABC') as writer:
+        for i, session in enumerate(sessions):
+            writer.add('SPY', f'{i}', session)
+    return TokenCorpus(tmp_path/'corpus'), sessions
+
+
+def test_suffix_and_lcp_arrays_match_sorting() -> None:
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        text = rng.integers(1, 4, size=int(rng.integers(0, 80))).astype(np.int32)
+        sa, ranks = suffix_array(text)
+        suffixes = [tuple(text[i:].tolist()) for i in range(len(text))]
+        assert sa.tolist() == sorted(range(len(text)), key=lambda i: suffixes[i])
+
+        lcp = lcp_array(sa, ranks)
+        for i in range(1, len(sa)):
+            a, b = suffixes[sa[i - 1]], suffixes[sa[i]]
+            common = next((j for j, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+            assert lcp[i] == common
+
+
+def test_queries_match_brute_force(corpus: tuple[TokenCorpus, list[str]]) -> None:
+    token_corpus, sessions = corpus
+    index = MotifIndex.build(token_corpus)
+
+    for length in (1, 3, 6):
+        expected = Counter(session[i:i + length] for session in sessions for i in range(len(session) - length + 1))
+        assert dict(index.top_k(length, k=len(expected) + 1)) == dict(expected)
+
+    for pattern in ('A', 'CAB', 'BBBB', 'ABCABC'):
+        found = [(occurrence['session'], occurrence['offset']) for occurrence in index.occurrences(pattern)]
+        assert found == _occurrences(sessions, pattern)
+
+    motif, occurrences = index.longest_repeated()
+    assert len(occurrences) >= 2 and len(occurrences) == len(_occurrences(sessions, motif))
+    longer = {
+        session[i:i + len(motif) + 1] for session in sessions for i in range(len(session) - len(motif))
+    }
+    assert all(len(_occurrences(sessions, candidate)) < 2 for candidate in longer)
+
+
+def test_save_load_round_trip(corpus: tuple[TokenCorpus, list[str]], tmp_path: Path) -> None:
+    index = MotifIndex.build(corpus[0])
+    index.save(tmp_path/'motifs')
+    loaded = MotifIndex.load(tmp_path/'motifs')
+    assert loaded.sa.tolist() == index.sa.tolist() and loaded.lcp.tolist() == index.lcp.tolist()
+    assert loaded.longest_repeated() == index.longest_repeated()
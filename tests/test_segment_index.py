@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+from analysis.analyzers.data_segmenter import DataSegmenter
+from analysis.analyzers.segment_index import SegmentIndex, segment_vectors
+
+
+def _segments(rng: np.random.Generator, count: int) -> list[pd.DataFrame]:
+    return [pd.DataFrame(rng.standard_normal((int(rng.integers(3, 40)), 2)), columns=['open', 'close']) for _ in range(count)]
+
+
+def test_empty_segment_is_rejected() -> None:
+    empty = pd.DataFrame(columns=['open', 'close'], dtype=float)
+    with pytest.raises(ValueError, match='empty segment'):
+        segment_vectors([empty])
+    with pytest.raises(ValueError, match='empty segment'):
+        SegmentIndex(length=8).add([empty])
+
+
+def test_data_segmenter_skips_empty_segments() -> None:
+    rng = np.random.default_rng(0)
+    segments = _segments(rng, 20)
+    # cusum_segmenter can emit an empty first segment
+    segments[0] = segments[0].iloc[:0]
+
+    segmenter = DataSegmenter('TEST', transformation=lambda df: df, segmenter=lambda df: segments)
+    segmenter.segments = segments
+    index = segmenter.build_segment_index(length=8)
+    assert len(index) == 19
+
+    # Ids stay positions in self.segments
+    match = segmenter.identify_segment(segments[5], k=1)[0]
+    assert match['index'] == 5
+
+    new_segments = [segments[0], *_segments(rng, 3)]
+    segmenter.update_segment_index(new_segments)
+    assert len(index) == 22
+    assert segmenter.identify_segment(new_segments[2], k=1)[0]['index'] == 22
+
+
+def test_pq_codebooks_wait_for_a_training_sample() -> None:
+    rng = np.random.default_rng(0)
+    segments = _segments(rng, 600)
+    exact = SegmentIndex(length=8)
+    pq = SegmentIndex(length=8, mode='pq', n_subspaces=4, n_centroids=64, train_size=300)
+
+    # A tiny first batch is searched exactly rather than trained on
+    for index in (exact, pq):
+        index.add(segments[:3])
+    assert pq.codebooks is None
+    assert pq.query(segments[1], k=1)[0]['index'] == 1
+
+    for index in (exact, pq):
+        for start in range(3, len(segments), 50):
+            index.add(segments[start:start + 50])
+    assert pq.codebooks is not None and pq.codes.shape == (4, 600)
+
+    recall = np.mean([
+        len({match['index'] for match in pq.query(query, k=10)} & {match['index'] for match in exact.query(query, k=10)}) / 10
+        for query in segments[:50]
+    ])
+    # Codebooks trained on the first 3 segments alone give about 0.13
+    assert recall > 0.5
+
+
+@pytest.mark.parametrize('mode, count', [('exact', 30), ('pq', 10), ('pq', 30)])
+def test_save_load_round_trip(tmp_path, mode: str, count: int) -> None:
+    rng = np.random.default_rng(1)
+    segments = _segments(rng, count)
+    index = SegmentIndex(length=8, mode=mode, n_subspaces=4, n_centroids=8, train_size=20)
+    index.add(segments)
+
+    index.save(tmp_path/'segments')
+    loaded = SegmentIndex.load(tmp_path/'segments')
+    assert loaded.train_size == 20 and len(loaded) == count
+    assert loaded.query(segments[4], k=5) == index.query(segments[4], k=5)
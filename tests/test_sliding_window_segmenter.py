@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from analysis.tokenization.segmentation.segmenters.sliding_window_segmenter import (
+    COUNTS_BOUNDARY_SCORES, sliding_window_segmenter,
+)
+
+
+def _random_runs(rng: np.random.Generator, length: int, alphabet: str) -> str:
+    """Runs of repeated symbols, which produce many tied boundary scores."""
+    sequence = ''
+    while len(sequence) < length:
+        sequence += rng.choice(list(alphabet)) * int(rng.integers(1, 20))
+    return sequence[:length]
+
+
+def test_tied_scores_give_the_same_boundaries() -> None:
+    sequence = 'CCCCCCCCCCCCCCCCCBBBAAAADDDDDDDDDDDAAAAAAAAAAAAAAA'
+    boundary_score = next(score for score in COUNTS_BOUNDARY_SCORES if score.__name__ == 'mutual_info_two')
+    results = [
+        sliding_window_segmenter(boundary_score, window_size=50, split_search=split_search)(sequence)[1]
+        for split_search in ('slice', 'counts', 'sliding')
+    ]
+    assert results[0] == results[1] == results[2]
+
+
+@pytest.mark.parametrize('boundary_score', list(COUNTS_BOUNDARY_SCORES), ids=lambda score: score.__name__)
+def test_split_searches_agree(boundary_score) -> None:
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+        sequence = _random_runs(rng, int(rng.integers(40, 200)), 'ABCD'[:int(rng.integers(2, 5))])
+        window_size = int(rng.integers(10, 60))
+        step_size = int(rng.integers(1, window_size + 5))
+        options = {'window_size': window_size, 'step_size': step_size, 'min_token_length': int(rng.integers(1, 5))}
+
+        slice_boundaries = sliding_window_segmenter(boundary_score, split_search='slice', **options)(sequence)[1]
+        for split_search in ('counts', 'sliding'):
+            boundaries = sliding_window_segmenter(boundary_score, split_search=split_search, **options)(sequence)[1]
+            assert boundaries == slice_boundaries, (split_search, sequence, options)
@@ -0,0 +1,35 @@
+from pathlib import Path
+import numpy as np
+import pytest
+from analysis.tokenization.corpus.token_corpus import INDEX_FILE, TokenCorpus, TokenCorpusWriter
+
+
+def test_round_trip(tmp_path: Path) -> None:
+    with TokenCorpusWriter(tmp_path, 'ABC') as writer:
+        writer.add('SPY', '2024-01-02', 'AABBBCA')
+        writer.add('SPY', '2024-01-03', '')
+        writer.add('QQQ', '2024-01-02', np.array([2, 2, 0]))
+
+    corpus = TokenCorpus(tmp_path)
+    assert [corpus.decode(corpus.segment_codes(segment)) for segment in corpus.segments] == ['AABBBCA', '', 'CCA']
+    assert [corpus.decode(codes) for codes in corpus.collapse_runs(ticker='SPY')] == ['ABCA', '']
+    assert corpus.run_lengths.tolist() == [2, 3, 1, 1, 2, 1]
+
+    ngrams, counts = corpus.ngram_counts(2)
+    pairs = {corpus.decode(ngram): int(count) for ngram, count in zip(ngrams, counts)}
+    # 'AC' would only appear across the two SPY sessions
+    assert pairs == {'AA': 1, 'AB': 1, 'BB': 2, 'BC': 1, 'CA': 2, 'CC': 1}
+
+
+def test_failed_write_leaves_no_index(tmp_path: Path) -> None:
+    with TokenCorpusWriter(tmp_path, 'AB') as writer:
+        writer.add('SPY', '2024-01-02', 'ABBA')
+
+    with pytest.raises(ValueError):
+        with TokenCorpusWriter(tmp_path, 'AB') as writer:
+            writer.add('SPY', '2024-01-02', 'AB')
+            writer.add('SPY', '2024-01-03', np.array([0, 5]))
+
+    assert not (tmp_path/INDEX_FILE).exists()
+    with pytest.raises(FileNotFoundError):
+        _ = TokenCorpus(tmp_path)
@@ -0,0 +1,53 @@
+from pathlib import Path
+import numpy as np
+import torch
+import torch.nn as nn
+from analysis.trainers.checkpointing import BEST_CHECKPOINT, LAST_CHECKPOINT, EarlyStopping, load_checkpoint
+from analysis.trainers.stock_transformer import StockTransformer
+from analysis.trainers.trainer import Trainer
+
+
+def _trainer(epochs: int) -> Trainer:
+    torch.manual_seed(0)
+    data = list(np.random.default_rng(0).standard_normal((600, 4)).astype(np.float32))
+    model = StockTransformer(d_model=8, nhead=2, num_layers=1, dim_feedforward=16, input_size=4)
+    return Trainer(data, nn.MSELoss(), model, number_of_epochs=epochs)
+
+
+def _weights(trainer: Trainer) -> list[torch.Tensor]:
+    return [value.clone() for value in trainer.model.state_dict().values()]
+
+
+def test_resume_matches_an_uninterrupted_run(tmp_path: Path) -> None:
+    uninterrupted = _trainer(4)
+    uninterrupted.train(checkpoint_dir=tmp_path/'uninterrupted')
+
+    first = _trainer(2)
+    first.train(checkpoint_dir=tmp_path/'resumed')
+    resumed = _trainer(4)
+    resumed.train(checkpoint_dir=tmp_path/'resumed')
+
+    assert [record['epoch'] for record in resumed.profiler.records] == [3, 4]
+    assert all(torch.equal(a, b) for a, b in zip(_weights(uninterrupted), _weights(resumed)))
+    assert load_checkpoint(tmp_path/'resumed'/LAST_CHECKPOINT)['epoch'] == 4
+
+
+def test_early_stopped_run_is_not_resumed(tmp_path: Path) -> None:
+    # Only the first epoch can improve by min_delta, so the run stops after the second
+    trainer = _trainer(5)
+    trainer.train(early_stopping=EarlyStopping(patience=1, min_delta=1e9), checkpoint_dir=tmp_path)
+    assert len(trainer.profiler.records) == 2
+    stopped = load_checkpoint(tmp_path/LAST_CHECKPOINT)
+    assert stopped['stopped'] and stopped['epoch'] == 2
+    best = load_checkpoint(tmp_path/BEST_CHECKPOINT)
+    assert best['epoch'] == 1
+
+    for early_stopping in (EarlyStopping(patience=1, min_delta=1e9), None):
+        rerun = _trainer(5)
+        rerun.train(early_stopping=early_stopping, checkpoint_dir=tmp_path)
+        assert rerun.profiler.records == []
+        assert load_checkpoint(tmp_path/LAST_CHECKPOINT)['epoch'] == 2
+    # The model is still left at its best epoch
+    rerun = _trainer(5)
+    rerun.train(early_stopping=EarlyStopping(patience=1, min_delta=1e9), checkpoint_dir=tmp_path)
+    assert all(torch.equal(a, b) for a, b in zip(_weights(rerun), best['model'].values()))